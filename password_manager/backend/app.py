@@ -3,24 +3,55 @@ PASSWORD MANAGER - Flask API Server
 A secure REST API for the browser extension
 """
 
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, Response, current_app, request, jsonify, g, send_file
 from flask_cors import CORS
 from functools import wraps
+from typing import Dict, Optional, Tuple
+from werkzeug.exceptions import HTTPException
+from werkzeug.local import LocalProxy
+from werkzeug.test import EnvironBuilder
 import os
+import tempfile
+import time
 
-from database_manager import DatabaseManager
-from auth_manager import AuthManager
-from password_generator import PasswordGenerator
+from database_manager import PASSWORD_FIELDS
+from archive import ArchiveError, ArchiveReader, export_archive
+from password_generator import PasswordGenerator, load_breach_hashes
+from tenancy import DEFAULT_TENANT, TenantNotFound, TenantRegistry
+from serializer import FastJSONProvider, batch_response, compress_response, rows_response
+from instrumentation import metrics
+from profiler import RequestProfiler
+from scheduler import MaintenanceScheduler
+from events import HEARTBEAT_SECONDS, MAX_SUBSCRIBERS, ChangeHub
+from write_queue import (WRITE_GROUP_SIZE, WRITE_GROUP_WINDOW_MS, WRITE_QUEUE_SIZE,
+                         WRITE_QUEUE_TIMEOUT, WriteQueueFull)
 
-# Initialize Flask app
-app = Flask(__name__)
-CORS(app, origins=["chrome-extension://*", "moz-extension://*", "http://localhost:*"])
 
-# Initialize managers
-db = DatabaseManager()
-auth = AuthManager()
+# Routes and hooks live on a blueprint; create_app() builds the application
+api = Blueprint("api", __name__)
+
+tenants = LocalProxy(lambda: current_app.extensions["tenants"])
+profiler = LocalProxy(lambda: current_app.extensions["profiler"])
+
+
+def current_tenant():
+    """Get the current request's tenant, opening its vault on first use."""
+    tenant = g.get("tenant")
+    if tenant is None:
+        tenant = g.tenant = tenants.acquire(g.get("tenant_name", DEFAULT_TENANT))
+    return tenant
+
+
+db = LocalProxy(lambda: current_tenant().db)
+auth = LocalProxy(lambda: current_tenant().auth)
+backups = LocalProxy(lambda: current_tenant().backups)
 generator = PasswordGenerator()
 
+MAX_BULK_OPERATIONS = 10000
+MAX_BATCH_REQUESTS = 20
+# Marks the environ of /api/batch sub-requests, which the batch authenticated
+BATCH_ENVIRON_KEY = "password_manager.batch"
+
 
 # =====================================
 # Authentication Middleware
@@ -29,12 +60,16 @@ def require_auth(f):
     """Decorator to require authentication for routes."""
     @wraps(f)
     def decorated(*args, **kwargs):
+        if request.environ.get(BATCH_ENVIRON_KEY):
+            return f(*args, **kwargs)
         token = request.headers.get("Authorization", "").replace("Bearer ", "")
         
         if not token:
             return jsonify({"error": "No token provided"}), 401
         
+        start = time.perf_counter()
         result = auth.verify_token(token)
+        metrics.observe("pm_auth_verify_duration_seconds", time.perf_counter() - start)
         if not result["valid"]:
             return jsonify({"error": result["error"]}), 401
         
@@ -42,10 +77,93 @@ def require_auth(f):
     return decorated
 
 
+@api.before_app_request
+def resolve_tenant():
+    """Validate the requested tenant; its vault is opened lazily."""
+    name = request.headers.get("X-Vault-Tenant", DEFAULT_TENANT).strip().lower()
+    if not tenants.exists(name) and not tenants.auto_create:
+        return jsonify({"error": "Unknown vault tenant"}), 404
+    g.tenant_name = name
+
+
+def release_tenant(exc):
+    """Let the registry close the tenant's vault once it is idle."""
+    tenant = g.pop("tenant", None)
+    if tenant is not None:
+        tenants.release(tenant)
+
+
+@api.app_errorhandler(TenantNotFound)
+def tenant_not_found(e):
+    return jsonify({"error": "Unknown vault tenant"}), 404
+
+
+@api.app_errorhandler(WriteQueueFull)
+def write_queue_full(e):
+    response = jsonify({"error": "Server is busy saving, retry shortly"})
+    response.headers["Retry-After"] = "1"
+    return response, 503
+
+
+@api.before_app_request
+def start_timer():
+    """Remember when the request started, and start profiling if requested."""
+    g.request_start = time.perf_counter()
+    if profiler.should_profile(request.headers):
+        g.profile = profiler.start()
+    scheduler = current_app.extensions.get("scheduler")
+    if scheduler is not None:
+        scheduler.ensure_started()
+        scheduler.traffic.request_started()
+        g.traffic_counted = True
+
+
+@api.after_app_request
+def record_request_metrics(response):
+    """Record request latency labelled by route template (never the raw path)."""
+    start = g.get("request_start")
+    if start is not None:
+        elapsed = time.perf_counter() - start
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        metrics.observe(
+            "pm_http_request_duration_seconds",
+            elapsed,
+            route=route,
+            method=request.method,
+            status=str(response.status_code)
+        )
+        profile = g.pop("profile", None)
+        if profile is not None:
+            meta = profiler.stop(profile, request.method, route,
+                                 response.status_code, elapsed * 1000)
+            response.headers["X-Profile-Id"] = str(meta["id"])
+    return response
+
+
+@api.teardown_app_request
+def finish_request(exc):
+    """Stop a profile left running by a failed request, and count the request as done."""
+    if request.environ.get(BATCH_ENVIRON_KEY):
+        # Sub-requests share the batch's g; the batch itself is finished later
+        return
+    profile = g.pop("profile", None)
+    if profile is not None:
+        profiler.discard(profile)
+    if g.pop("traffic_counted", False):
+        elapsed_ms = (time.perf_counter() - g.request_start) * 1000
+        current_app.extensions["scheduler"].traffic.request_finished(elapsed_ms)
+
+
+@api.after_app_request
+def compress(response):
+    """Compress large responses according to Accept-Encoding."""
+    return compress_response(response, request.headers.get("Accept-Encoding", ""))
+
+
 # =====================================
 # Auth Routes
 # =====================================
-@app.route("/api/auth/status", methods=["GET"])
+@api.route("/api/auth/status", methods=["GET"])
 def auth_status():
     """Check if master password is set."""
     return jsonify({
@@ -54,7 +172,7 @@ def auth_status():
     })
 
 
-@app.route("/api/auth/setup", methods=["POST"])
+@api.route("/api/auth/setup", methods=["POST"])
 def setup_master():
     """Set up master password (first time only)."""
     if auth.master_exists():
@@ -73,7 +191,7 @@ def setup_master():
     return jsonify({"message": result["message"], "token": token})
 
 
-@app.route("/api/auth/login", methods=["POST"])
+@api.route("/api/auth/login", methods=["POST"])
 def login():
     """Login with master password."""
     data = request.get_json()
@@ -86,7 +204,7 @@ def login():
         return jsonify({"error": "Invalid password"}), 401
 
 
-@app.route("/api/auth/logout", methods=["POST"])
+@api.route("/api/auth/logout", methods=["POST"])
 @require_auth
 def logout():
     """Logout and invalidate token."""
@@ -95,7 +213,7 @@ def logout():
     return jsonify(result)
 
 
-@app.route("/api/auth/change-password", methods=["POST"])
+@api.route("/api/auth/change-password", methods=["POST"])
 @require_auth
 def change_password():
     """Change master password."""
@@ -111,7 +229,7 @@ def change_password():
     return jsonify(result)
 
 
-@app.route("/api/auth/verify", methods=["GET"])
+@api.route("/api/auth/verify", methods=["GET"])
 @require_auth
 def verify_token():
     """Verify if current token is valid."""
@@ -121,7 +239,7 @@ def verify_token():
 # =====================================
 # Password Routes
 # =====================================
-@app.route("/api/passwords", methods=["GET"])
+@api.route("/api/passwords", methods=["GET"])
 @require_auth
 def get_passwords():
     """Get all passwords with optional filters."""
@@ -129,16 +247,33 @@ def get_passwords():
     category = request.args.get("category")
     favorites = request.args.get("favorites", "").lower() == "true"
     
-    passwords = db.get_passwords(
+    rows = db.fetch_password_rows(
         search=search,
         category=category,
         favorites_only=favorites
     )
     
-    return jsonify({"passwords": passwords, "count": len(passwords)})
+    return rows_response(
+        "passwords", PASSWORD_FIELDS, rows,
+        converters={"password": db.decrypt, "favorite": bool}
+    )
+
+
+@api.route("/api/passwords/suggest", methods=["GET"])
+@require_auth
+def suggest_passwords():
+    """Typeahead: ids and labels of entries matching ?q= (nothing is decrypted)."""
+    query = request.args.get("q", "")
+    try:
+        limit = min(max(int(request.args.get("limit", 10)), 1), 50)
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    
+    suggestions = db.suggest(query, limit)
+    return jsonify({"suggestions": suggestions, "count": len(suggestions)})
 
 
-@app.route("/api/passwords/<int:password_id>", methods=["GET"])
+@api.route("/api/passwords/<int:password_id>", methods=["GET"])
 @require_auth
 def get_password(password_id):
     """Get a single password by ID."""
@@ -150,7 +285,7 @@ def get_password(password_id):
         return jsonify({"error": "Password not found"}), 404
 
 
-@app.route("/api/passwords", methods=["POST"])
+@api.route("/api/passwords", methods=["POST"])
 @require_auth
 def add_password():
     """Add a new password."""
@@ -173,7 +308,7 @@ def add_password():
     return jsonify(result), 201
 
 
-@app.route("/api/passwords/<int:password_id>", methods=["PUT"])
+@api.route("/api/passwords/<int:password_id>", methods=["PUT"])
 @require_auth
 def update_password(password_id):
     """Update an existing password."""
@@ -193,7 +328,7 @@ def update_password(password_id):
     return jsonify(result)
 
 
-@app.route("/api/passwords/<int:password_id>", methods=["DELETE"])
+@api.route("/api/passwords/<int:password_id>", methods=["DELETE"])
 @require_auth
 def delete_password(password_id):
     """Delete a password."""
@@ -201,7 +336,7 @@ def delete_password(password_id):
     return jsonify(result)
 
 
-@app.route("/api/passwords/<int:password_id>/favorite", methods=["POST"])
+@api.route("/api/passwords/<int:password_id>/favorite", methods=["POST"])
 @require_auth
 def toggle_favorite(password_id):
     """Toggle favorite status."""
@@ -209,10 +344,38 @@ def toggle_favorite(password_id):
     return jsonify(result)
 
 
+@api.route("/api/passwords/<int:password_id>/use", methods=["POST"])
+@require_auth
+def record_password_use(password_id):
+    """Record that an entry was filled into a page (ranks it higher for its site)."""
+    db.record_use(password_id)
+    return jsonify({"message": "Use recorded", "id": password_id}), 202
+
+
+@api.route("/api/passwords/bulk", methods=["POST"])
+@require_auth
+def bulk_passwords():
+    """Apply many delete/move/favorite/update operations in one transaction."""
+    data = request.get_json() or {}
+    operations = data.get("operations")
+    
+    if not isinstance(operations, list) or not operations:
+        return jsonify({"error": "operations must be a non-empty list"}), 400
+    if len(operations) > MAX_BULK_OPERATIONS:
+        return jsonify({"error": f"At most {MAX_BULK_OPERATIONS} operations per request"}), 400
+    
+    result = db.bulk_apply(operations)
+    
+    if "error" in result:
+        return jsonify(result), 500
+    
+    return jsonify(result)
+
+
 # =====================================
 # Category Routes
 # =====================================
-@app.route("/api/categories", methods=["GET"])
+@api.route("/api/categories", methods=["GET"])
 @require_auth
 def get_categories():
     """Get all categories."""
@@ -220,7 +383,7 @@ def get_categories():
     return jsonify({"categories": categories})
 
 
-@app.route("/api/categories", methods=["POST"])
+@api.route("/api/categories", methods=["POST"])
 @require_auth
 def add_category():
     """Add a new category."""
@@ -241,10 +404,28 @@ def add_category():
     return jsonify(result), 201
 
 
+@api.route("/api/categories/<int:category_id>", methods=["PUT"])
+@require_auth
+def rename_category(category_id):
+    """Rename a category."""
+    data = request.get_json()
+    
+    if not data.get("name"):
+        return jsonify({"error": "Category name is required"}), 400
+    
+    result = db.rename_category(category_id, data["name"])
+    
+    if "error" in result:
+        status = 404 if result["error"] == "Category not found" else 400
+        return jsonify(result), status
+    
+    return jsonify(result)
+
+
 # =====================================
 # Password Generator Routes
 # =====================================
-@app.route("/api/generate", methods=["POST"])
+@api.route("/api/generate", methods=["POST"])
 @require_auth
 def generate_password():
     """Generate a new password."""
@@ -267,7 +448,7 @@ def generate_password():
     })
 
 
-@app.route("/api/generate/memorable", methods=["POST"])
+@api.route("/api/generate/memorable", methods=["POST"])
 @require_auth
 def generate_memorable():
     """Generate a memorable passphrase."""
@@ -288,7 +469,7 @@ def generate_memorable():
     })
 
 
-@app.route("/api/generate/pin", methods=["POST"])
+@api.route("/api/generate/pin", methods=["POST"])
 @require_auth
 def generate_pin():
     """Generate a PIN."""
@@ -297,7 +478,7 @@ def generate_pin():
     return jsonify({"pin": pin})
 
 
-@app.route("/api/check-strength", methods=["POST"])
+@api.route("/api/check-strength", methods=["POST"])
 def check_strength():
     """Check password strength (no auth required)."""
     data = request.get_json()
@@ -313,7 +494,7 @@ def check_strength():
 # =====================================
 # Auto-Save Routes
 # =====================================
-@app.route("/api/passwords/autosave/detect", methods=["POST"])
+@api.route("/api/passwords/autosave/detect", methods=["POST"])
 @require_auth
 def detect_and_save_password():
     """Auto-detect and save credentials from form submission."""
@@ -328,8 +509,8 @@ def detect_and_save_password():
     if not all([website, username, password]):
         return jsonify({"error": "Missing required fields"}), 400
     
-    # Check if similar password already exists
-    existing = db.find_similar_password(website, username)
+    # Check if a password already exists for this site and username
+    existing = db.find_similar_password(website, username, url=url)
     
     if existing:
         return jsonify({
@@ -356,40 +537,58 @@ def detect_and_save_password():
     }), 201
 
 
-@app.route("/api/passwords/autosave/check", methods=["POST"])
+@api.route("/api/passwords/autosave/check", methods=["POST"])
 @require_auth
 def check_autosave_status():
     """Check if auto-save is enabled and if duplicate exists."""
     data = request.get_json()
     website = data.get("website", "")
+    url = data.get("url", "")
     username = data.get("username", "")
     
-    if not website:
+    if not website and not url:
         return jsonify({"error": "Website is required"}), 400
     
-    # Check for existing credentials
-    existing = db.find_similar_password(website, username)
+    # Check for existing credentials, then for entries of similar sites
+    existing = db.find_similar_password(website, username, url=url)
+    matches = db.match_sites(website, url=url, username=username)
     
     return jsonify({
         "website": website,
         "username": username,
         "exists": existing is not None,
-        "existing": existing
+        "existing": existing,
+        "matches": matches
     })
 
 
+@api.route("/api/host-filter", methods=["GET"])
+@require_auth
+def host_filter():
+    """
+    Bloom filter of the sites with entries (format in host_filter.py), so
+    clients only look up pages that probably have credentials. Send the
+    ETag back in If-None-Match to get 304 while it has not changed.
+    """
+    etag, blob = db.get_host_filter()
+    response = Response(blob, mimetype="application/octet-stream")
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response.make_conditional(request)
+
+
 # =====================================
 # Export/Import Routes
 # =====================================
-@app.route("/api/export", methods=["GET"])
+@api.route("/api/export", methods=["GET"])
 @require_auth
 def export_passwords():
     """Export all passwords."""
-    passwords = db.export_passwords()
-    return jsonify({"passwords": passwords, "count": len(passwords)})
+    rows = db.fetch_password_rows()
+    return rows_response("passwords", PASSWORD_FIELDS, rows, converters={"favorite": bool})
 
 
-@app.route("/api/import", methods=["POST"])
+@api.route("/api/import", methods=["POST"])
 @require_auth
 def import_passwords():
     """Import passwords from backup."""
@@ -403,10 +602,68 @@ def import_passwords():
     return jsonify(result)
 
 
+@api.route("/api/export/archive", methods=["GET"])
+@require_auth
+def export_archive_file():
+    """Export all passwords (encrypted) as a binary vault archive."""
+    # Spooled to disk and streamed from there, so a large vault is never
+    # held in memory; the file is deleted when the response closes it
+    archive = tempfile.TemporaryFile()
+    try:
+        export_archive(db, archive)
+    except Exception:
+        archive.close()
+        raise
+    archive.seek(0)
+    return send_file(
+        archive,
+        mimetype="application/octet-stream",
+        as_attachment=True,
+        download_name="vault.pmva"
+    )
+
+
+@api.route("/api/import/archive", methods=["POST"])
+@require_auth
+def import_archive_file():
+    """Restore a binary vault archive, optionally only ?category=... or ?id=... entries."""
+    categories = request.args.getlist("category") or None
+    try:
+        ids = [int(i) for i in request.args.getlist("id")] or None
+    except ValueError:
+        return jsonify({"error": "id must be an integer"}), 400
+    
+    limit = current_app.config["MAX_ARCHIVE_BYTES"]
+    if request.content_length is not None and request.content_length > limit:
+        return jsonify({"error": f"Archive is larger than {limit} bytes"}), 413
+    
+    fd, path = tempfile.mkstemp(suffix=".pmva")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            # Counted while copying: chunked uploads have no Content-Length
+            received = 0
+            while True:
+                chunk = request.stream.read(1 << 20)
+                if not chunk:
+                    break
+                received += len(chunk)
+                if received > limit:
+                    return jsonify({"error": f"Archive is larger than {limit} bytes"}), 413
+                f.write(chunk)
+        with ArchiveReader(path) as reader:
+            result = reader.restore_into(db, categories, ids)
+    except ArchiveError as e:
+        return jsonify({"error": str(e)}), 400
+    finally:
+        os.remove(path)
+    
+    return jsonify(result)
+
+
 # =====================================
 # Statistics Route
 # =====================================
-@app.route("/api/stats", methods=["GET"])
+@api.route("/api/stats", methods=["GET"])
 @require_auth
 def get_statistics():
     """Get password statistics."""
@@ -414,18 +671,395 @@ def get_statistics():
     return jsonify(stats)
 
 
+# =====================================
+# Sync Route
+# =====================================
+@api.route("/api/sync", methods=["GET"])
+@require_auth
+def sync_changes():
+    """Get entries changed since a sync version."""
+    try:
+        since = int(request.args.get("since", 0))
+    except ValueError:
+        return jsonify({"error": "since must be an integer version"}), 400
+    
+    changes = db.get_changes(since)
+    return jsonify(changes)
+
+
+@api.route("/api/events", methods=["GET"])
+@require_auth
+def change_events():
+    """
+    Stream change notices as server-sent events instead of polling /api/sync.
+    Each event's id is the vault version, so a reconnecting client (the
+    Last-Event-ID header, or ?since=) is sent what it missed first. A
+    "resync" event means notices were dropped: fetch /api/sync?since=<last
+    version seen>. Comments are sent as heartbeats while idle. The session
+    is checked again at every heartbeat, and the stream ends once it has
+    expired or been logged out.
+    """
+    try:
+        since = request.headers.get("Last-Event-ID") or request.args.get("since")
+        since = int(since) if since not in (None, "") else None
+    except ValueError:
+        return jsonify({"error": "since must be an integer version"}), 400
+
+    hub = current_app.extensions["events"]
+    registry = current_app.extensions["tenants"]
+    tenant = current_tenant()
+    name = tenant.name
+    token = request.headers.get("Authorization", "").replace("Bearer ", "")
+    expires = tenant.auth.verify_token(token)["payload"]["exp"]
+
+    def authorized() -> bool:
+        # Logging out or changing the master password needs the vault open,
+        # so a closed vault's sessions can only have run out of time
+        if time.time() >= expires:
+            return False
+        open_tenant = registry.get_open(name)
+        return open_tenant is None or open_tenant.auth.verify_token(token)["valid"]
+
+    subscriber = hub.subscribe(tenant.name)
+    if subscriber is None:
+        return jsonify({"error": "Too many open event streams"}), 503
+    watched = tenant.db.watch_changes(hub.publisher(tenant.name), since)
+    subscriber.since = subscriber.latest = watched["version"]
+
+    # The stream outlives the request: it uses neither the request nor the
+    # tenant (only its name), so the vault can still be closed while
+    # clients are connected
+    response = Response(hub.stream(subscriber, watched["notices"], authorized),
+                        mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    response.call_on_close(lambda: hub.unsubscribe(subscriber))
+    return response
+
+
+# =====================================
+# Batch Route
+# =====================================
+# Streams and the batch route itself cannot run inside a batch, nor can
+# exports: the vault lock is held for the whole batch
+UNBATCHABLE_ENDPOINTS = ("api.batch_requests", "api.change_events",
+                         "api.export_passwords", "api.export_archive_file")
+# Request headers passed on to sub-requests
+BATCH_FORWARDED_HEADERS = ("Authorization", "X-Vault-Tenant")
+
+
+def _batch_error(status: int, message: str) -> Tuple[int, bytes]:
+    return status, current_app.json.dumps({"error": message}).encode()
+
+
+def run_batched_request(item) -> Tuple[int, bytes]:
+    """Dispatch one GET sub-request of a batch and get its status and JSON body."""
+    if not isinstance(item, dict) or not isinstance(item.get("path"), str):
+        return _batch_error(400, "Each request needs a path")
+    if str(item.get("method", "GET")).upper() != "GET":
+        return _batch_error(405, "Only GET requests can be batched")
+
+    builder = EnvironBuilder(
+        path=item["path"],
+        base_url=request.root_url,
+        headers={name: request.headers[name]
+                 for name in BATCH_FORWARDED_HEADERS if name in request.headers},
+        environ_overrides={BATCH_ENVIRON_KEY: True}
+    )
+    try:
+        environ = builder.get_environ()
+    finally:
+        builder.close()
+
+    # Same app context as the batch: g, and so the tenant, are shared; no
+    # before/after request hooks run for sub-requests
+    with current_app.request_context(environ):
+        if request.url_rule is not None and request.url_rule.endpoint in UNBATCHABLE_ENDPOINTS:
+            return _batch_error(400, "This route cannot be batched")
+        try:
+            response = current_app.make_response(current_app.dispatch_request())
+        except HTTPException as e:
+            return _batch_error(e.code or 500, e.description or e.name)
+        except Exception:
+            current_app.logger.exception("Batched request failed: %s", item["path"])
+            return _batch_error(500, "Internal server error")
+        if response.is_streamed or not response.is_json:
+            return _batch_error(400, "Only JSON routes can be batched")
+        return response.status_code, response.get_data()
+
+
+@api.route("/api/batch", methods=["POST"])
+@require_auth
+def batch_requests():
+    """
+    Run several GET requests in one round-trip, e.g. on popup open:
+    {"requests": [{"path": "/api/categories"}, {"path": "/api/passwords"}]}.
+    The token is verified once and every sub-request reads the same vault
+    state: the vault is locked for the whole batch, so writes from other
+    requests wait for it (exports cannot be batched). Returns
+    {"responses": [{"status", "body"}], "count"} in order.
+    """
+    data = request.get_json(silent=True) or {}
+    items = data.get("requests")
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "requests must be a non-empty list"}), 400
+    if len(items) > MAX_BATCH_REQUESTS:
+        return jsonify({"error": f"At most {MAX_BATCH_REQUESTS} requests per batch"}), 400
+
+    with db.read_snapshot():
+        results = [run_batched_request(item) for item in items]
+    return batch_response(results)
+
+
+# =====================================
+# Backup Routes
+# =====================================
+@api.route("/api/backup", methods=["POST"])
+@require_auth
+def create_backup():
+    """Take a full or incremental online backup of the vault."""
+    data = request.get_json(silent=True) or {}
+    kind = data.get("type", "incremental")
+    
+    if kind == "full":
+        report = backups.full_backup()
+    elif kind == "incremental":
+        report = backups.incremental_backup()
+    else:
+        return jsonify({"error": "type must be 'full' or 'incremental'"}), 400
+    
+    return jsonify(report)
+
+
+@api.route("/api/backups", methods=["GET"])
+@require_auth
+def list_backups():
+    """List stored backups with their timing and size."""
+    return jsonify({"backups": backups.list_backups()})
+
+
 # =====================================
 # Health Check
 # =====================================
-@app.route("/api/health", methods=["GET"])
+@api.route("/api/health", methods=["GET"])
 def health_check():
     """Health check endpoint."""
     return jsonify({"status": "healthy", "version": "2.0.0"})
 
 
+# =====================================
+# Metrics
+# =====================================
+def render_metrics():
+    return Response(
+        metrics.render_prometheus(),
+        mimetype="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+@api.route("/api/metrics", methods=["GET"])
+def get_metrics():
+    """
+    Expose latency histograms and counters in Prometheus text format.
+    Scrapers at a METRICS_ALLOW address need no token; others log in.
+    """
+    if request.remote_addr in current_app.config["METRICS_ALLOW"]:
+        return render_metrics()
+    return require_auth(render_metrics)()
+
+
+# =====================================
+# Profiling Routes
+# =====================================
+@api.route("/api/debug/profiles", methods=["GET"])
+@require_auth
+def list_profiles():
+    """List stored request profiles with their SQL statements and plans."""
+    return jsonify({"mode": profiler.mode, "profiles": profiler.list_profiles()})
+
+
+@api.route("/api/debug/profiles/<int:profile_id>", methods=["GET"])
+@require_auth
+def download_profile(profile_id):
+    """Download a stored cProfile dump (open with pstats or snakeviz)."""
+    path = profiler.profile_path(profile_id)
+    if not path:
+        return jsonify({"error": "Profile not found"}), 404
+    return send_file(
+        os.path.abspath(path),
+        mimetype="application/octet-stream",
+        as_attachment=True,
+        download_name=f"profile-{profile_id}.prof"
+    )
+
+
+# =====================================
+# Maintenance Routes
+# =====================================
+@api.route("/api/maintenance", methods=["GET"])
+@require_auth
+def maintenance_status():
+    """Status, last result and duration of every background maintenance job."""
+    scheduler = current_app.extensions.get("scheduler")
+    if scheduler is None:
+        return jsonify({"enabled": False, "jobs": []})
+    return jsonify({"enabled": True, "jobs": scheduler.status()})
+
+
+@api.route("/api/maintenance/<job>/run", methods=["POST"])
+@require_auth
+def run_maintenance_job(job):
+    """Run a maintenance job as soon as the scheduler is free."""
+    scheduler = current_app.extensions.get("scheduler")
+    if scheduler is None:
+        return jsonify({"error": "Maintenance is disabled"}), 400
+    result = scheduler.run_now(job)
+    if "error" in result:
+        return jsonify(result), 404
+    return jsonify(result), 202
+
+
+# =====================================
+# Application Factory
+# =====================================
+def default_config() -> Dict:
+    """Settings read from the environment, overridable by create_app(config)."""
+    return {
+        # Directory of the "default" tenant's vault and key files
+        "DATA_DIR": os.environ.get("PM_DATA_DIR", "."),
+        "VAULTS_DIR": os.environ.get("PM_VAULTS_DIR", "vaults"),
+        "MAX_OPEN_TENANTS": int(os.environ.get("PM_MAX_OPEN_TENANTS", "32")),
+        "TENANT_IDLE_SECONDS": float(os.environ.get("PM_TENANT_IDLE_SECONDS", "600")),
+        "TENANT_AUTO_CREATE": os.environ.get("PM_TENANT_AUTO_CREATE", "") == "1",
+        "PROFILE_MODE": os.environ.get("PM_PROFILE_MODE", "off"),
+        "PROFILE_DIR": os.environ.get("PM_PROFILE_DIR", "profiles"),
+        "PROFILE_MAX": int(os.environ.get("PM_PROFILE_MAX", "20")),
+        "MAINTENANCE": os.environ.get("PM_MAINTENANCE", "1") != "0",
+        # Optional HIBP-format SHA1 list for the breach_check_result refresh
+        "BREACH_LIST": os.environ.get("PM_BREACH_LIST") or None,
+        "EVENTS_MAX_SUBSCRIBERS": MAX_SUBSCRIBERS,
+        "EVENTS_HEARTBEAT_SECONDS": HEARTBEAT_SECONDS,
+        # Group commit of entry writes through one writer thread per vault
+        "WRITE_QUEUE": os.environ.get("PM_WRITE_QUEUE", "") == "1",
+        "WRITE_GROUP_SIZE": WRITE_GROUP_SIZE,
+        "WRITE_GROUP_WINDOW_MS": WRITE_GROUP_WINDOW_MS,
+        "WRITE_QUEUE_SIZE": WRITE_QUEUE_SIZE,
+        "WRITE_QUEUE_TIMEOUT": WRITE_QUEUE_TIMEOUT,
+        "WRITE_SYNCHRONOUS": os.environ.get("PM_WRITE_SYNCHRONOUS", "FULL"),
+        # Addresses allowed to read /api/metrics without a token
+        "METRICS_ALLOW": frozenset(
+            a.strip() for a in os.environ.get("PM_METRICS_ALLOW", "").split(",") if a.strip()
+        ),
+        # Largest archive accepted by /api/import/archive
+        "MAX_ARCHIVE_BYTES": int(os.environ.get("PM_MAX_ARCHIVE_BYTES", str(512 * 1024 * 1024))),
+    }
+
+
+def maintenance_scheduler(app: Flask) -> MaintenanceScheduler:
+    """Register the housekeeping jobs, run on every open tenant vault."""
+    scheduler = MaintenanceScheduler()
+    registry = app.extensions["tenants"]
+    breach_list = app.config["BREACH_LIST"]
+    breached: Dict = {}
+
+    def sessions():
+        def expire(tenant):
+            hours = tenant.auth.token_expiry.total_seconds() / 3600
+            return {"expired": tenant.auth.cleanup_sessions(max_age_hours=hours)}
+        result = registry.for_each_open(expire)
+        return {"tenants": result, "closed_idle": registry.close_idle()}
+
+    def derived_data():
+        if breach_list and not breached:
+            breached.update(load_breach_hashes(breach_list))
+        return registry.for_each_open(lambda tenant: tenant.db.refresh_derived_data(
+            lambda password: generator.check_strength(password)["score"],
+            breached or None,
+            pause=scheduler.yield_to_traffic
+        ))
+
+    scheduler.register("sessions", sessions, interval=600)
+    scheduler.register("derived_data", derived_data, interval=900)
+    scheduler.register("usage", lambda: registry.for_each_open(
+        lambda tenant: tenant.db.flush_usage()), interval=60)
+    scheduler.register("optimize", lambda: registry.for_each_open(
+        lambda tenant: tenant.db.optimize()), interval=3600)
+    scheduler.register("compact_changes", lambda: registry.for_each_open(
+        lambda tenant: tenant.db.compact_changes()), interval=86400)
+    scheduler.register("storage", lambda: registry.for_each_open(
+        lambda tenant: tenant.db.maintain_storage()), interval=86400)
+    return scheduler
+
+
+def tenant_opened(app: Flask):
+    """Get the hook that sets up each vault the tenant registry opens."""
+    hub = app.extensions["events"]
+    config = app.config
+
+    def setup(tenant):
+        if config["WRITE_QUEUE"]:
+            tenant.db.enable_write_queue(
+                synchronous=config["WRITE_SYNCHRONOUS"],
+                group_size=config["WRITE_GROUP_SIZE"],
+                window_ms=config["WRITE_GROUP_WINDOW_MS"],
+                max_pending=config["WRITE_QUEUE_SIZE"],
+                timeout=config["WRITE_QUEUE_TIMEOUT"]
+            )
+        # Reopened vaults with open event streams are watched again
+        hub.attach(tenant)
+    return setup
+
+
+def create_app(config: Optional[Dict] = None) -> Flask:
+    """
+    Build the API application. Nothing is opened or created here: each
+    tenant's database, keys and sessions are loaded by the first request
+    that uses them, in the process that serves it, so pre-forked workers
+    each get their own connections. Every app has its own tenant registry,
+    so several apps (tests, CLI tools) can live in one process.
+    """
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    app.config.update(default_config())
+    if config:
+        app.config.update(config)
+    CORS(app, origins=["chrome-extension://*", "moz-extension://*", "http://localhost:*"])
+
+    # Each tenant (X-Vault-Tenant header, "default" when absent) has its own
+    # vault, keys and sessions; db and auth resolve to the current request's tenant.
+    # Change notices for /api/events
+    app.extensions["events"] = ChangeHub(
+        max_subscribers=app.config["EVENTS_MAX_SUBSCRIBERS"],
+        heartbeat=app.config["EVENTS_HEARTBEAT_SECONDS"]
+    )
+    app.extensions["tenants"] = TenantRegistry(
+        base_dir=app.config["VAULTS_DIR"],
+        default_dir=app.config["DATA_DIR"],
+        max_open=app.config["MAX_OPEN_TENANTS"],
+        idle_timeout=app.config["TENANT_IDLE_SECONDS"],
+        auto_create=app.config["TENANT_AUTO_CREATE"],
+        on_open=tenant_opened(app)
+    )
+    app.extensions["profiler"] = RequestProfiler(
+        mode=app.config["PROFILE_MODE"],
+        profile_dir=app.config["PROFILE_DIR"],
+        max_profiles=app.config["PROFILE_MAX"]
+    )
+    if app.config["MAINTENANCE"]:
+        # The worker thread starts with the first request, see start_timer
+        app.extensions["scheduler"] = maintenance_scheduler(app)
+    app.register_blueprint(api)
+    app.teardown_appcontext(release_tenant)
+    return app
+
+
 # =====================================
 # Run Server
 # =====================================
+# Module-level app for `flask --app app run`, `python app.py` and existing
+# importers; creating it opens nothing (see create_app)
+app = create_app()
+
 if __name__ == "__main__":
     print("🔒 PASSWORD MANAGER API Server")
     print("=" * 40)
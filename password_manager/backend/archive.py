@@ -0,0 +1,458 @@
+"""
+PASSWORD MANAGER - Binary Vault Archive
+Features: Streaming export to compressed blocks of length-prefixed records,
+Block index and checksummed manifest, Selective restore, Parallel block decode
+
+Layout (little endian):
+    header     b"PMVA" + u8 format + 3 reserved bytes
+    blocks     zlib(records), one after another, one category per block
+    directory  (u32 id, u32 block number) pairs sorted by id
+    index      JSON list of blocks (offset, sizes, crc32, category, id range)
+    manifest   JSON (counts, section offsets, sha256 of the index and of the data)
+    trailer    u64 manifest offset, u32 manifest length, b"PMVE"
+
+A record is a u32 length, then u32 id, u8 favorite and the u32 byte length
+of each of TEXT_FIELDS (NULL_LENGTH for None), then the UTF-8 bytes of
+those fields. Passwords stay the Fernet tokens stored in the vault.
+
+Restoring a category reads only that category's blocks; restoring an
+entry binary-searches the directory on disk and decodes one block.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import struct
+import sys
+import time
+import zlib
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+MAGIC = b"PMVA"
+TRAILER_MAGIC = b"PMVE"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sB3x")
+TRAILER = struct.Struct("<QI4s")
+TEXT_FIELDS = ("website", "url", "username", "password", "category",
+               "notes", "created_at", "updated_at")
+RECORD_HEAD = struct.Struct("<IIB" + "I" * len(TEXT_FIELDS))
+LENGTH = struct.Struct("<I")
+DIRECTORY_ENTRY = struct.Struct("<II")
+NULL_LENGTH = 0xFFFFFFFF
+MANIFEST_KEYS = {"entries", "directory_offset", "index_offset", "index_length",
+                 "index_sha256", "data_sha256"}
+BLOCK_KEYS = {"offset", "length", "count", "crc32", "category"}
+
+# Uncompressed bytes per block: small enough that restoring one entry
+# decodes little, large enough for zlib to find repetition
+BLOCK_SIZE = 256 * 1024
+# Level 3 is ~5% larger than 6 (passwords are random tokens) at half the cost
+ZLIB_LEVEL = 3
+
+
+class ArchiveError(Exception):
+    """Raised for files that are not archives or fail a checksum."""
+
+
+class ArchiveWriter:
+    """
+    Streams rows into an archive; close() writes the index and manifest.
+    `target` is a file path (written atomically) or a binary file object.
+    """
+
+    def __init__(self, target: Union[str, BinaryIO], block_size: int = BLOCK_SIZE,
+                 level: int = ZLIB_LEVEL):
+        self.path = target if isinstance(target, str) else None
+        self.block_size = block_size
+        self.level = level
+        self._file = open(self.path + ".tmp", "wb") if self.path else target
+        self._start = self._file.tell()
+        self._data_hash = hashlib.sha256()
+        self._index: List[Dict] = []
+        self._block = bytearray()
+        self._block_ids: List[int] = []
+        self._block_category: Optional[str] = None
+        # id << 32 | block number, sorted into the directory on close
+        self._directory = array("Q")
+        self.entries = 0
+        self.bytes_written = 0
+        self._write(HEADER.pack(MAGIC, FORMAT_VERSION))
+
+    def _tell(self) -> int:
+        return self._file.tell() - self._start
+
+    def _write(self, data: bytes) -> None:
+        self._file.write(data)
+        self._data_hash.update(data)
+
+    def add_row(self, row: Tuple) -> None:
+        """
+        Append one row in PASSWORD_FIELDS order. Rows should arrive grouped
+        by category: a block is closed whenever the category changes.
+        """
+        password_id, website, url, username, password, category, notes, \
+            favorite, created_at, updated_at = row
+        name = category or "General"
+        if name != self._block_category:
+            self._flush_block()
+            self._block_category = name
+        encoded = [
+            None if value is None else str(value).encode("utf-8")
+            for value in (website, url, username, password, category, notes, created_at, updated_at)
+        ]
+        lengths = [NULL_LENGTH if value is None else len(value) for value in encoded]
+        body = b"".join(value for value in encoded if value)
+        self._block += RECORD_HEAD.pack(
+            RECORD_HEAD.size - LENGTH.size + len(body),
+            password_id, 1 if favorite else 0, *lengths
+        )
+        self._block += body
+
+        self._block_ids.append(password_id)
+        self._directory.append(password_id << 32 | len(self._index))
+        self.entries += 1
+        if len(self._block) >= self.block_size:
+            self._flush_block()
+
+    def add_rows(self, rows: Iterable[Tuple]) -> None:
+        for row in rows:
+            self.add_row(row)
+
+    def _flush_block(self) -> None:
+        if not self._block:
+            return
+        compressed = zlib.compress(bytes(self._block), self.level)
+        self._index.append({
+            "offset": self._tell(),
+            "length": len(compressed),
+            "raw_length": len(self._block),
+            "count": len(self._block_ids),
+            "first_id": min(self._block_ids),
+            "last_id": max(self._block_ids),
+            "crc32": zlib.crc32(compressed),
+            "category": self._block_category
+        })
+        self._write(compressed)
+        self._block = bytearray()
+        self._block_ids = []
+
+    def close(self) -> Dict:
+        """Finish the file and move it into place. Returns the manifest."""
+        self._flush_block()
+        directory_offset = self._tell()
+        packed = bytearray(DIRECTORY_ENTRY.size * len(self._directory))
+        for i, value in enumerate(sorted(self._directory)):
+            DIRECTORY_ENTRY.pack_into(packed, i * DIRECTORY_ENTRY.size, value >> 32, value & 0xFFFFFFFF)
+        self._write(packed)
+
+        index_bytes = json.dumps(self._index, separators=(",", ":")).encode()
+        index_offset = self._tell()
+        data_sha256 = self._data_hash.hexdigest()
+        self._file.write(index_bytes)
+
+        manifest = {
+            "format": FORMAT_VERSION,
+            "created_at": datetime.utcnow().isoformat() + "Z",
+            "entries": self.entries,
+            "blocks": len(self._index),
+            "directory_offset": directory_offset,
+            "index_offset": index_offset,
+            "index_length": len(index_bytes),
+            "index_sha256": hashlib.sha256(index_bytes).hexdigest(),
+            "data_sha256": data_sha256
+        }
+        manifest_bytes = json.dumps(manifest, separators=(",", ":")).encode()
+        manifest_offset = self._tell()
+        self._file.write(manifest_bytes)
+        self._file.write(TRAILER.pack(manifest_offset, len(manifest_bytes), TRAILER_MAGIC))
+        self.bytes_written = self._tell()
+        if self.path:
+            self._file.close()
+            os.replace(self.path + ".tmp", self.path)
+        return manifest
+
+    def abort(self) -> None:
+        """Drop a partially written archive."""
+        if not self.path:
+            return
+        self._file.close()
+        try:
+            os.remove(self.path + ".tmp")
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class ArchiveReader:
+    """
+    Random-access reader. Opening reads only the trailer, manifest and
+    index; entries are decoded block by block, and only the blocks that
+    can hold the requested ids or categories are read.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = os.open(path, os.O_RDONLY)
+        try:
+            self._load_index()
+        except Exception:
+            os.close(self._fd)
+            raise
+
+    def _read(self, offset: int, length: int) -> bytes:
+        data = os.pread(self._fd, length, offset)
+        if len(data) != length:
+            raise ArchiveError("Archive is truncated")
+        return data
+
+    def _load_index(self) -> None:
+        size = os.fstat(self._fd).st_size
+        if size < HEADER.size + TRAILER.size:
+            raise ArchiveError("Not a vault archive")
+        magic, version = HEADER.unpack(self._read(0, HEADER.size))
+        manifest_offset, manifest_length, end_magic = TRAILER.unpack(
+            self._read(size - TRAILER.size, TRAILER.size)
+        )
+        if magic != MAGIC or end_magic != TRAILER_MAGIC:
+            raise ArchiveError("Not a vault archive")
+        if version != FORMAT_VERSION:
+            raise ArchiveError(f"Unsupported archive format {version}")
+
+        # A damaged manifest or index surfaces as bad JSON, missing keys or
+        # impossible offsets: all of them mean the file is not usable
+        try:
+            self.manifest = json.loads(self._read(manifest_offset, manifest_length))
+            index_bytes = self._read(self.manifest["index_offset"], self.manifest["index_length"])
+            if hashlib.sha256(index_bytes).hexdigest() != self.manifest["index_sha256"]:
+                raise ArchiveError("Archive index checksum mismatch")
+            self.index: List[Dict] = json.loads(index_bytes)
+            if (not MANIFEST_KEYS <= self.manifest.keys()
+                    or any(not BLOCK_KEYS <= block.keys() for block in self.index)):
+                raise KeyError("missing fields")
+        except (ValueError, KeyError, TypeError, AttributeError, OverflowError, OSError) as e:
+            raise ArchiveError(f"Archive manifest is corrupt ({e.__class__.__name__})") from e
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def info(self) -> Dict:
+        """Get the manifest and per-category entry counts (index only)."""
+        categories: Dict[str, int] = {}
+        for block in self.index:
+            categories[block["category"]] = categories.get(block["category"], 0) + block["count"]
+        return dict(self.manifest, categories=categories)
+
+    def verify(self) -> Dict:
+        """Check the data checksum and every block's crc32 (reads the whole file)."""
+        digest = hashlib.sha256()
+        offset, end = 0, self.manifest["index_offset"]
+        while offset < end:
+            chunk = self._read(offset, min(1 << 20, end - offset))
+            digest.update(chunk)
+            offset += len(chunk)
+        bad_blocks = [
+            i for i, block in enumerate(self.index)
+            if zlib.crc32(self._read(block["offset"], block["length"])) != block["crc32"]
+        ]
+        valid = digest.hexdigest() == self.manifest["data_sha256"] and not bad_blocks
+        return {"valid": valid, "bad_blocks": bad_blocks, "entries": self.manifest["entries"]}
+
+    def _find_block(self, password_id: int) -> Optional[int]:
+        """Binary search the on-disk directory for the block holding an id."""
+        low, high = 0, self.manifest["entries"]
+        base = self.manifest["directory_offset"]
+        while low < high:
+            middle = (low + high) // 2
+            entry_id, block = DIRECTORY_ENTRY.unpack(
+                self._read(base + middle * DIRECTORY_ENTRY.size, DIRECTORY_ENTRY.size)
+            )
+            if entry_id == password_id:
+                return block
+            if entry_id < password_id:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def _select_blocks(self, categories: Optional[Set[str]], ids: Optional[Set[int]]) -> List[Dict]:
+        if ids is not None:
+            found = {self._find_block(password_id) for password_id in ids}
+            blocks = [self.index[i] for i in sorted(found - {None})]
+        else:
+            blocks = self.index
+        if categories is not None:
+            blocks = [b for b in blocks if b["category"] in categories]
+        return blocks
+
+    def _decode_block(self, block: Dict, ids: Optional[Set[int]]) -> List[Dict]:
+        compressed = self._read(block["offset"], block["length"])
+        if zlib.crc32(compressed) != block["crc32"]:
+            raise ArchiveError(f"Block at offset {block['offset']} is corrupt")
+        try:
+            return self._parse_block(zlib.decompress(compressed), ids)
+        except (zlib.error, struct.error, UnicodeDecodeError) as e:
+            raise ArchiveError(f"Block at offset {block['offset']} is corrupt") from e
+
+    @staticmethod
+    def _parse_block(data: bytes, ids: Optional[Set[int]]) -> List[Dict]:
+        view = memoryview(data)
+        unpack = RECORD_HEAD.unpack_from
+        entries = []
+        position, end = 0, len(data)
+        while position < end:
+            head = unpack(data, position)
+            next_position = position + LENGTH.size + head[0]
+            password_id = head[1]
+            if ids is not None and password_id not in ids:
+                position = next_position
+                continue
+            field_position = position + RECORD_HEAD.size
+            values = []
+            for size in head[3:]:
+                if size == NULL_LENGTH:
+                    values.append(None)
+                else:
+                    values.append(str(view[field_position:field_position + size], "utf-8"))
+                    field_position += size
+            position = next_position
+            entry = dict(zip(TEXT_FIELDS, values))
+            entry["id"] = password_id
+            entry["favorite"] = bool(head[2])
+            entries.append(entry)
+        return entries
+
+    def entries(self, categories: Optional[Iterable[str]] = None,
+                ids: Optional[Iterable[int]] = None, workers: int = 1) -> Iterator[Dict]:
+        """
+        Yield entries grouped by category (in id order within a category),
+        optionally only some categories or ids.
+        With workers > 1, blocks are read and decompressed on a thread pool
+        (file reads and zlib release the GIL) while earlier blocks are being
+        consumed. Record parsing still holds the GIL, so this pays off on
+        slow storage rather than for archives already in the page cache.
+        """
+        ids = set(ids) if ids is not None else None
+        blocks = self._select_blocks(set(categories) if categories is not None else None, ids)
+        return self._decode_blocks(blocks, ids, workers)
+
+    def _decode_blocks(self, blocks: List[Dict], ids: Optional[Set[int]],
+                       workers: int) -> Iterator[Dict]:
+        if workers <= 1:
+            for block in blocks:
+                yield from self._decode_block(block, ids)
+            return
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for decoded in pool.map(lambda b: self._decode_block(b, ids), blocks):
+                yield from decoded
+
+    def get_entry(self, password_id: int) -> Optional[Dict]:
+        """Get one entry by id, decoding a single block."""
+        return next(self.entries(ids=[password_id]), None)
+
+    def restore_into(self, db, categories: Optional[Iterable[str]] = None,
+                     ids: Optional[Iterable[int]] = None, workers: int = 1) -> Dict:
+        """
+        Import (all or selected) entries into a vault. Entries are streamed
+        into a single import_passwords transaction, never held all at once;
+        every selected block's crc32 is checked before the first insert.
+        """
+        start = time.perf_counter()
+        ids = set(ids) if ids is not None else None
+        blocks = self._select_blocks(set(categories) if categories is not None else None, ids)
+        for block in blocks:
+            if zlib.crc32(self._read(block["offset"], block["length"])) != block["crc32"]:
+                raise ArchiveError(f"Block at offset {block['offset']} is corrupt")
+        decoded = 0
+
+        def stream():
+            nonlocal decoded
+            for entry in self._decode_blocks(blocks, ids, workers):
+                decoded += 1
+                yield entry
+
+        result = db.import_passwords(stream())
+        return dict(
+            result,
+            decoded=decoded,
+            blocks_read=len(blocks),
+            blocks_total=len(self.index),
+            duration_ms=round((time.perf_counter() - start) * 1000, 3)
+        )
+
+
+def export_archive(db, target: Union[str, BinaryIO], block_size: int = BLOCK_SIZE) -> Dict:
+    """Stream a vault into an archive, one category at a time, without loading it in memory."""
+    start = time.perf_counter()
+    writer = ArchiveWriter(target, block_size)
+    try:
+        for category in db.get_categories():
+            for rows in db.iter_password_rows(category=category["name"]):
+                writer.add_rows(rows)
+        # Entries without a (still existing) category go last; they are
+        # restored into "General" like any entry without a category
+        for rows in db.iter_password_rows(uncategorized=True):
+            writer.add_rows(rows)
+    except Exception:
+        writer.abort()
+        raise
+    manifest = writer.close()
+    return {
+        "message": f"Exported {manifest['entries']} passwords",
+        "file": target if isinstance(target, str) else None,
+        "entries": manifest["entries"],
+        "blocks": manifest["blocks"],
+        "bytes": writer.bytes_written,
+        "duration_ms": round((time.perf_counter() - start) * 1000, 3)
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Export, inspect and restore vault archives")
+    parser.add_argument("command", choices=["export", "restore", "info", "verify"])
+    parser.add_argument("archive", help="archive file")
+    parser.add_argument("--db", default="passwords.db", help="vault database file")
+    parser.add_argument("--key", default="key.key", help="vault key file")
+    parser.add_argument("--category", action="append", help="restore: only this category")
+    parser.add_argument("--id", type=int, action="append", help="restore: only this entry id")
+    parser.add_argument("--workers", type=int, default=1, help="restore: decode threads")
+    args = parser.parse_args(argv)
+
+    if args.command in ("export", "restore"):
+        from database_manager import DatabaseManager
+        db = DatabaseManager(db_file=args.db, key_file=args.key)
+        try:
+            if args.command == "export":
+                result = export_archive(db, args.archive)
+            else:
+                with ArchiveReader(args.archive) as reader:
+                    result = reader.restore_into(db, args.category, args.id, args.workers)
+        finally:
+            db.close()
+    else:
+        with ArchiveReader(args.archive) as reader:
+            result = reader.info() if args.command == "info" else reader.verify()
+
+    print(json.dumps(result, indent=2))
+    return 0 if result.get("valid", True) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,40 +1,130 @@
 """
 PASSWORD MANAGER - Enhanced Authentication Manager
-Features: Bcrypt hashing, JWT tokens, Session management
+Features: Bcrypt hashing with a cost calibrated to the host, Rehash on
+login, JWT tokens, Session management
 """
 
 import os
 import hashlib
+import re
 import secrets
+import sys
+import threading
 import bcrypt
 import jwt
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from typing import Optional, Dict
 
+from instrumentation import metrics
+
+# Target duration of one master password check: the bcrypt cost is the
+# highest whose hash time on this host stays under it
+BCRYPT_TARGET_MS = float(os.environ.get("PM_BCRYPT_TARGET_MS", "250"))
+# Fixed cost instead of calibrating (e.g. identical hosts sharing one vault)
+BCRYPT_ROUNDS = int(os.environ["PM_BCRYPT_ROUNDS"]) if os.environ.get("PM_BCRYPT_ROUNDS") else None
+# Costs are kept within these bounds whatever the host speed
+BCRYPT_MIN_ROUNDS = 10
+BCRYPT_MAX_ROUNDS = 16
+# Cost timed by the calibration, cheap enough to run on first use
+CALIBRATION_ROUNDS = 8
+
+BCRYPT_HASH = re.compile(rb"^\$2[abxy]?\$(\d\d)\$")
+
+metrics.describe("pm_auth_rehash_total", "counter",
+                 "Master password hashes upgraded on login, by reason.")
+
+_calibration_lock = threading.Lock()
+_calibrated: Dict[float, int] = {}
+
+
+def calibrate_bcrypt_rounds(target_ms: float = BCRYPT_TARGET_MS) -> int:
+    """
+    Get the highest bcrypt cost whose hash takes at most target_ms on this
+    host (within BCRYPT_MIN_ROUNDS..BCRYPT_MAX_ROUNDS). Each extra round
+    doubles the work, so the best of a few timed hashes at
+    CALIBRATION_ROUNDS predicts every cost. Measured once per process.
+    """
+    with _calibration_lock:
+        if target_ms not in _calibrated:
+            samples = []
+            for _ in range(3):
+                start = time.perf_counter()
+                bcrypt.hashpw(b"calibration", bcrypt.gensalt(rounds=CALIBRATION_ROUNDS))
+                samples.append((time.perf_counter() - start) * 1000)
+            elapsed = min(samples) * 2 ** (BCRYPT_MIN_ROUNDS - CALIBRATION_ROUNDS)
+            rounds = BCRYPT_MIN_ROUNDS
+            while rounds < BCRYPT_MAX_ROUNDS and elapsed * 2 <= target_ms:
+                rounds += 1
+                elapsed *= 2
+            _calibrated[target_ms] = rounds
+        return _calibrated[target_ms]
+
+
+def bcrypt_rounds(stored_hash: bytes) -> Optional[int]:
+    """Get the cost stored in a bcrypt hash ("$2b$12$..." -> 12), None if not bcrypt."""
+    match = BCRYPT_HASH.match(stored_hash.strip())
+    return int(match.group(1)) if match else None
+
 
 class AuthManager:
     def __init__(
         self,
         master_file: str = "master.key",
-        secret_key: Optional[str] = None
+        secret_key: Optional[str] = None,
+        secret_file: str = "jwt_secret.key",
+        bcrypt_rounds: Optional[int] = BCRYPT_ROUNDS
     ):
         self.master_file = master_file
+        # None: calibrate to BCRYPT_TARGET_MS on first use
+        self._bcrypt_rounds = bcrypt_rounds
+        self.secret_file = secret_file
         self.secret_key = secret_key or self._load_or_generate_secret()
         self.token_expiry = timedelta(hours=2)
         self.active_sessions: Dict[str, datetime] = {}
+        # Recently verified tokens, least recently used first, so each
+        # request skips the JWT signature check
+        self.token_cache: "OrderedDict[str, Dict]" = OrderedDict()
+        self.token_cache_size = 1024
+        self._token_cache_lock = threading.Lock()
 
     def _load_or_generate_secret(self) -> str:
         """Load or generate JWT secret key."""
-        secret_file = "jwt_secret.key"
-        if os.path.exists(secret_file):
-            with open(secret_file, "r") as f:
+        if os.path.exists(self.secret_file):
+            with open(self.secret_file, "r") as f:
                 return f.read().strip()
         else:
             secret = secrets.token_hex(32)
-            with open(secret_file, "w") as f:
+            with open(self.secret_file, "w") as f:
                 f.write(secret)
             return secret
 
+    @property
+    def bcrypt_rounds(self) -> int:
+        """The bcrypt cost new and upgraded hashes get."""
+        if self._bcrypt_rounds is None:
+            self._bcrypt_rounds = calibrate_bcrypt_rounds()
+        return self._bcrypt_rounds
+
+    def _hash_password(self, password: str) -> bytes:
+        """Hash with bcrypt at the current cost; the cost is stored in the hash."""
+        salt = bcrypt.gensalt(rounds=self.bcrypt_rounds)
+        start = time.perf_counter()
+        hashed = bcrypt.hashpw(password.encode(), salt)
+        metrics.observe("pm_crypto_operation_duration_seconds",
+                        time.perf_counter() - start, operation="bcrypt_hash")
+        return hashed
+
+    def _store_hash(self, hashed: bytes) -> None:
+        """Replace the master file atomically, so a crash never leaves it half written."""
+        tmp_file = f"{self.master_file}.tmp"
+        with open(tmp_file, "wb") as f:
+            f.write(hashed)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.master_file)
+
     def set_master_password(self, password: str) -> Dict:
         """
         Set master password using bcrypt hashing.
@@ -43,43 +133,47 @@ class AuthManager:
         if len(password) < 8:
             return {"error": "Password must be at least 8 characters long"}
         
-        # Generate salt and hash password
-        salt = bcrypt.gensalt(rounds=12)
-        hashed = bcrypt.hashpw(password.encode(), salt)
-        
-        with open(self.master_file, "wb") as f:
-            f.write(hashed)
-        
+        self._store_hash(self._hash_password(password))
         return {"message": "Master password set successfully"}
 
     def check_master_password(self, password: str) -> bool:
-        """Verify master password against stored hash."""
+        """
+        Verify master password against stored hash. After a successful
+        check, a hash below the current cost (or a legacy SHA-256 hash) is
+        replaced with one at the current cost.
+        """
         if not os.path.exists(self.master_file):
             return False
         
         with open(self.master_file, "rb") as f:
             stored_hash = f.read()
         
-        try:
-            return bcrypt.checkpw(password.encode(), stored_hash)
-        except Exception:
+        start = time.perf_counter()
+        rounds = bcrypt_rounds(stored_hash)
+        if rounds is not None:
+            try:
+                valid = bcrypt.checkpw(password.encode(), stored_hash.strip())
+            except ValueError:
+                # A bcrypt prefix on a damaged hash ("Invalid salt")
+                valid = False
+        else:
             # Fallback for legacy SHA-256 hashes (migration support)
-            return self._check_legacy_password(password)
+            valid = self._check_legacy_password(password, stored_hash)
+        metrics.observe("pm_crypto_operation_duration_seconds",
+                        time.perf_counter() - start, operation="bcrypt_check")
+
+        if valid and (rounds is None or rounds < self.bcrypt_rounds):
+            # The plaintext is only known now: upgrade the hash in place
+            self._store_hash(self._hash_password(password))
+            metrics.inc("pm_auth_rehash_total", reason="legacy" if rounds is None else "cost")
+        return valid
 
-    def _check_legacy_password(self, password: str) -> bool:
+    def _check_legacy_password(self, password: str, stored_hash: bytes) -> bool:
         """Check against legacy SHA-256 hash for migration."""
-        try:
-            with open(self.master_file, "r") as f:
-                saved_hash = f.read().strip()
-            
-            if len(saved_hash) == 64:  # SHA-256 hex length
-                if saved_hash == hashlib.sha256(password.encode()).hexdigest():
-                    # Migrate to bcrypt
-                    self.set_master_password(password)
-                    return True
-        except Exception:
-            pass
-        return False
+        saved_hash = stored_hash.strip().decode("ascii", errors="replace")
+        if len(saved_hash) != 64:  # SHA-256 hex length
+            return False
+        return secrets.compare_digest(saved_hash, hashlib.sha256(password.encode()).hexdigest())
 
     def master_exists(self) -> bool:
         """Check if master password is set."""
@@ -98,21 +192,45 @@ class AuthManager:
 
     def verify_token(self, token: str) -> Dict:
         """Verify JWT token and return payload."""
-        try:
-            payload = jwt.decode(token, self.secret_key, algorithms=["HS256"])
-            session_id = payload.get("session_id")
-            
-            if session_id not in self.active_sessions:
-                return {"valid": False, "error": "Session invalidated"}
-            
-            # Update session activity
-            self.active_sessions[session_id] = datetime.utcnow()
-            
-            return {"valid": True, "payload": payload}
-        except jwt.ExpiredSignatureError:
-            return {"valid": False, "error": "Token expired"}
-        except jwt.InvalidTokenError:
-            return {"valid": False, "error": "Invalid token"}
+        with self._token_cache_lock:
+            payload = self.token_cache.get(token)
+            if payload is not None:
+                self.token_cache.move_to_end(token)
+        if payload is not None and payload["exp"] > time.time():
+            metrics.inc("pm_auth_token_cache_total", result="hit")
+        else:
+            metrics.inc("pm_auth_token_cache_total", result="miss")
+            try:
+                payload = jwt.decode(token, self.secret_key, algorithms=["HS256"])
+            except jwt.ExpiredSignatureError:
+                self._forget_token(token)
+                return {"valid": False, "error": "Token expired"}
+            except jwt.InvalidTokenError:
+                return {"valid": False, "error": "Invalid token"}
+
+            with self._token_cache_lock:
+                self.token_cache[token] = payload
+                if len(self.token_cache) > self.token_cache_size:
+                    self.token_cache.popitem(last=False)
+
+        session_id = payload.get("session_id")
+        
+        if session_id not in self.active_sessions:
+            self._forget_token(token)
+            return {"valid": False, "error": "Session invalidated"}
+        
+        # Update session activity
+        self.active_sessions[session_id] = datetime.utcnow()
+        
+        return {"valid": True, "payload": payload}
+
+    def _forget_token(self, token: Optional[str] = None) -> None:
+        """Drop one token from the cache, or all of them."""
+        with self._token_cache_lock:
+            if token is None:
+                self.token_cache.clear()
+            else:
+                self.token_cache.pop(token, None)
 
     def invalidate_token(self, token: str) -> Dict:
         """Invalidate a token (logout)."""
@@ -125,6 +243,7 @@ class AuthManager:
             session_id = payload.get("session_id")
             if session_id in self.active_sessions:
                 del self.active_sessions[session_id]
+            self._forget_token(token)
             return {"message": "Logged out successfully"}
         except Exception:
             return {"error": "Invalid token"}
@@ -142,6 +261,7 @@ class AuthManager:
         if "error" not in result:
             # Invalidate all sessions
             self.active_sessions.clear()
+            self._forget_token()
         
         return result
 
@@ -165,3 +285,16 @@ class AuthManager:
         return len(self.active_sessions)
 
 
+
+
+if __name__ == "__main__":
+    # python auth_manager.py calibrate [target_ms]
+    if len(sys.argv) >= 2 and sys.argv[1] == "calibrate":
+        target = float(sys.argv[2]) if len(sys.argv) > 2 else BCRYPT_TARGET_MS
+        rounds = calibrate_bcrypt_rounds(target)
+        start = time.perf_counter()
+        bcrypt.hashpw(b"calibration", bcrypt.gensalt(rounds=rounds))
+        print(f"✅ bcrypt cost {rounds} for a {target:.0f} ms target "
+              f"(measured {(time.perf_counter() - start) * 1000:.0f} ms)")
+    else:
+        print("Usage: python auth_manager.py calibrate [target_ms]")
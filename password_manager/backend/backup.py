@@ -0,0 +1,462 @@
+"""
+PASSWORD MANAGER - Online Backups
+Features: Full snapshots through SQLite's online backup API, Incremental
+backups from the change log, Gzip compression, Retention, Point-in-time restore
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from instrumentation import metrics
+
+# Pages copied per backup step; writers only wait for one step at a time
+PAGES_PER_STEP = int(os.environ.get("PM_BACKUP_PAGES_PER_STEP", "256"))
+# Pause between steps, in seconds, so queued writes get the database
+STEP_SLEEP = float(os.environ.get("PM_BACKUP_STEP_SLEEP", "0.01"))
+# Full snapshots kept; incrementals are removed with their full snapshot
+KEEP_FULL = int(os.environ.get("PM_BACKUP_KEEP", "7"))
+# Incrementals taken on top of one full snapshot before a new full is forced
+MAX_CHAIN = int(os.environ.get("PM_BACKUP_MAX_CHAIN", "24"))
+# Restarts (source written mid-copy) tolerated before copying in one step
+MAX_RESTARTS = 3
+
+MANIFEST = "manifest.json"
+INCREMENTAL_FORMAT = 1
+
+metrics.describe("pm_backup_duration_seconds", "histogram",
+                 "Backup run duration by type.")
+
+
+class _CopyRestarted(Exception):
+    """The source kept changing while it was copied step by step."""
+
+
+class BackupManager:
+    """
+    Takes consistent backups of a live vault without stopping the server.
+
+    Full snapshots use SQLite's online backup API on a separate connection,
+    PAGES_PER_STEP pages at a time, so a write only ever waits for one step.
+    Incremental backups store the rows touched since the previous backup
+    (found through the change log) and are replayed on top of their full
+    snapshot by restore(). Stored passwords stay Fernet tokens: the key
+    file is not part of the backup and must be kept separately.
+    """
+
+    def __init__(self, db_file: str = "passwords.db", backup_dir: str = "backups",
+                 keep_full: int = KEEP_FULL, max_chain: int = MAX_CHAIN,
+                 pages_per_step: int = PAGES_PER_STEP, step_sleep: float = STEP_SLEEP):
+        self.db_file = db_file
+        self.backup_dir = backup_dir
+        self.keep_full = keep_full
+        self.max_chain = max_chain
+        self.pages_per_step = pages_per_step
+        self.step_sleep = step_sleep
+        self._lock = threading.Lock()
+
+    # =====================================
+    # Manifest
+    # =====================================
+    def list_backups(self) -> List[Dict]:
+        """Get the recorded backups, oldest first."""
+        try:
+            with open(os.path.join(self.backup_dir, MANIFEST)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return []
+
+    def _save_manifest(self, entries: List[Dict]) -> None:
+        path = os.path.join(self.backup_dir, MANIFEST)
+        with open(path + ".tmp", "w") as f:
+            json.dump(entries, f, indent=2)
+        os.replace(path + ".tmp", path)
+
+    def _record(self, report: Dict) -> None:
+        entries = self.list_backups()
+        entries.append(report)
+        entries = self._apply_retention(entries)
+        self._save_manifest(entries)
+
+    def _apply_retention(self, entries: List[Dict]) -> List[Dict]:
+        """Drop the oldest full snapshots (and their incrementals) over keep_full."""
+        fulls = [e["id"] for e in entries if e["type"] == "full"]
+        expired = set(fulls[:max(0, len(fulls) - self.keep_full)])
+        kept = []
+        for entry in entries:
+            if entry["id"] in expired or entry.get("base") in expired:
+                try:
+                    os.remove(os.path.join(self.backup_dir, entry["file"]))
+                except FileNotFoundError:
+                    pass
+            else:
+                kept.append(entry)
+        return kept
+
+    @staticmethod
+    def _new_id() -> str:
+        return datetime.utcnow().strftime("%Y%m%dT%H%M%S%fZ")
+
+    # =====================================
+    # Full Snapshots
+    # =====================================
+    def full_backup(self) -> Dict:
+        """Copy the live database page by page and store it gzip-compressed."""
+        with self._lock:
+            os.makedirs(self.backup_dir, mode=0o700, exist_ok=True)
+            return self._full_backup()
+
+    def _full_backup(self) -> Dict:
+        start = time.perf_counter()
+        backup_id = self._new_id()
+        file_name = f"full-{backup_id}.db.gz"
+        copy_path = os.path.join(self.backup_dir, f".{backup_id}.db")
+        progress = {"steps": 0, "restarts": 0, "pages": 0, "remaining": None}
+
+        def on_step(status, remaining, total):
+            if progress["remaining"] is not None and remaining > progress["remaining"]:
+                # Another connection wrote to the source: SQLite restarted the copy
+                progress["restarts"] += 1
+                if progress["restarts"] > MAX_RESTARTS:
+                    raise _CopyRestarted()
+            progress["steps"] += 1
+            progress["pages"] = total
+            progress["remaining"] = remaining
+
+        source = sqlite3.connect(self.db_file, timeout=30)
+        target = sqlite3.connect(copy_path)
+        try:
+            try:
+                source.backup(target, pages=self.pages_per_step,
+                              progress=on_step, sleep=self.step_sleep)
+                single_step = False
+            except _CopyRestarted:
+                # Writes are too frequent to finish step by step: copy
+                # everything under one read lock instead
+                source.backup(target)
+                single_step = True
+            version = target.execute(
+                "SELECT seq FROM sqlite_sequence WHERE name = 'changes'"
+            ).fetchone()
+            schema_version = target.execute("PRAGMA user_version").fetchone()[0]
+            stats_version = _stats_version(target)
+        finally:
+            source.close()
+            target.close()
+        copy_ms = (time.perf_counter() - start) * 1000
+
+        compress_start = time.perf_counter()
+        try:
+            digest = self._compress_file(copy_path, os.path.join(self.backup_dir, file_name))
+            source_bytes = os.path.getsize(copy_path)
+        finally:
+            os.remove(copy_path)
+        compress_ms = (time.perf_counter() - compress_start) * 1000
+
+        report = {
+            "id": backup_id,
+            "type": "full",
+            "file": file_name,
+            "created_at": datetime.utcnow().isoformat() + "Z",
+            "version": version[0] if version else 0,
+            "stats_version": stats_version,
+            "schema_version": schema_version,
+            "source_bytes": source_bytes,
+            "bytes": os.path.getsize(os.path.join(self.backup_dir, file_name)),
+            "sha256": digest,
+            "pages": progress["pages"],
+            "steps": progress["steps"],
+            "restarts": progress["restarts"],
+            "single_step": single_step,
+            "copy_ms": round(copy_ms, 3),
+            "compress_ms": round(compress_ms, 3),
+            "duration_ms": round((time.perf_counter() - start) * 1000, 3)
+        }
+        self._record(report)
+        metrics.observe("pm_backup_duration_seconds", report["duration_ms"] / 1000, type="full")
+        return report
+
+    @staticmethod
+    def _compress_file(source_path: str, target_path: str) -> str:
+        """Gzip a file atomically and return the sha256 of the compressed bytes."""
+        with open(source_path, "rb") as src, open(target_path + ".tmp", "wb") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6, mtime=0) as out:
+                shutil.copyfileobj(src, out, 1 << 20)
+        os.replace(target_path + ".tmp", target_path)
+        return _sha256(target_path)
+
+    # =====================================
+    # Incremental Backups
+    # =====================================
+    def incremental_backup(self) -> Dict:
+        """
+        Store the rows changed since the last backup. Falls back to a full
+        snapshot when there is none to build on, the chain is long, the
+        schema changed or the change log no longer covers the gap.
+        """
+        with self._lock:
+            os.makedirs(self.backup_dir, mode=0o700, exist_ok=True)
+            entries = self.list_backups()
+            fulls = [e for e in entries if e["type"] == "full"]
+            if not fulls:
+                return dict(self._full_backup(), reason="no full snapshot")
+            base = fulls[-1]
+            chain = [e for e in entries if e.get("base") == base["id"]]
+            if len(chain) >= self.max_chain:
+                return dict(self._full_backup(), reason="incremental chain limit")
+            last = chain[-1] if chain else base
+            return self._incremental_backup(base, last["version"], last.get("stats_version", 0))
+
+    def _incremental_backup(self, base: Dict, since: int, stats_since: int) -> Dict:
+        start = time.perf_counter()
+        conn = sqlite3.connect(self.db_file, timeout=30, isolation_level=None)
+        try:
+            # One read transaction, so every table is read at the same version
+            conn.execute("BEGIN")
+            schema_version = conn.execute("PRAGMA user_version").fetchone()[0]
+            row = conn.execute("SELECT value FROM meta WHERE key = 'sync_horizon'").fetchone()
+            horizon = int(row[0]) if row else 0
+            if schema_version != base["schema_version"] or since < horizon:
+                conn.execute("COMMIT")
+                conn.close()
+                conn = None
+                reason = "schema changed" if schema_version != base["schema_version"] \
+                    else "change log compacted"
+                return dict(self._full_backup(), reason=reason)
+
+            row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'changes'").fetchone()
+            version = row[0] if row else 0
+            stats_version = _stats_version(conn)
+            if version <= since and stats_version <= stats_since:
+                conn.execute("COMMIT")
+                return {"message": "No changes since the last backup", "type": "incremental",
+                        "version": version, "skipped": True}
+
+            tables = {"changes": _select(conn, "SELECT * FROM changes WHERE version > ?", (since,))}
+            # Logged changes, plus entries whose usage, strength or breach
+            # result changed (not logged, see migrations._stats_versions)
+            touched = {r[1] for r in tables["changes"]["rows"]}
+            if stats_version > stats_since:
+                touched.update(r[0] for r in conn.execute(
+                    "SELECT id FROM passwords WHERE stats_version > ?", (stats_since,)
+                ))
+            touched = sorted(touched)
+            # Word indexes of encrypted metadata (schema 6 and later)
+            has_tokens = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'entry_tokens'"
+            ).fetchone()
+            passwords = {"columns": [], "rows": []}
+            tokens = {"columns": ["token", "password_id"], "rows": []}
+            for i in range(0, len(touched), 500):
+                chunk = touched[i:i + 500]
+                placeholders = ", ".join("?" * len(chunk))
+                part = _select(
+                    conn, f"SELECT * FROM passwords WHERE id IN ({placeholders})", chunk
+                )
+                passwords["columns"] = part["columns"]
+                passwords["rows"].extend(part["rows"])
+                if has_tokens:
+                    tokens["rows"].extend(conn.execute(
+                        f"SELECT token, password_id FROM entry_tokens "
+                        f"WHERE password_id IN ({placeholders})", chunk
+                    ).fetchall())
+            tables["passwords"] = passwords
+            if has_tokens:
+                tables["entry_tokens"] = tokens
+            tables["categories"] = _select(conn, "SELECT * FROM categories")
+            tables["meta"] = _select(conn, "SELECT * FROM meta")
+            conn.execute("COMMIT")
+        finally:
+            if conn is not None:
+                conn.close()
+        read_ms = (time.perf_counter() - start) * 1000
+
+        present = {r[0] for r in tables["passwords"]["rows"]}
+        backup_id = self._new_id()
+        file_name = f"incr-{backup_id}.json.gz"
+        payload = json.dumps({
+            "format": INCREMENTAL_FORMAT,
+            "base": base["id"],
+            "from_version": since,
+            "version": version,
+            "schema_version": schema_version,
+            "tables": tables,
+            "deleted": [i for i in touched if i not in present]
+        }, separators=(",", ":")).encode()
+
+        compress_start = time.perf_counter()
+        path = os.path.join(self.backup_dir, file_name)
+        with open(path + ".tmp", "wb") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6, mtime=0) as out:
+                out.write(payload)
+        os.replace(path + ".tmp", path)
+        compress_ms = (time.perf_counter() - compress_start) * 1000
+
+        report = {
+            "id": backup_id,
+            "type": "incremental",
+            "file": file_name,
+            "base": base["id"],
+            "created_at": datetime.utcnow().isoformat() + "Z",
+            "from_version": since,
+            "version": version,
+            "stats_version": stats_version,
+            "schema_version": schema_version,
+            "entries": len(touched),
+            "source_bytes": len(payload),
+            "bytes": os.path.getsize(path),
+            "sha256": _sha256(path),
+            "copy_ms": round(read_ms, 3),
+            "compress_ms": round(compress_ms, 3),
+            "duration_ms": round((time.perf_counter() - start) * 1000, 3)
+        }
+        self._record(report)
+        metrics.observe("pm_backup_duration_seconds", report["duration_ms"] / 1000,
+                        type="incremental")
+        return report
+
+    # =====================================
+    # Restore
+    # =====================================
+    def restore(self, target_file: str, backup_id: Optional[str] = None) -> Dict:
+        """
+        Rebuild a database file as of a backup (the latest when omitted):
+        its full snapshot plus the incrementals up to it. Never writes to
+        the live database.
+        """
+        if os.path.abspath(target_file) == os.path.abspath(self.db_file):
+            return {"error": "Refusing to restore over the live database"}
+        if os.path.exists(target_file):
+            return {"error": f"{target_file} already exists"}
+
+        entries = self.list_backups()
+        if not entries:
+            return {"error": "No backups found"}
+        wanted = next((e for e in entries if e["id"] == backup_id), None) if backup_id \
+            else entries[-1]
+        if wanted is None:
+            return {"error": f"Backup {backup_id} not found"}
+        base_id = wanted["id"] if wanted["type"] == "full" else wanted["base"]
+        base = next(e for e in entries if e["id"] == base_id)
+        chain = [e for e in entries if e.get("base") == base_id and e["id"] <= wanted["id"]]
+
+        for entry in [base] + chain:
+            if _sha256(os.path.join(self.backup_dir, entry["file"])) != entry["sha256"]:
+                return {"error": f"Backup {entry['id']} is corrupt (checksum mismatch)"}
+
+        start = time.perf_counter()
+        work_path = target_file + ".restoring"
+        with gzip.open(os.path.join(self.backup_dir, base["file"]), "rb") as src, \
+                open(work_path, "wb") as out:
+            shutil.copyfileobj(src, out, 1 << 20)
+
+        conn = sqlite3.connect(work_path)
+        try:
+            for entry in chain:
+                with gzip.open(os.path.join(self.backup_dir, entry["file"]), "rb") as f:
+                    _apply_incremental(conn, json.load(f))
+            check = conn.execute("PRAGMA integrity_check").fetchone()[0]
+        finally:
+            conn.close()
+        if check != "ok":
+            os.remove(work_path)
+            return {"error": f"Restored database failed integrity check: {check}"}
+        os.replace(work_path, target_file)
+
+        return {
+            "message": "Backup restored",
+            "file": target_file,
+            "backup": wanted["id"],
+            "version": wanted["version"],
+            "incrementals_applied": len(chain),
+            "duration_ms": round((time.perf_counter() - start) * 1000, 3)
+        }
+
+
+def _select(conn: sqlite3.Connection, sql: str, params=()) -> Dict:
+    cursor = conn.execute(sql, params)
+    return {"columns": [d[0] for d in cursor.description], "rows": cursor.fetchall()}
+
+
+def _apply_incremental(conn: sqlite3.Connection, data: Dict) -> None:
+    """Replay one incremental backup in a single transaction."""
+    if data.get("format") != INCREMENTAL_FORMAT:
+        raise ValueError(f"Unsupported incremental format: {data.get('format')}")
+    with conn:
+        for table in ("categories", "meta", "passwords", "changes"):
+            columns = data["tables"][table]["columns"]
+            rows = data["tables"][table]["rows"]
+            if not rows:
+                continue
+            conn.executemany(
+                f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) "
+                f"VALUES ({', '.join('?' * len(columns))})",
+                rows
+            )
+        tokens = data["tables"].get("entry_tokens")
+        if tokens is not None:
+            # The replayed entries' word indexes replace their old ones
+            conn.executemany(
+                "DELETE FROM entry_tokens WHERE password_id = ?",
+                [(row[0],) for row in data["tables"]["passwords"]["rows"]]
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO entry_tokens (token, password_id) VALUES (?, ?)",
+                tokens["rows"]
+            )
+        conn.executemany("DELETE FROM passwords WHERE id = ?", [(i,) for i in data["deleted"]])
+
+
+def _stats_version(conn: sqlite3.Connection) -> int:
+    """Number of the last update left out of the change log (0 before schema 7)."""
+    try:
+        row = conn.execute("SELECT value FROM meta WHERE key = 'stats_version'").fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return int(row[0]) if row else 0
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Back up or restore a password vault")
+    parser.add_argument("command", choices=["full", "incremental", "list", "restore"])
+    parser.add_argument("target", nargs="?", help="restore: database file to create")
+    parser.add_argument("--db", default="passwords.db", help="live database file")
+    parser.add_argument("--dir", default="backups", help="backup directory")
+    parser.add_argument("--id", help="restore: backup id (default: latest)")
+    args = parser.parse_args(argv)
+
+    manager = BackupManager(db_file=args.db, backup_dir=args.dir)
+    if args.command == "full":
+        result = manager.full_backup()
+    elif args.command == "incremental":
+        result = manager.incremental_backup()
+    elif args.command == "list":
+        result = manager.list_backups()
+    else:
+        if not args.target:
+            parser.error("restore needs a target file")
+        result = manager.restore(args.target, args.id)
+
+    print(json.dumps(result, indent=2))
+    return 1 if isinstance(result, dict) and "error" in result else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
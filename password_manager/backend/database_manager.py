@@ -1,78 +1,142 @@
 """
 PASSWORD MANAGER - Enhanced Database Manager
-Features: Encryption, Categories, Search, Export/Import
+Features: Encryption, Encrypted metadata with blind index lookups,
+Categories, Search, Export/Import
 """
 
 import sqlite3
 import json
+import math
 import os
+import threading
+import time
 from datetime import datetime
-from cryptography.fernet import Fernet
-from typing import List, Dict, Optional, Tuple
+from contextlib import contextmanager
+from functools import wraps
+from itertools import groupby
+from operator import attrgetter, itemgetter
+from cryptography.fernet import Fernet, InvalidToken
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from field_crypto import METADATA_FIELDS, FieldCipher, Metadata
+from host_filter import HostFilter
+from instrumentation import metrics
+from profiler import ProfiledConnection
+from migrations import migrate, register_functions
+from password_generator import breach_check_result
+from records import (PASSWORD_COLUMNS, PASSWORD_FIELDS, PASSWORD_FROM, PASSWORD_SELECT,
+                     PasswordRecord, record_factory)
+from search_index import MetadataIndex
+from site_matcher import SiteIndex, site_key
+from write_queue import PendingWrite, WriteQueue
+
+# Operations accepted by bulk_apply() and the fields an "update" may change
+BULK_OPERATIONS = ("delete", "move", "favorite", "update")
+UPDATE_FIELDS = ("website", "username", "password", "url", "category", "notes", "favorite")
+# Writes touching more entries than this rebuild the search index lazily
+# instead of refreshing it entry by entry
+INDEX_REFRESH_LIMIT = 5000
+# Site keys a fuzzy search adds to its LIKE filter
+SEARCH_SITE_MATCHES = 20
+# Change notices sent for one commit or replay; past this a single
+# "resync" notice is sent instead
+NOTICE_LIMIT = 1000
+# Uses of an entry count half as much after this many days: an entry
+# used once today outranks one used once two half-lives ago
+FRECENCY_HALF_LIFE_DAYS = float(os.environ.get("PM_FRECENCY_HALF_LIFE_DAYS", "14"))
+# Buffered entry uses are written once this many entries are pending (and
+# by the "usage" maintenance job, and on close)
+USAGE_FLUSH_SIZE = int(os.environ.get("PM_USAGE_FLUSH_SIZE", "256"))
+# Page cache (KiB) while encrypt_plaintext_rows() converts a vault
+MIGRATION_CACHE_KIB = 65536
+# Strength scores (0-100, see PasswordGenerator.check_strength) below this
+# are "Weak" or "Very Weak"
+WEAK_STRENGTH_SCORE = 40
+
+
+def synchronized(method):
+    """Serialize access to the shared SQLite connection, which is not thread-safe."""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def use_score(used_at: float) -> float:
+    """
+    Frecency of one use at a Unix time. Instead of decaying old scores,
+    later uses score higher (by one per half-life, on a log scale), so stored
+    scores never need rewriting and compare directly.
+    """
+    return used_at * math.log(2) / (FRECENCY_HALF_LIFE_DAYS * 86400)
+
+
+def add_scores(a: float, b: float) -> float:
+    """Combine two frecency scores (log of the sum of the decayed uses)."""
+    high, low = max(a, b), min(a, b)
+    return high + math.log1p(math.exp(low - high))
+
+
+def queued(method):
+    """
+    Send a write through the vault's write queue (group commit) when one is
+    enabled. The caller waits for the writer thread, so it must not hold
+    self.lock meanwhile (read_snapshot() blocks are read-only).
+    """
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        write_queue = self.write_queue
+        if write_queue is None or write_queue.in_writer():
+            return method(self, *args, **kwargs)
+        return write_queue.submit(method, self, *args, **kwargs)
+    return wrapper
 
 
 class DatabaseManager:
     def __init__(self, db_file: str = "passwords.db", key_file: str = "key.key"):
         self.db_file = db_file
         self.key_file = key_file
-        self.conn = sqlite3.connect(self.db_file, check_same_thread=False)
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(
+            self.db_file, check_same_thread=False, factory=ProfiledConnection
+        )
         self.cursor = self.conn.cursor()
+        register_functions(self.conn)
         self.create_tables()
-        self.key = self.load_key()
+        self.set_key(self.load_key())
+        # In-process category cache, categories change far less often than they are read
+        self._categories: Optional[List[Dict]] = None
+        self._category_ids: Dict[str, int] = {}
+        # Typeahead index of non-secret metadata, built on first use and
+        # refreshed after each commit for the entries that changed
+        self.search_index = MetadataIndex()
+        # Fuzzy index of distinct site keys, maintained the same way
+        self.site_index = SiteIndex()
+        # Bloom filter of the sites with entries, served to the extension
+        self.host_filter = HostFilter()
+        self._index_dirty: Set[int] = set()
+        # PRAGMA data_version when the caches were last known current; it
+        # changes when another process (e.g. vault_cli.py) commits
+        self._data_version: Optional[int] = None
+        # Called with the change notices of each commit while watched (see
+        # watch_changes); _published_version is the last version reported
+        self._change_listener: Optional[Callable[[List[Dict]], bool]] = None
+        self._published_version = 0
+        # Optional group commit of the single-entry and bulk writes, see
+        # enable_write_queue(); _group_commit is set while a group runs
+        self.write_queue: Optional[WriteQueue] = None
+        self._group_commit = False
+        # Entry uses not yet written: id -> [uses, last use (Unix time), frecency].
+        # Own lock, so recording a use never waits for the database
+        self._usage: Dict[int, list] = {}
+        self._usage_lock = threading.Lock()
+        # Vaults from before encrypted metadata are converted on first open
+        self.encrypt_plaintext_rows()
 
     def create_tables(self) -> None:
-        """Create all necessary tables for the password manager."""
-        # Main passwords table with enhanced fields
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS passwords (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                website TEXT NOT NULL,
-                url TEXT,
-                username TEXT NOT NULL,
-                password TEXT NOT NULL,
-                category TEXT DEFAULT 'General',
-                notes TEXT,
-                favorite INTEGER DEFAULT 0,
-                auto_saved INTEGER DEFAULT 0,
-                breach_check_result TEXT,
-                strength_score INTEGER DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Categories table
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS categories (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT UNIQUE NOT NULL,
-                icon TEXT DEFAULT '📁',
-                color TEXT DEFAULT '#7E57C2'
-            )
-        ''')
-        
-        # Insert default categories
-        default_categories = [
-            ('General', '📁', '#7E57C2'),
-            ('Social Media', '📱', '#E91E63'),
-            ('Email', '📧', '#2196F3'),
-            ('Banking', '🏦', '#4CAF50'),
-            ('Shopping', '🛒', '#FF9800'),
-            ('Work', '💼', '#607D8B'),
-            ('Entertainment', '🎮', '#9C27B0'),
-            ('Other', '📌', '#795548')
-        ]
-        
-        for cat in default_categories:
-            try:
-                self.cursor.execute(
-                    "INSERT OR IGNORE INTO categories (name, icon, color) VALUES (?, ?, ?)",
-                    cat
-                )
-            except sqlite3.IntegrityError:
-                pass
-        
-        self.conn.commit()
+        """Bring the schema up to date (no DDL at all when it already is)."""
+        migrate(self.conn)
 
     def load_key(self) -> bytes:
         """Load or generate encryption key."""
@@ -85,10 +149,21 @@ class DatabaseManager:
                 key = f.read()
         return key
 
+    def set_key(self, key: bytes) -> None:
+        """Use a vault key for the passwords, the entry metadata and its blind indexes."""
+        self.key = key
+        self.fields = FieldCipher(key)
+        # Password rows are read as records of this vault's key (metadata
+        # opened by the row factory, password decrypted on access), see records.py
+        self.Record = PasswordRecord.bind(self.decrypt)
+        self._record_factory = record_factory(self.Record, self.fields.open)
+
+    @metrics.timed("pm_crypto_operation_duration_seconds", operation="fernet_encrypt")
     def encrypt(self, text: str) -> str:
         """Encrypt text using Fernet encryption."""
         return Fernet(self.key).encrypt(text.encode()).decode()
 
+    @metrics.timed("pm_crypto_operation_duration_seconds", operation="fernet_decrypt")
     def decrypt(self, text: str) -> str:
         """Decrypt text using Fernet encryption."""
         try:
@@ -96,6 +171,253 @@ class DatabaseManager:
         except Exception:
             return "***DECRYPTION_ERROR***"
 
+    def _log_change(self, password_id: int, operation: str) -> None:
+        """Record a mutation in the change log (caller commits)."""
+        self.cursor.execute(
+            "INSERT INTO changes (password_id, operation) VALUES (?, ?)",
+            (password_id, operation)
+        )
+        self._mark_index_dirty((password_id,))
+
+    def _indexes_built(self) -> bool:
+        return self.search_index.built or self.site_index.built or self.host_filter.built
+
+    def _mark_index_dirty(self, password_ids: Iterable[int]) -> None:
+        """Remember entries to refresh in the in-memory indexes on commit."""
+        # Past the refresh limit the indexes are rebuilt anyway, stop collecting
+        if (self._indexes_built()
+                and len(self._index_dirty) <= INDEX_REFRESH_LIMIT):
+            self._index_dirty.update(password_ids)
+
+    def _commit(self) -> None:
+        """
+        Commit, report the new change log entries to the change listener,
+        then bring the in-memory indexes up to date for changed entries.
+        Inside a group commit this waits for the end of the group.
+        """
+        if self._group_commit:
+            return
+        self.conn.commit()
+        if self._change_listener is not None:
+            self._publish_changes()
+        dirty, self._index_dirty = self._index_dirty, set()
+        if not dirty or not self._indexes_built():
+            return
+        if len(dirty) > INDEX_REFRESH_LIMIT:
+            self.search_index.invalidate()
+            self.site_index.invalidate()
+            self.host_filter.invalidate()
+            return
+
+        ids = list(dirty)
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            for row in self._metadata_rows(
+                    f"WHERE id IN ({', '.join('?' * len(chunk))})", chunk):
+                if self.search_index.built:
+                    self.search_index.upsert(*row)
+                key = site_key(row[1], row[2])
+                if self.site_index.built:
+                    self.site_index.add(key)
+                if self.host_filter.built:
+                    self.host_filter.add(key)
+                dirty.discard(row[0])
+        # Entries left were deleted
+        if self.search_index.built:
+            for password_id in dirty:
+                self.search_index.remove(password_id)
+        if self.host_filter.built:
+            self.host_filter.note_removed(len(dirty))
+
+    def _select_records(self, condition: str = "", params: Iterable = ()) -> List[PasswordRecord]:
+        """
+        Run PASSWORD_SELECT plus a WHERE/ORDER BY tail and get the rows as
+        records. The whole result is fetched into a list while the caller
+        holds the lock; to walk a large vault with bounded memory, use
+        iter_password_rows, which pages through it by id.
+        """
+        cursor = self.conn.cursor()
+        cursor.row_factory = self._record_factory
+        return cursor.execute(f"{PASSWORD_SELECT} {condition}", list(params)).fetchall()
+
+    def _metadata_rows(self, condition: str = "", params: Iterable = ()) -> Iterator[Tuple]:
+        """(id, website, url, username, category_id, favorite) of entries, metadata decrypted."""
+        open_metadata = self.fields.open
+        rows = self.conn.execute(
+            f"SELECT id, meta, category_id, favorite FROM passwords {condition}", list(params)
+        ).fetchall()
+        for password_id, meta, category_id, favorite in rows:
+            website, url, username, _notes = open_metadata(meta)
+            yield password_id, website, url, username, category_id, favorite
+
+    def _sealed(self, metadata: Metadata) -> Tuple[str, Optional[int], int]:
+        """The meta, site_index and username_index column values of entry metadata."""
+        website, url, username, notes = metadata
+        return (self.fields.seal(website, url, username, notes),
+                self.fields.site_index(website, url),
+                self.fields.username_index(username))
+
+    def _index_tokens(self, entries: Iterable[Tuple[int, Metadata]]) -> None:
+        """Add the word indexes of entries to entry_tokens (caller commits)."""
+        tokens = self.fields.tokens
+        self.cursor.executemany(
+            "INSERT OR IGNORE INTO entry_tokens (token, password_id) VALUES (?, ?)",
+            [(token, password_id) for password_id, metadata in entries
+             for token in tokens(*metadata)]
+        )
+
+    def _read_metadata(self, password_id: int) -> Optional[Metadata]:
+        """Current (website, url, username, notes) of an entry, None when it does not exist."""
+        row = self.conn.execute(
+            "SELECT meta, website, url, username, notes FROM passwords WHERE id = ?",
+            (password_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        # Written by an older version and not encrypted yet
+        return self.fields.open(row[0]) if row[0] is not None else tuple(row[1:])
+
+    def _write_metadata(self, metadata: Dict[int, Optional[Metadata]]) -> None:
+        """Seal changed entry metadata and replace its blind indexes (caller commits)."""
+        entries = [(password_id, m) for password_id, m in metadata.items() if m is not None]
+        if not entries:
+            return
+        self.cursor.executemany(
+            # Blanks the plaintext of entries not encrypted yet, see encrypt_plaintext_rows()
+            """UPDATE passwords SET meta = ?, site_index = ?, username_index = ?,
+               website = '', username = '', url = NULL, notes = NULL, site_key = NULL
+               WHERE id = ?""",
+            [self._sealed(m) + (password_id,) for password_id, m in entries]
+        )
+        self.cursor.executemany(
+            "DELETE FROM entry_tokens WHERE password_id = ?",
+            [(password_id,) for password_id, _ in entries]
+        )
+        self._index_tokens(entries)
+
+    @synchronized
+    def encrypt_plaintext_rows(self, batch_size: int = 1000) -> int:
+        """
+        Encrypt the metadata of entries still stored in plaintext (vaults
+        created before schema 6, rows replayed from older backups), one
+        transaction per batch_size entries, and blank their plaintext
+        columns. Returns the number of entries encrypted; once every entry
+        is, this is a single probe of an empty index.
+        """
+        encrypted = 0
+        cache_size = self.conn.execute("PRAGMA cache_size").fetchone()[0]
+        while True:
+            rows = self.conn.execute(
+                """SELECT id, website, url, username, notes FROM passwords
+                   WHERE meta IS NULL ORDER BY id LIMIT ?""",
+                (batch_size,)
+            ).fetchall()
+            if not rows:
+                break
+            if not encrypted:
+                # Word indexes land all over entry_tokens: keep it in memory
+                self.conn.execute(f"PRAGMA cache_size = {-MIGRATION_CACHE_KIB}")
+            entries = [(row[0], (row[1] or "", row[2], row[3] or "", row[4])) for row in rows]
+            self.cursor.executemany(
+                """UPDATE passwords SET meta = ?, site_index = ?, username_index = ?,
+                   website = '', username = '', url = NULL, notes = NULL, site_key = NULL
+                   WHERE id = ?""",
+                [self._sealed(m) + (password_id,) for password_id, m in entries]
+            )
+            self._index_tokens(entries)
+            self.conn.commit()
+            encrypted += len(rows)
+        if encrypted:
+            self.conn.execute(f"PRAGMA cache_size = {int(cache_size)}")
+            # Rebuild the file so no page (free pages, the dropped plaintext
+            # indexes, the old row versions) still holds the plaintext
+            self.conn.execute("VACUUM")
+            if self.conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal":
+                self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return encrypted
+
+    def _change_notices(self, since: int) -> List[Dict]:
+        """Compact notices (id, op, version) for the change log entries after `since`."""
+        rows = self.conn.execute(
+            """SELECT version, password_id, operation FROM changes
+               WHERE version > ? ORDER BY version LIMIT ?""",
+            (since, NOTICE_LIMIT + 1)
+        ).fetchall()
+        if len(rows) > NOTICE_LIMIT:
+            return [{"op": "resync", "version": self.get_sync_version()}]
+        return [{"id": password_id, "op": operation, "version": version}
+                for version, password_id, operation in rows]
+
+    def _publish_changes(self) -> None:
+        notices = self._change_notices(self._published_version)
+        if not notices:
+            return
+        self._published_version = notices[-1]["version"]
+        # The listener returns False once nobody is subscribed any more
+        if not self._change_listener(notices):
+            self._change_listener = None
+
+    @synchronized
+    def watch_changes(self, listener: Callable[[List[Dict]], bool],
+                      since: Optional[int] = None) -> Dict:
+        """
+        Call listener(notices) after every commit that logs changes, until
+        it returns False. Each notice is {"id", "op", "version"}, or
+        {"op": "resync", "version"} when a commit changed too many entries
+        to list. Entries written by other processes (vault_cli.py) are
+        reported with the next commit of this one.
+
+        Returns the current version and, when `since` is given, the notices
+        a client at that version missed (a resync notice if they were
+        compacted away). Notices up to the returned version may also reach
+        the listener; subscribers skip those.
+        """
+        version = self.get_sync_version()
+        if self._change_listener is None:
+            self._published_version = version
+        self._change_listener = listener
+
+        replay: List[Dict] = []
+        if since is not None and since != version:
+            row = self.conn.execute(
+                "SELECT value FROM meta WHERE key = 'sync_horizon'"
+            ).fetchone()
+            horizon = int(row[0]) if row else 0
+            if since < horizon or since > version:
+                replay = [{"op": "resync", "version": version}]
+            else:
+                replay = self._change_notices(since)
+        return {"version": version, "notices": replay}
+
+    def _insert_password(
+        self,
+        website: str,
+        username: str,
+        encrypted_password: str,
+        url: str,
+        category: str,
+        notes: str,
+        auto_saved: bool
+    ) -> int:
+        """Insert an entry with an already encrypted password and log it (caller commits)."""
+        metadata = (website, url, username, notes)
+        # website and username are NOT NULL in the original schema: stored empty
+        self.cursor.execute(
+            """INSERT INTO passwords 
+               (website, username, password, category_id, auto_saved,
+                meta, site_index, username_index) 
+               VALUES ('', '', ?, ?, ?, ?, ?, ?)""",
+            (encrypted_password, self._category_id(category), 1 if auto_saved else 0)
+            + self._sealed(metadata)
+        )
+        password_id = self.cursor.lastrowid
+        self._index_tokens([(password_id, metadata)])
+        self._log_change(password_id, "insert")
+        return password_id
+
+    @metrics.timed("pm_db_operation_duration_seconds", operation="add_password")
+    @queued
+    @synchronized
     def add_password(
         self,
         website: str,
@@ -107,16 +429,12 @@ class DatabaseManager:
         auto_saved: bool = False
     ) -> Dict:
         """Add a new password entry."""
-        encrypted_password = self.encrypt(password)
-        self.cursor.execute(
-            """INSERT INTO passwords 
-               (website, url, username, password, category, notes, auto_saved) 
-               VALUES (?, ?, ?, ?, ?, ?, ?)""",
-            (website, url, username, encrypted_password, category, notes, 1 if auto_saved else 0)
+        password_id = self._insert_password(
+            website, username, self.encrypt(password), url, category, notes, auto_saved
         )
-        self.conn.commit()
+        self._commit()
         return {
-            "id": self.cursor.lastrowid,
+            "id": password_id,
             "website": website,
             "url": url,
             "username": username,
@@ -126,80 +444,172 @@ class DatabaseManager:
             "message": "Password added successfully"
         }
 
-    def get_passwords(
+    @metrics.timed("pm_db_operation_duration_seconds", operation="fetch_password_rows")
+    @synchronized
+    def fetch_password_rows(
         self,
         search: Optional[str] = None,
         category: Optional[str] = None,
         favorites_only: bool = False
-    ) -> List[Dict]:
-        """Get all passwords with optional filters."""
-        query = """SELECT id, website, url, username, password, category, 
-                   notes, favorite, created_at, updated_at 
-                   FROM passwords WHERE 1=1"""
+    ) -> List[PasswordRecord]:
+        """
+        Get password records with optional filters. Passwords are left
+        encrypted, so callers decrypt outside the lock (or never).
+        """
+        query = "WHERE 1=1"
         params = []
 
         if search:
-            query += " AND (website LIKE ? OR username LIKE ? OR notes LIKE ?)"
-            search_term = f"%{search}%"
-            params.extend([search_term, search_term, search_term])
+            # Entries having every query word (whole words, or prefixes of
+            # website and host words), plus entries of sites within a few
+            # typos of the query: blind index lookups, see field_crypto.py
+            words = self.fields.query_tokens(search)
+            sites = [self.fields.blind("site", key)
+                     for key, _ in self._match_site_keys(site_key(search), SEARCH_SITE_MATCHES)]
+            matches = []
+            if words:
+                tokens = [token for group in words for token in group]
+                placeholders = ", ".join("?" * len(tokens))
+                # Which query word each token stands for
+                cases = " ".join(f"WHEN ? THEN {i}" for i, group in enumerate(words)
+                                 for _ in group)
+                matches.append(
+                    f"""p.id IN (SELECT password_id FROM entry_tokens
+                        WHERE token IN ({placeholders}) GROUP BY password_id
+                        HAVING COUNT(DISTINCT CASE token {cases} END) = ?)"""
+                )
+                params.extend(tokens + tokens + [len(words)])
+            if sites:
+                matches.append(f"p.site_index IN ({', '.join('?' * len(sites))})")
+                params.extend(sites)
+            query += f" AND ({' OR '.join(matches) or '0'})"
 
         if category:
-            query += " AND category = ?"
-            params.append(category)
+            query += " AND p.category_id = ?"
+            params.append(self._category_id(category, create=False))
 
         if favorites_only:
             query += " AND favorite = 1"
 
-        query += " ORDER BY website ASC"
+        # Websites are encrypted, so entries are sorted by website here
+        if not search:
+            records = self._select_records(query, params)
+            records.sort(key=attrgetter("website"))
+            return records
 
-        self.cursor.execute(query, params)
-        rows = self.cursor.fetchall()
+        # Searches (the extension's site lookups) list the most used entries
+        # first: SQL orders by frecency, only ties are sorted by website
+        rows = self.conn.execute(
+            f"SELECT p.frecency, {PASSWORD_COLUMNS} {PASSWORD_FROM} {query} "
+            "ORDER BY p.frecency DESC", params
+        ).fetchall()
+        factory = self._record_factory
+        records = []
+        for _, tied in groupby(rows, key=itemgetter(0)):
+            records.extend(sorted((factory(None, row[1:]) for row in tied),
+                                  key=attrgetter("website")))
+        return records
 
-        passwords = []
-        for row in rows:
-            passwords.append({
-                "id": row[0],
-                "website": row[1],
-                "url": row[2],
-                "username": row[3],
-                "password": self.decrypt(row[4]),
-                "category": row[5],
-                "notes": row[6],
-                "favorite": bool(row[7]),
-                "created_at": row[8],
-                "updated_at": row[9]
-            })
+    @metrics.timed("pm_db_operation_duration_seconds", operation="get_passwords")
+    def get_passwords(
+        self,
+        search: Optional[str] = None,
+        category: Optional[str] = None,
+        favorites_only: bool = False
+    ) -> List[PasswordRecord]:
+        """
+        Get all passwords with optional filters, as records: each password
+        is decrypted when read (record.password), to_dict() gives the API form.
+        """
+        return self.fetch_password_rows(search, category, favorites_only)
+
+    @metrics.timed("pm_db_operation_duration_seconds", operation="suggest")
+    def suggest(self, query: str, limit: int = 10) -> List[Dict]:
+        """
+        Typeahead: get labels of entries whose website, host or username
+        words start with the query words. Served from the in-memory
+        index, nothing is decrypted.
+        """
+        self._build_search_index()
+        names = {c["id"]: c["name"] for c in (self._categories or self.get_categories())}
+        return [
+            {
+                "id": password_id,
+                "website": website,
+                "username": username,
+                "category": names.get(category_id, "General"),
+                "favorite": favorite
+            }
+            for password_id, (website, _host, username, category_id, favorite)
+            in self.search_index.search(query, limit)
+        ]
+
+    def _drop_stale_caches(self) -> None:
+        """Forget the in-memory indexes and category cache after another process wrote."""
+        version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        if version != self._data_version:
+            if self._data_version is not None:
+                self.search_index.invalidate()
+                self.site_index.invalidate()
+                self.host_filter.invalidate()
+                self._categories = None
+            self._data_version = version
+
+    @synchronized
+    def _build_search_index(self) -> None:
+        self._drop_stale_caches()
+        if self.search_index.built:
+            return
+        self._index_dirty.clear()
+        self.search_index.build(self._metadata_rows())
 
-        return passwords
+    def iter_password_rows(
+        self,
+        category: Optional[str] = None,
+        batch_size: int = 5000,
+        uncategorized: bool = False
+    ) -> Iterator[List[PasswordRecord]]:
+        """
+        Yield password records (password encrypted)
+        in id order, one batch at a time, optionally for one category, or
+        only those whose category is unset or no longer exists. Each batch
+        is a separate keyset query (id > last id), so at most batch_size
+        records are in memory and the lock is only held per batch: walking
+        a large vault neither loads it whole nor stalls other requests.
+        """
+        last_id = 0
+        while True:
+            rows = self._password_rows_after(last_id, category, batch_size, uncategorized)
+            if not rows:
+                return
+            yield rows
+            last_id = rows[-1][0]
 
+    @synchronized
+    def _password_rows_after(self, last_id: int, category: Optional[str],
+                             limit: int, uncategorized: bool = False) -> List[PasswordRecord]:
+        query = "WHERE p.id > ?"
+        params = [last_id]
+        if uncategorized:
+            query += " AND c.id IS NULL"
+        elif category:
+            query += " AND p.category_id = ?"
+            params.append(self._category_id(category, create=False))
+        query += " ORDER BY p.id LIMIT ?"
+        params.append(limit)
+        return self._select_records(query, params)
+
+    @metrics.timed("pm_db_operation_duration_seconds", operation="get_password_by_id")
+    @synchronized
     def get_password_by_id(self, password_id: int) -> Optional[Dict]:
         """Get a single password by ID."""
-        self.cursor.execute(
-            """SELECT id, website, url, username, password, category, 
-               notes, favorite, created_at, updated_at 
-               FROM passwords WHERE id = ?""",
-            (password_id,)
-        )
-        row = self.cursor.fetchone()
-        
-        if row:
-            return {
-                "id": row[0],
-                "website": row[1],
-                "url": row[2],
-                "username": row[3],
-                "password": self.decrypt(row[4]),
-                "category": row[5],
-                "notes": row[6],
-                "favorite": bool(row[7]),
-                "created_at": row[8],
-                "updated_at": row[9]
-            }
-        return None
+        records = self._select_records("WHERE p.id = ?", (password_id,))
+        return records[0].to_dict() if records else None
 
-    def update_password(
+    def _update_columns(
         self,
         password_id: int,
+        metadata: Dict[int, Optional[Metadata]],
         website: Optional[str] = None,
         username: Optional[str] = None,
         password: Optional[str] = None,
@@ -207,69 +617,242 @@ class DatabaseManager:
         category: Optional[str] = None,
         notes: Optional[str] = None,
         favorite: Optional[bool] = None
-    ) -> Dict:
-        """Update an existing password entry."""
+    ) -> Tuple[List[str], List]:
+        """
+        Build the SET clauses and parameters for the fields being changed.
+        Website, URL, username and notes changes are merged into
+        metadata[password_id] instead (the entry's current metadata when
+        absent, None when the entry does not exist), for _write_metadata().
+        """
         updates = []
         params = []
 
-        if website is not None:
-            updates.append("website = ?")
-            params.append(website)
-        if username is not None:
-            updates.append("username = ?")
-            params.append(username)
+        changes = {field: value for field, value in
+                   zip(METADATA_FIELDS, (website, url, username, notes)) if value is not None}
+        if changes:
+            current = metadata[password_id] if password_id in metadata \
+                else self._read_metadata(password_id)
+            if current is not None:
+                current = tuple(changes.get(field, value)
+                                for field, value in zip(METADATA_FIELDS, current))
+            metadata[password_id] = current
         if password is not None:
             updates.append("password = ?")
             params.append(self.encrypt(password))
-        if url is not None:
-            updates.append("url = ?")
-            params.append(url)
         if category is not None:
-            updates.append("category = ?")
-            params.append(category)
-        if notes is not None:
-            updates.append("notes = ?")
-            params.append(notes)
+            updates.append("category_id = ?")
+            params.append(self._category_id(category))
         if favorite is not None:
             updates.append("favorite = ?")
             params.append(1 if favorite else 0)
 
-        if not updates:
+        return updates, params
+
+    @metrics.timed("pm_db_operation_duration_seconds", operation="update_password")
+    @queued
+    @synchronized
+    def update_password(
+        self,
+        password_id: int,
+        website: Optional[str] = None,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        url: Optional[str] = None,
+        category: Optional[str] = None,
+        notes: Optional[str] = None,
+        favorite: Optional[bool] = None
+    ) -> Dict:
+        """Update an existing password entry."""
+        fields = (website, username, password, url, category, notes, favorite)
+        if all(value is None for value in fields):
             return {"error": "No fields to update"}
 
+        metadata: Dict[int, Optional[Metadata]] = {}
+        updates, params = self._update_columns(
+            password_id, metadata, website=website, username=username, password=password,
+            url=url, category=category, notes=notes, favorite=favorite
+        )
         updates.append("updated_at = CURRENT_TIMESTAMP")
         params.append(password_id)
 
         query = f"UPDATE passwords SET {', '.join(updates)} WHERE id = ?"
         self.cursor.execute(query, params)
-        self.conn.commit()
+        if self.cursor.rowcount:
+            self._write_metadata(metadata)
+            self._log_change(password_id, "update")
+        self._commit()
 
         return {"message": "Password updated successfully", "id": password_id}
 
+    @metrics.timed("pm_db_operation_duration_seconds", operation="delete_password")
+    @queued
+    @synchronized
     def delete_password(self, password_id: int) -> Dict:
         """Delete a password by ID."""
         self.cursor.execute("DELETE FROM passwords WHERE id = ?", (password_id,))
-        self.conn.commit()
+        if self.cursor.rowcount:
+            self._log_change(password_id, "delete")
+        self._commit()
         return {"message": "Password deleted successfully", "id": password_id}
 
+    @metrics.timed("pm_db_operation_duration_seconds", operation="toggle_favorite")
+    @queued
+    @synchronized
     def toggle_favorite(self, password_id: int) -> Dict:
         """Toggle favorite status of a password."""
         self.cursor.execute(
             "UPDATE passwords SET favorite = NOT favorite WHERE id = ?",
             (password_id,)
         )
-        self.conn.commit()
+        if self.cursor.rowcount:
+            self._log_change(password_id, "update")
+        self._commit()
         return {"message": "Favorite toggled", "id": password_id}
 
+    @metrics.timed("pm_db_operation_duration_seconds", operation="bulk_apply")
+    @queued
+    @synchronized
+    def bulk_apply(self, operations: List[Dict]) -> Dict:
+        """
+        Apply a list of operations atomically, in one transaction.
+
+        Each operation is {"op": ..., "id": n} (or "ids": [...]) where op is
+        "delete", "move" (with "category"), "favorite" (with "favorite",
+        toggled when omitted) or "update" (with any update_password field).
+        Statements are batched with executemany; updates, moves and favorites
+        are applied before deletes. Returns one result per item.
+        """
+        results: List[Dict] = []
+        items = []
+        for index, operation in enumerate(operations):
+            op = operation.get("op") if isinstance(operation, dict) else None
+            ids = operation.get("ids") if op else None
+            if ids is None and op:
+                ids = [operation.get("id")]
+            if op not in BULK_OPERATIONS:
+                results.append({"index": index, "status": "error", "error": "Unknown operation"})
+                continue
+            if not isinstance(ids, list):
+                results.append({"index": index, "status": "error", "error": "ids must be a list"})
+                continue
+            for password_id in ids:
+                if not isinstance(password_id, int) or isinstance(password_id, bool):
+                    results.append({"index": index, "id": password_id,
+                                    "status": "error", "error": "Invalid id"})
+                    continue
+                items.append((index, op, password_id, operation))
+
+        existing = set()
+        ids = list({item[2] for item in items})
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            self.cursor.execute(
+                f"SELECT id FROM passwords WHERE id IN ({', '.join('?' * len(chunk))})", chunk
+            )
+            existing.update(row[0] for row in self.cursor.fetchall())
+
+        updates: Dict[Tuple[str, ...], List[List]] = {}
+        metadata: Dict[int, Optional[Metadata]] = {}
+        toggles, deletes, changed = [], [], []
+        try:
+            for index, op, password_id, operation in items:
+                if password_id not in existing:
+                    results.append({"index": index, "id": password_id, "status": "not_found"})
+                    continue
+
+                if op == "delete":
+                    deletes.append((password_id,))
+                    changed.append((password_id, "delete"))
+                elif op == "favorite" and operation.get("favorite") is None:
+                    toggles.append((password_id,))
+                    changed.append((password_id, "update"))
+                else:
+                    if op == "move":
+                        fields = {"category": operation.get("category")}
+                    elif op == "favorite":
+                        fields = {"favorite": bool(operation["favorite"])}
+                    else:
+                        fields = {k: operation.get(k) for k in UPDATE_FIELDS}
+                    if all(value is None for value in fields.values()):
+                        results.append({"index": index, "id": password_id,
+                                        "status": "error", "error": "No fields to update"})
+                        continue
+                    columns, params = self._update_columns(password_id, metadata, **fields)
+                    columns.append("updated_at = CURRENT_TIMESTAMP")
+                    updates.setdefault(tuple(columns), []).append(params + [password_id])
+                    changed.append((password_id, "update"))
+                results.append({"index": index, "id": password_id, "status": "ok"})
+
+            for columns, rows in updates.items():
+                self.cursor.executemany(
+                    f"UPDATE passwords SET {', '.join(columns)} WHERE id = ?", rows
+                )
+            # Metadata merged over every operation on an entry, written once
+            self._write_metadata(metadata)
+            if toggles:
+                self.cursor.executemany(
+                    "UPDATE passwords SET favorite = NOT favorite WHERE id = ?", toggles
+                )
+            if deletes:
+                self.cursor.executemany("DELETE FROM passwords WHERE id = ?", deletes)
+            if changed:
+                self.cursor.executemany(
+                    "INSERT INTO changes (password_id, operation) VALUES (?, ?)", changed
+                )
+                self._mark_index_dirty(password_id for password_id, _ in changed)
+            self._commit()
+        except Exception as e:
+            self._rollback()
+            self._categories = None
+            return {"error": f"Bulk operation failed, nothing was applied: {e}"}
+
+        results.sort(key=lambda r: r["index"])
+        applied = sum(1 for r in results if r["status"] == "ok")
+        return {
+            "message": f"Applied {applied} of {len(results)} operations",
+            "applied": applied,
+            "failed": len(results) - applied,
+            "results": results
+        }
+
+    def _load_categories(self) -> List[Dict]:
+        """Get the cached category list, loading it on first use and after outside writes."""
+        self._drop_stale_caches()
+        categories = self._categories
+        if categories is None:
+            self.cursor.execute("SELECT id, name, icon, color FROM categories ORDER BY id")
+            categories = [
+                {"id": row[0], "name": row[1], "icon": row[2], "color": row[3]}
+                for row in self.cursor.fetchall()
+            ]
+            self._category_ids = {c["name"]: c["id"] for c in categories}
+            self._categories = categories
+        return categories
+
+    def _category_id(self, name: Optional[str], create: bool = True) -> Optional[int]:
+        """
+        Resolve a category name to its id. Unknown names are added as new
+        categories (entries have always accepted free-text categories),
+        unless create is False. Caller commits.
+        """
+        name = name or "General"
+        self._load_categories()
+        category_id = self._category_ids.get(name)
+        if category_id is None and create:
+            self.cursor.execute("INSERT OR IGNORE INTO categories (name) VALUES (?)", (name,))
+            self.cursor.execute("SELECT id FROM categories WHERE name = ?", (name,))
+            category_id = self.cursor.fetchone()[0]
+            self._categories = None
+        return category_id
+
+    @metrics.timed("pm_db_operation_duration_seconds", operation="get_categories")
+    @synchronized
     def get_categories(self) -> List[Dict]:
-        """Get all categories."""
-        self.cursor.execute("SELECT id, name, icon, color FROM categories")
-        rows = self.cursor.fetchall()
-        return [
-            {"id": row[0], "name": row[1], "icon": row[2], "color": row[3]}
-            for row in rows
-        ]
+        """Get all categories (served from the in-process cache)."""
+        return [dict(c) for c in self._load_categories()]
 
+    @metrics.timed("pm_db_operation_duration_seconds", operation="add_category")
+    @synchronized
     def add_category(self, name: str, icon: str = "📁", color: str = "#7E57C2") -> Dict:
         """Add a new category."""
         try:
@@ -278,43 +861,82 @@ class DatabaseManager:
                 (name, icon, color)
             )
             self.conn.commit()
+            self._categories = None
             return {"id": self.cursor.lastrowid, "name": name, "icon": icon, "color": color}
         except sqlite3.IntegrityError:
             return {"error": "Category already exists"}
 
+    @metrics.timed("pm_db_operation_duration_seconds", operation="rename_category")
+    @synchronized
+    def rename_category(self, category_id: int, name: str) -> Dict:
+        """Rename a category. Entries reference it by id, so no entry is rewritten."""
+        try:
+            self.cursor.execute(
+                "UPDATE categories SET name = ? WHERE id = ?", (name, category_id)
+            )
+        except sqlite3.IntegrityError:
+            return {"error": "Category already exists"}
+        if not self.cursor.rowcount:
+            return {"error": "Category not found"}
+        self.conn.commit()
+        self._categories = None
+        return {"message": "Category renamed", "id": category_id, "name": name}
+
+    @metrics.timed("pm_db_operation_duration_seconds", operation="export_passwords")
+    @synchronized
     def export_passwords(self) -> List[Dict]:
         """Export all passwords (encrypted) for backup."""
-        passwords = self.get_passwords()
-        # Re-encrypt for export security
-        for p in passwords:
-            p['password'] = self.encrypt(p['password'])
-        return passwords
-
-    def import_passwords(self, passwords: List[Dict]) -> Dict:
-        """Import passwords from backup."""
+        # Stored values are already Fernet tokens under the vault key,
+        # so they are exported as-is instead of decrypted and re-encrypted
+        return [record.to_dict(decrypt=False) for record in self.fetch_password_rows()]
+
+    @metrics.timed("pm_db_operation_duration_seconds", operation="import_passwords")
+    @synchronized
+    def import_passwords(self, passwords: Iterable[Dict], verified: bool = False) -> Dict:
+        """
+        Import passwords from backup, in a single transaction. With
+        verified=True every password is known to be a token under this
+        vault's key already and is stored without checking.
+        """
         imported = 0
-        for p in passwords:
-            try:
-                # Decrypt if encrypted, otherwise use as-is
+        fernet = Fernet(self.key)
+        try:
+            for p in passwords:
                 try:
-                    decrypted_pass = self.decrypt(p['password'])
-                except:
-                    decrypted_pass = p['password']
+                    # Tokens from our own export are stored as-is, plaintext is encrypted
+                    if verified:
+                        encrypted_pass = p['password']
+                    else:
+                        try:
+                            fernet.decrypt(p['password'].encode())
+                            encrypted_pass = p['password']
+                        except InvalidToken:
+                            encrypted_pass = self.encrypt(p['password'])
                 
-                self.add_password(
-                    website=p.get('website', ''),
-                    username=p.get('username', ''),
-                    password=decrypted_pass,
-                    url=p.get('url', ''),
-                    category=p.get('category', 'General'),
-                    notes=p.get('notes', '')
-                )
-                imported += 1
-            except Exception as e:
-                continue
+                    self._insert_password(
+                        website=p.get('website', ''),
+                        username=p.get('username', ''),
+                        encrypted_password=encrypted_pass,
+                        url=p.get('url', ''),
+                        category=p.get('category', 'General'),
+                        notes=p.get('notes', ''),
+                        auto_saved=False
+                    )
+                    imported += 1
+                except Exception as e:
+                    continue
+        except BaseException:
+            # A source failing part way (a corrupt archive block) leaves
+            # nothing behind for the next commit to pick up
+            self._rollback()
+            self._categories = None
+            raise
         
+        self._commit()
         return {"message": f"Imported {imported} passwords"}
 
+    @metrics.timed("pm_db_operation_duration_seconds", operation="get_statistics")
+    @synchronized
     def get_statistics(self) -> Dict:
         """Get password statistics."""
         self.cursor.execute("SELECT COUNT(*) FROM passwords")
@@ -323,10 +945,14 @@ class DatabaseManager:
         self.cursor.execute("SELECT COUNT(*) FROM passwords WHERE favorite = 1")
         favorites = self.cursor.fetchone()[0]
 
+        names = {c["id"]: c["name"] for c in self._load_categories()}
         self.cursor.execute(
-            "SELECT category, COUNT(*) FROM passwords GROUP BY category"
+            "SELECT category_id, COUNT(*) FROM passwords GROUP BY category_id"
         )
-        by_category = {row[0]: row[1] for row in self.cursor.fetchall()}
+        by_category = {}
+        for category_id, count in self.cursor.fetchall():
+            name = names.get(category_id, "General")
+            by_category[name] = by_category.get(name, 0) + count
 
         return {
             "total": total,
@@ -334,96 +960,481 @@ class DatabaseManager:
             "by_category": by_category
         }
 
-    def find_similar_password(self, website: str, username: Optional[str] = None) -> Optional[Dict]:
-        """Find if similar password already exists for website."""
+    @metrics.timed("pm_db_operation_duration_seconds", operation="find_similar_password")
+    @synchronized
+    def find_similar_password(
+        self,
+        website: str,
+        username: Optional[str] = None,
+        url: Optional[str] = None
+    ) -> Optional[Dict]:
+        """
+        Find if a password already exists for the same site. Sites are
+        compared by site key (through its blind index), so "GitHub", "github.com" and
+        "https://www.github.com/login" are the same site. Of several
+        matching entries, the one with the highest frecency is returned.
+        """
+        site = self.fields.site_index(website, url)
+        if site is None:
+            return None
+        query = "WHERE p.site_index = ?"
+        params = [site]
         if username:
-            self.cursor.execute(
-                """SELECT id, website, url, username, password, category, 
-                   notes, favorite, created_at, updated_at 
-                   FROM passwords WHERE website = ? AND username = ?""",
-                (website, username)
-            )
-        else:
-            self.cursor.execute(
-                """SELECT id, website, url, username, password, category, 
-                   notes, favorite, created_at, updated_at 
-                   FROM passwords WHERE website = ?""",
-                (website,)
+            query += " AND p.username_index = ?"
+            params.append(self.fields.username_index(username))
+        # The most used entry when several accounts match
+        records = self._select_records(query + " ORDER BY p.frecency DESC, p.id LIMIT 1", params)
+        return records[0].to_dict() if records else None
+
+    def record_use(self, password_id: int) -> None:
+        """
+        Note that an entry was used (filled into a page). Uses are kept in
+        memory and written by flush_usage(), so this does no database work
+        unless USAGE_FLUSH_SIZE entries are pending. Uses are not vault
+        changes: they are not in the change log and do not touch updated_at.
+        """
+        now = time.time()
+        with self._usage_lock:
+            usage = self._usage.get(password_id)
+            if usage is None:
+                self._usage[password_id] = [1, now, use_score(now)]
+            else:
+                usage[0] += 1
+                usage[1] = now
+                usage[2] = add_scores(usage[2], use_score(now))
+            full = len(self._usage) >= USAGE_FLUSH_SIZE
+        if full:
+            self.flush_usage()
+
+    @metrics.timed("pm_db_operation_duration_seconds", operation="flush_usage")
+    def flush_usage(self) -> Dict:
+        """Write the buffered entry uses in one transaction."""
+        with self._usage_lock:
+            usage, self._usage = self._usage, {}
+        if not usage:
+            return {"flushed": 0}
+        ids = list(usage)
+        with self.lock:
+            scores = {}
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                scores.update(self.conn.execute(
+                    f"SELECT id, frecency FROM passwords WHERE id IN ({', '.join('?' * len(chunk))})",
+                    chunk
+                ).fetchall())
+            self.conn.executemany(
+                """UPDATE passwords SET use_count = use_count + ?, last_used_at = ?,
+                   frecency = ? WHERE id = ?""",
+                [
+                    (uses, time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(last_used)),
+                     add_scores(scores[password_id], frecency) if scores[password_id] else frecency,
+                     password_id)
+                    for password_id, (uses, last_used, frecency) in usage.items()
+                    # Entries deleted since their use are skipped
+                    if password_id in scores
+                ]
             )
-        
-        row = self.cursor.fetchone()
-        if row:
-            return {
-                "id": row[0],
-                "website": row[1],
-                "url": row[2],
-                "username": row[3],
-                "password": self.decrypt(row[4]),
-                "category": row[5],
-                "notes": row[6],
-                "favorite": bool(row[7]),
-                "created_at": row[8],
-                "updated_at": row[9]
-            }
-        return None
+            self.conn.commit()
+        return {"flushed": len(scores)}
 
-    def get_weak_passwords(self, strength_threshold: int = 2) -> List[Dict]:
-        """Get all weak passwords below threshold."""
+    @metrics.timed("pm_db_operation_duration_seconds", operation="match_sites")
+    @synchronized
+    def match_sites(
+        self,
+        website: str,
+        url: Optional[str] = None,
+        username: Optional[str] = None,
+        limit: int = 5
+    ) -> List[Dict]:
+        """
+        Get entries of the same or a similarly named site, best first:
+        same site key, same name under another suffix, then names within a
+        few typos ("githib.com" finds github.com). Among equal scores, entries
+        of the given username come first, then the most used ones. Passwords
+        are not decrypted.
+        """
+        matches = self._match_site_keys(site_key(website, url), limit * 4)
+        if not matches:
+            return []
+        scores = dict(matches)
+        # Blind index of each matched site key back to the key
+        sites = {self.fields.blind("site", key): key for key in scores}
         self.cursor.execute(
-            """SELECT id, website, url, username, password, category, 
-               notes, favorite, created_at, updated_at 
-               FROM passwords WHERE strength_score < ? 
-               ORDER BY strength_score ASC""",
-            (strength_threshold,)
+            f"""SELECT p.id, p.meta, c.name, p.favorite, p.site_index,
+                       p.use_count, p.last_used_at, p.frecency
+                FROM passwords p
+                LEFT JOIN categories c ON c.id = p.category_id
+                WHERE p.site_index IN ({', '.join('?' * len(sites))})""",
+            list(sites)
         )
         rows = self.cursor.fetchall()
-        
-        passwords = []
+        # Frecency of each entry, used for ordering only
+        frecency = {row[0]: row[7] for row in rows}
+        entries = []
         for row in rows:
-            passwords.append({
+            entry_website, entry_url, entry_username, _notes = self.fields.open(row[1])
+            entries.append({
                 "id": row[0],
-                "website": row[1],
-                "url": row[2],
-                "username": row[3],
-                "password": self.decrypt(row[4]),
-                "category": row[5],
-                "notes": row[6],
-                "favorite": bool(row[7]),
-                "created_at": row[8],
-                "updated_at": row[9]
+                "website": entry_website,
+                "url": entry_url,
+                "username": entry_username,
+                "category": row[2],
+                "favorite": bool(row[3]),
+                "site": sites[row[4]],
+                "score": scores[sites[row[4]]],
+                "use_count": row[5],
+                "last_used_at": row[6]
             })
-        
-        return passwords
+        entries.sort(key=lambda e: (-e["score"], e["username"] != username,
+                                    -frecency[e["id"]], e["id"]))
+        return entries[:limit]
+
+    @metrics.timed("pm_db_operation_duration_seconds", operation="host_filter")
+    @synchronized
+    def get_host_filter(self) -> Tuple[str, bytes]:
+        """
+        Get the host filter of the vault in binary form and its ETag,
+        building it on first use (see host_filter.py).
+        """
+        self._drop_stale_caches()
+        if not self.host_filter.built:
+            self._build_site_indexes()
+        return self.host_filter.serialize()
+
+    @synchronized
+    def _match_site_keys(self, key: str, limit: int) -> List[Tuple[str, float]]:
+        """Rank indexed site keys against a key, building the site index on first use."""
+        if not key:
+            return []
+        self._drop_stale_caches()
+        if not self.site_index.built:
+            self._build_site_indexes()
+        return self.site_index.match(key, limit)
+
+    def _build_site_indexes(self) -> None:
+        """
+        Build the site index and host filter (those not built) from the
+        distinct site keys: one pass decrypting every entry's metadata.
+        """
+        keys = {site_key(row[1], row[2]) for row in self._metadata_rows()}
+        keys.discard("")
+        if not self.site_index.built:
+            self.site_index.build(keys)
+        if not self.host_filter.built:
+            self.host_filter.build(keys)
+
+    @metrics.timed("pm_db_operation_duration_seconds", operation="get_weak_passwords")
+    @synchronized
+    def get_weak_passwords(
+        self,
+        strength_threshold: int = WEAK_STRENGTH_SCORE
+    ) -> List[PasswordRecord]:
+        """
+        Get all passwords whose strength score (0-100) is below threshold,
+        weakest first, as records (see get_passwords).
+        """
+        return self._select_records(
+            "WHERE strength_score < ? ORDER BY strength_score ASC", (strength_threshold,)
+        )
+
+    @metrics.timed("pm_db_operation_duration_seconds", operation="get_auto_saved_passwords")
+    @synchronized
+    def get_auto_saved_passwords(self) -> List[PasswordRecord]:
+        """Get all auto-saved passwords, as records (see get_passwords)."""
+        return self._select_records("WHERE auto_saved = 1 ORDER BY created_at DESC")
+
+    @contextmanager
+    def read_snapshot(self) -> Iterator[None]:
+        """
+        Make every read inside the block see the same vault state: the
+        connection is held (other threads wait) inside one read transaction
+        (other processes cannot commit until it ends).
+        """
+        with self.lock:
+            if self.conn.in_transaction:
+                yield
+                return
+            self.conn.execute("BEGIN")
+            try:
+                # The first read takes the shared lock that pins the snapshot
+                self.conn.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchone()
+                yield
+            finally:
+                if self.conn.in_transaction:
+                    self.conn.rollback()
+
+    @synchronized
+    def get_sync_version(self) -> int:
+        """Get the latest change log version."""
+        self.cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'changes'")
+        row = self.cursor.fetchone()
+        return row[0] if row else 0
+
+    @metrics.timed("pm_db_operation_duration_seconds", operation="get_changes")
+    @synchronized
+    def get_changes(self, since: int = 0) -> Dict:
+        """
+        Get entries inserted, updated and deleted after a sync version.
+        Work is proportional to the number of changes, not the vault size.
+        """
+        self.cursor.execute("SELECT value FROM meta WHERE key = 'sync_horizon'")
+        row = self.cursor.fetchone()
+        horizon = int(row[0]) if row else 0
+        version = self.get_sync_version()
+
+        if since < horizon:
+            # Tombstones older than the client's version were compacted away
+            return {"version": version, "full_resync": True,
+                    "inserted": [], "updated": [], "deleted": []}
 
-    def get_auto_saved_passwords(self) -> List[Dict]:
-        """Get all auto-saved passwords."""
         self.cursor.execute(
-            """SELECT id, website, url, username, password, category, 
-               notes, favorite, created_at, updated_at 
-               FROM passwords WHERE auto_saved = 1 
-               ORDER BY created_at DESC"""
+            """SELECT password_id, operation FROM changes
+               WHERE version > ? ORDER BY version ASC""",
+            (since,)
         )
-        rows = self.cursor.fetchall()
-        
-        passwords = []
-        for row in rows:
-            passwords.append({
-                "id": row[0],
-                "website": row[1],
-                "url": row[2],
-                "username": row[3],
-                "password": self.decrypt(row[4]),
-                "category": row[5],
-                "notes": row[6],
-                "favorite": bool(row[7]),
-                "created_at": row[8],
-                "updated_at": row[9]
-            })
-        
-        return passwords
+        inserted, updated, deleted = set(), set(), set()
+        for password_id, operation in self.cursor.fetchall():
+            if operation == "insert":
+                inserted.add(password_id)
+            elif operation == "update":
+                if password_id not in inserted:
+                    updated.add(password_id)
+            elif operation == "delete":
+                updated.discard(password_id)
+                if password_id in inserted:
+                    # Created and removed since the client last synced
+                    inserted.discard(password_id)
+                else:
+                    deleted.add(password_id)
+
+        rows = self._get_passwords_by_ids(inserted | updated)
+        return {
+            "version": version,
+            "full_resync": False,
+            "inserted": [rows[i] for i in sorted(inserted) if i in rows],
+            "updated": [rows[i] for i in sorted(updated) if i in rows],
+            "deleted": sorted(deleted)
+        }
+
+    def _get_passwords_by_ids(self, password_ids) -> Dict[int, Dict]:
+        """Fetch entries by id, in chunks to stay under SQLite's variable limit."""
+        ids = list(password_ids)
+        result = {}
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            placeholders = ", ".join("?" * len(chunk))
+            for record in self._select_records(f"WHERE p.id IN ({placeholders})", chunk):
+                result[record.id] = record.to_dict()
+        return result
+
+    @metrics.timed("pm_db_operation_duration_seconds", operation="compact_changes")
+    @synchronized
+    def compact_changes(self, tombstone_max_age_days: int = 30) -> Dict:
+        """
+        Compact the change log: drop updates superseded by a newer change
+        to the same password, and expire old tombstones along with the
+        inserts they cancel. Inserts are kept otherwise, so clients still
+        see new entries as inserted. Clients whose sync version predates
+        the expired tombstones are told to resync fully.
+        """
+        self.cursor.execute(
+            """DELETE FROM changes WHERE operation = 'update' AND version < (
+                   SELECT MAX(c.version) FROM changes c
+                   WHERE c.password_id = changes.password_id
+               )"""
+        )
+        superseded = self.cursor.rowcount
+
+        self.cursor.execute(
+            """SELECT MAX(version) FROM changes
+               WHERE operation = 'delete' AND changed_at < datetime('now', ?)""",
+            (f"-{int(tombstone_max_age_days)} days",)
+        )
+        horizon = self.cursor.fetchone()[0]
+        expired = 0
+        if horizon is not None:
+            self.cursor.execute(
+                """DELETE FROM changes WHERE operation = 'insert' AND version <= ?
+                   AND password_id IN (
+                       SELECT password_id FROM changes
+                       WHERE operation = 'delete' AND version <= ?
+                   )""",
+                (horizon, horizon)
+            )
+            self.cursor.execute(
+                "DELETE FROM changes WHERE operation = 'delete' AND version <= ?",
+                (horizon,)
+            )
+            expired = self.cursor.rowcount
+            self.cursor.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('sync_horizon', ?)",
+                (str(horizon),)
+            )
+
+        self.conn.commit()
+        return {"superseded": superseded, "tombstones_expired": expired}
+
+    @metrics.timed("pm_db_operation_duration_seconds", operation="optimize")
+    @synchronized
+    def optimize(self) -> Dict:
+        """Let SQLite refresh planner statistics that went stale (cheap, run often)."""
+        self.conn.execute("PRAGMA optimize")
+        return {"message": "Optimized"}
+
+    @metrics.timed("pm_db_operation_duration_seconds", operation="maintain_storage")
+    @synchronized
+    def maintain_storage(self, vacuum_threshold: float = 0.25) -> Dict:
+        """
+        ANALYZE (sampled, so it stays fast on large vaults), checkpoint the
+        WAL when the vault uses one, and VACUUM when more than
+        vacuum_threshold of the file is free pages.
+        """
+        self.conn.execute("PRAGMA analysis_limit = 1000")
+        self.conn.execute("ANALYZE")
+        self.conn.commit()
+
+        pages = self.conn.execute("PRAGMA page_count").fetchone()[0]
+        free = self.conn.execute("PRAGMA freelist_count").fetchone()[0]
+        result = {"pages": pages, "free_pages": free, "vacuumed": False}
+        if pages and free / pages > vacuum_threshold:
+            self.conn.execute("VACUUM")
+            result["vacuumed"] = True
+            result["pages"] = self.conn.execute("PRAGMA page_count").fetchone()[0]
+        if self.conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal":
+            result["checkpoint"] = self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+        return result
+
+    def refresh_derived_data(
+        self,
+        score: Callable[[str], int],
+        breached: Optional[Dict[str, int]] = None,
+        batch_size: int = 500,
+        pause: Optional[Callable[[], None]] = None
+    ) -> Dict:
+        """
+        Recompute strength_score (and breach_check_result when a breach list
+        is given) for entries changed since the last refresh; the first
+        refresh covers every entry. Works in batches, holding the lock for
+        one batch at a time and calling pause() in between.
+        """
+        since, current, ids = self._derived_data_backlog()
+        refreshed = 0
+        for start in range(0, len(ids), batch_size):
+            refreshed += self._refresh_derived_batch(ids[start:start + batch_size], score, breached)
+            if pause is not None:
+                pause()
+        self._set_meta("derived_version", str(current))
+        return {"refreshed": refreshed, "since_version": since, "version": current}
+
+    @synchronized
+    def _derived_data_backlog(self) -> Tuple[int, int, List[int]]:
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'derived_version'").fetchone()
+        since = int(row[0]) if row else 0
+        current = self.get_sync_version()
+        if since == 0:
+            ids = [r[0] for r in self.conn.execute("SELECT id FROM passwords ORDER BY id")]
+        else:
+            ids = [r[0] for r in self.conn.execute(
+                """SELECT DISTINCT password_id FROM changes
+                   WHERE version > ? AND operation != 'delete' ORDER BY password_id""",
+                (since,)
+            )]
+        return since, current, ids
+
+    @synchronized
+    def _refresh_derived_batch(self, password_ids: List[int], score: Callable[[str], int],
+                               breached: Optional[Dict[str, int]]) -> int:
+        rows = self.conn.execute(
+            f"SELECT id, password FROM passwords WHERE id IN ({', '.join('?' * len(password_ids))})",
+            password_ids
+        ).fetchall()
+        fernet = Fernet(self.key)
+        scores, results = [], []
+        for password_id, token in rows:
+            try:
+                password = fernet.decrypt(token.encode()).decode()
+            except InvalidToken:
+                continue
+            scores.append((score(password), password_id))
+            if breached is not None:
+                results.append((breach_check_result(password, breached), password_id))
+        # Derived columns are not synced data: no change log entries
+        self.cursor.executemany("UPDATE passwords SET strength_score = ? WHERE id = ?", scores)
+        if results:
+            self.cursor.executemany(
+                "UPDATE passwords SET breach_check_result = ? WHERE id = ?", results
+            )
+        self.conn.commit()
+        return len(scores)
+
+    @synchronized
+    def _set_meta(self, key: str, value: str) -> None:
+        self.cursor.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+        self.conn.commit()
+
+    def enable_write_queue(self, synchronous: str = "FULL", **options) -> WriteQueue:
+        """
+        Route add/update/delete/favorite and bulk writes through a WriteQueue
+        (options: group_size, window_ms, max_pending, timeout). Callers still
+        get their result once it is committed. `synchronous` sets how hard
+        each group commit syncs to disk: FULL (the default) survives power
+        loss, NORMAL syncs less often, OFF only survives a process crash.
+        """
+        synchronous = synchronous.upper()
+        if synchronous not in ("FULL", "NORMAL", "OFF"):
+            raise ValueError(f"Invalid synchronous mode: {synchronous}")
+        with self.lock:
+            self.conn.execute(f"PRAGMA synchronous = {synchronous}")
+            if self.write_queue is None:
+                self.write_queue = WriteQueue(self.apply_writes, **options)
+        return self.write_queue
+
+    @synchronized
+    def apply_writes(self, writes: List[PendingWrite]) -> None:
+        """
+        Run a group of queued writes in one transaction and commit once.
+        Each write runs in a savepoint: one that fails is rolled back alone
+        and gets its error, the others still commit.
+        """
+        if not self.conn.in_transaction:
+            self.conn.execute("BEGIN")
+        self._group_commit = True
+        try:
+            for write in writes:
+                self.conn.execute("SAVEPOINT queued_write")
+                try:
+                    write.result = write.func(*write.args, **write.kwargs)
+                except Exception as e:
+                    self.conn.execute("ROLLBACK TO queued_write")
+                    self._categories = None
+                    write.error = e
+                self.conn.execute("RELEASE queued_write")
+        finally:
+            self._group_commit = False
+        try:
+            self._commit()
+        except Exception as e:
+            self.conn.rollback()
+            self._index_dirty.clear()
+            self._categories = None
+            for write in writes:
+                if write.error is None:
+                    write.result, write.error = None, e
+
+    def _rollback(self) -> None:
+        """Undo the current write: its savepoint within a group commit, else the transaction."""
+        if self._group_commit:
+            self.conn.execute("ROLLBACK TO queued_write")
+        else:
+            self.conn.rollback()
+            self._index_dirty.clear()
 
     def close(self) -> None:
-        """Close database connection."""
-        self.conn.close()
+        """Close database connection (queued writes and entry uses are written first)."""
+        if self.write_queue is not None:
+            self.write_queue.stop()
+        self.flush_usage()
+        with self.lock:
+            self.conn.close()
 
 
@@ -0,0 +1,184 @@
+"""
+PASSWORD MANAGER - Change Notifications
+Features: Fan-out of vault change notices to many subscribers, Bounded
+per-client buffers, Server-sent events with heartbeats and resume by version
+"""
+
+import json
+import os
+import threading
+from collections import deque
+from typing import Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+from instrumentation import metrics
+
+# Notices buffered per client; a client that falls further behind gets a
+# single "resync" notice instead and catches up through /api/sync
+BUFFER_SIZE = int(os.environ.get("PM_EVENTS_BUFFER", "256"))
+# Open streams across all tenants; more are refused with 503
+MAX_SUBSCRIBERS = int(os.environ.get("PM_EVENTS_MAX_SUBSCRIBERS", "1000"))
+# An idle stream sends a comment this often, so proxies keep it open and
+# disconnected clients are noticed
+HEARTBEAT_SECONDS = float(os.environ.get("PM_EVENTS_HEARTBEAT", "15"))
+# Reconnect delay suggested to clients (the SSE "retry" field)
+RETRY_MS = 3000
+
+metrics.describe("pm_events_notices_total", "counter",
+                 "Change notices queued for event stream clients.")
+metrics.describe("pm_events_overflows_total", "counter",
+                 "Event stream clients that fell behind and were told to resync.")
+
+
+def format_event(notice: Dict) -> str:
+    """Encode a notice as a server-sent event whose id is its vault version."""
+    event = "resync" if notice["op"] == "resync" else "change"
+    data = json.dumps(notice, separators=(",", ":"))
+    return f"id: {notice['version']}\nevent: {event}\ndata: {data}\n\n"
+
+
+class Subscriber:
+    """One open event stream: a bounded queue of notices for a tenant."""
+
+    def __init__(self, tenant: str, buffer_size: int = BUFFER_SIZE):
+        self.tenant = tenant
+        self.buffer_size = buffer_size
+        # Notices up to this version were replayed when the stream opened
+        self.since = 0
+        self.latest = 0
+        self.closed = False
+        self._notices: Deque[Dict] = deque()
+        self._overflow = False
+        self._ready = threading.Condition(threading.Lock())
+
+    def push(self, notices: List[Dict]) -> None:
+        with self._ready:
+            if not self._overflow:
+                if len(self._notices) + len(notices) > self.buffer_size:
+                    self._overflow = True
+                    self._notices.clear()
+                    metrics.inc("pm_events_overflows_total")
+                else:
+                    self._notices.extend(notices)
+            self.latest = max(self.latest, notices[-1]["version"])
+            self._ready.notify()
+
+    def close(self) -> None:
+        with self._ready:
+            self.closed = True
+            self._ready.notify()
+
+    def wait(self, timeout: float) -> Tuple[List[Dict], bool]:
+        """
+        Block until notices arrive (at most timeout seconds) and take them.
+        Returns (notices, overflowed); after an overflow the queue is empty.
+        """
+        with self._ready:
+            if not self._notices and not self._overflow and not self.closed:
+                self._ready.wait(timeout)
+            notices = list(self._notices)
+            self._notices.clear()
+            overflow, self._overflow = self._overflow, False
+            return notices, overflow
+
+
+class ChangeHub:
+    """
+    Fans change notices out to the event streams of each tenant.
+
+    A DatabaseManager only reports changes while watched (see
+    DatabaseManager.watch_changes), and drops its listener when a publish
+    finds nobody subscribed, so vaults without open streams do no extra
+    work per commit. Publishing never blocks on a slow client: each
+    subscriber has a bounded buffer, and one that overflows is told to
+    resync instead. Idle subscribers only hold a waiting thread.
+    """
+
+    def __init__(self, buffer_size: int = BUFFER_SIZE, max_subscribers: int = MAX_SUBSCRIBERS,
+                 heartbeat: float = HEARTBEAT_SECONDS):
+        self.buffer_size = buffer_size
+        self.max_subscribers = max_subscribers
+        self.heartbeat = heartbeat
+        # Tuples are replaced, never mutated, so publish() reads them without the lock
+        self._subscribers: Dict[str, Tuple[Subscriber, ...]] = {}
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def subscribe(self, tenant: str) -> Optional[Subscriber]:
+        """Open a subscription for a tenant, or None when the hub is full."""
+        subscriber = Subscriber(tenant, self.buffer_size)
+        with self._lock:
+            if self._count >= self.max_subscribers:
+                return None
+            self._subscribers[tenant] = self._subscribers.get(tenant, ()) + (subscriber,)
+            self._count += 1
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        """Remove a subscription (no-op when already removed)."""
+        with self._lock:
+            current = self._subscribers.get(subscriber.tenant, ())
+            if subscriber not in current:
+                return
+            remaining = tuple(s for s in current if s is not subscriber)
+            if remaining:
+                self._subscribers[subscriber.tenant] = remaining
+            else:
+                del self._subscribers[subscriber.tenant]
+            self._count -= 1
+        subscriber.close()
+
+    def publisher(self, tenant: str) -> Callable[[List[Dict]], bool]:
+        """Get the listener a tenant's DatabaseManager calls after each commit."""
+        def publish(notices: List[Dict]) -> bool:
+            subscribers = self._subscribers.get(tenant, ())
+            for subscriber in subscribers:
+                subscriber.push(notices)
+            if subscribers:
+                metrics.inc("pm_events_notices_total", len(notices) * len(subscribers))
+            # False tells the database to stop reporting until watched again
+            return bool(subscribers)
+        return publish
+
+    def attach(self, tenant) -> None:
+        """Watch a freshly opened tenant vault if it has open streams."""
+        if self._subscribers.get(tenant.name):
+            tenant.db.watch_changes(self.publisher(tenant.name))
+
+    def close_all(self) -> None:
+        """End every open stream (server shutdown)."""
+        with self._lock:
+            subscribers = [s for group in self._subscribers.values() for s in group]
+            self._subscribers = {}
+            self._count = 0
+        for subscriber in subscribers:
+            subscriber.close()
+
+    def stream(self, subscriber: Subscriber, replay: List[Dict],
+               authorized: Optional[Callable[[], bool]] = None) -> Iterator[str]:
+        """
+        Yield the server-sent events of a subscription: the retry hint, the
+        replayed notices, then live notices as they come, with a heartbeat
+        comment whenever the stream has been idle for `heartbeat` seconds.
+        `authorized` is called whenever the stream wakes up (at least every
+        heartbeat); the stream ends as soon as it returns False.
+        """
+        yield f"retry: {RETRY_MS}\n\n"
+        for notice in replay:
+            yield format_event(notice)
+        while not subscriber.closed:
+            notices, overflow = subscriber.wait(self.heartbeat)
+            if authorized is not None and not authorized():
+                return
+            if overflow:
+                yield format_event({"op": "resync", "version": subscriber.latest})
+            elif notices:
+                # Notices committed before the stream opened were replayed
+                chunk = "".join(format_event(n) for n in notices
+                                if n["version"] > subscriber.since)
+                if chunk:
+                    yield chunk
+            elif not subscriber.closed:
+                yield ": heartbeat\n\n"
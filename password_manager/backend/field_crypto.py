@@ -0,0 +1,120 @@
+"""
+PASSWORD MANAGER - Field Encryption
+Features: Authenticated encryption of entry metadata, Keyed blind indexes
+for exact and word lookups, Keys derived from the vault key
+"""
+
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+import os
+from functools import lru_cache
+from typing import List, Optional, Set, Tuple
+
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+from search_index import tokenize, url_host
+from site_matcher import site_key
+
+# Fields stored together in passwords.meta, in this order
+METADATA_FIELDS = ("website", "url", "username", "notes")
+# What a field reads as when its ciphertext does not open (wrong key, damage)
+DECRYPTION_ERROR = "***DECRYPTION_ERROR***"
+# Shortest website/host word prefix indexed for search ("git" finds github)
+MIN_PREFIX = 3
+# Blind indexes kept in memory: words recur across entries (com, mail, login)
+BLIND_CACHE_SIZE = 65536
+
+Metadata = Tuple[str, Optional[str], str, Optional[str]]
+
+# Skips json.loads' input type checks, this runs for every row read
+_decode_json = json.JSONDecoder().decode
+
+
+def _derive(vault_key: bytes, purpose: bytes) -> bytes:
+    return HKDF(algorithm=hashes.SHA256(), length=32, salt=None,
+                info=b"password-manager " + purpose).derive(vault_key)
+
+
+class FieldCipher:
+    """
+    Encrypts the website, URL, username and notes of an entry as one
+    AES-GCM sealed value, and computes the blind indexes that replace the
+    plaintext columns for lookups.
+
+    A blind index is a keyed HMAC of a normalized value, truncated to a
+    signed 64-bit integer so it is stored and indexed as an SQLite INTEGER.
+    Equal values give equal indexes, so an equality lookup is one index
+    probe, but nothing can be checked against a guess without the vault
+    key. What they do reveal is which entries share a site, a username or
+    a word. Each kind of index is hashed with its own prefix, so a word
+    index never equals a site index of the same text.
+
+    Both keys are derived from the vault's Fernet key with HKDF: rotating
+    the vault key (vault_cli.py reencrypt) re-seals and re-indexes every entry.
+    """
+
+    def __init__(self, vault_key: bytes):
+        self._aead = AESGCM(_derive(vault_key, b"metadata"))
+        self._mac_key = _derive(vault_key, b"blind index")
+        self.blind = lru_cache(maxsize=BLIND_CACHE_SIZE)(self._blind)
+
+    def seal(self, website: str, url: Optional[str], username: str, notes: Optional[str]) -> str:
+        """Encrypt the metadata of an entry (a fresh nonce each time)."""
+        data = json.dumps([website, url, username, notes], separators=(",", ":")).encode()
+        nonce = os.urandom(12)
+        return base64.b64encode(nonce + self._aead.encrypt(nonce, data, None)).decode()
+
+    def open(self, token: Optional[str]) -> Metadata:
+        """Decrypt sealed metadata: (website, url, username, notes)."""
+        try:
+            raw = binascii.a2b_base64(token)
+            data = self._aead.decrypt(raw[:12], raw[12:], None)
+            website, url, username, notes = _decode_json(data.decode())
+            return website, url, username, notes
+        except (InvalidTag, ValueError, TypeError):
+            return DECRYPTION_ERROR, None, DECRYPTION_ERROR, None
+
+    def _blind(self, kind: str, value: str) -> int:
+        """Keyed 64-bit digest of a value, for the blind index of `kind` (see blind)."""
+        digest = hmac.digest(self._mac_key, f"{kind}:{value}".encode(), hashlib.sha256)
+        return int.from_bytes(digest[:8], "big", signed=True)
+
+    def site_index(self, website: str, url: Optional[str]) -> Optional[int]:
+        """Exact-match index of the entry's site key (None when it has none)."""
+        key = site_key(website, url)
+        return self.blind("site", key) if key else None
+
+    def username_index(self, username: str) -> int:
+        """Exact-match index of a username (compared as stored, like before)."""
+        return self.blind("user", username or "")
+
+    def tokens(self, website: str, url: Optional[str], username: str,
+               notes: Optional[str]) -> Set[int]:
+        """
+        Word indexes of an entry: every normalized word of its website, URL
+        host, username and notes, plus the prefixes of MIN_PREFIX letters or
+        more of its website and host words.
+        """
+        site_words = set(tokenize(f"{website or ''} {url_host(url)}"))
+        words = site_words.union(tokenize(f"{username or ''} {notes or ''}"))
+        tokens = {self.blind("word", word) for word in words}
+        for word in site_words:
+            for end in range(MIN_PREFIX, len(word)):
+                tokens.add(self.blind("prefix", word[:end]))
+        return tokens
+
+    def query_tokens(self, query: str) -> List[Set[int]]:
+        """For each word of a search query, the indexes of entries matching it."""
+        candidates = []
+        for word in dict.fromkeys(tokenize(query)):
+            tokens = {self.blind("word", word)}
+            if len(word) >= MIN_PREFIX:
+                tokens.add(self.blind("prefix", word))
+            candidates.append(tokens)
+        return candidates
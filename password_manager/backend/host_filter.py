@@ -0,0 +1,166 @@
+"""
+PASSWORD MANAGER - Host Filter
+Features: Bloom filter of the sites that have entries, Incremental updates,
+Compact versioned binary form that clients test locally
+"""
+
+import hashlib
+import math
+import os
+import re
+import struct
+import threading
+from typing import Iterable, List, Optional, Tuple
+
+from site_matcher import site_label
+
+# False positive rate the filter is sized for at full capacity
+FALSE_POSITIVE_RATE = float(os.environ.get("PM_HOST_FILTER_FP_RATE", "0.01"))
+# Room for names added after a build, as a multiple of the names built with
+GROWTH_FACTOR = 2
+MIN_CAPACITY = 256
+
+# Binary form: header then the bit array (bit i is byte i >> 3, mask 1 << (i & 7))
+#   magic "PMHF" | format u8 | hashes u8 | reserved u16 | bits u32 | names u32
+# all little-endian. Clients must refuse formats they do not know.
+MAGIC = b"PMHF"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sBBHII")
+
+FNV_PRIME = 0x01000193
+# Offset bases of the two FNV-1a hashes combined into each probe
+FNV_BASES = (0x811C9DC5, 0x050C5D1F)
+IPV4 = re.compile(r"^\d{1,3}(\.\d{1,3}){3}$")
+
+
+def fnv1a(data: bytes, basis: int) -> int:
+    """32-bit FNV-1a hash, simple to reproduce exactly in the extension."""
+    h = basis
+    for byte in data:
+        h = ((h ^ byte) * FNV_PRIME) & 0xFFFFFFFF
+    return h
+
+
+def probes(name: str, hashes: int, bits: int) -> List[int]:
+    """Bit positions of a name: h1 + i * h2 (double hashing) modulo the size."""
+    data = name.encode("utf-8")
+    h1 = fnv1a(data, FNV_BASES[0])
+    h2 = fnv1a(data, FNV_BASES[1]) | 1
+    return [(h1 + i * h2) % bits for i in range(hashes)]
+
+
+def host_names(host: str) -> List[str]:
+    """
+    Names a client tests for a page's host name: every label but the last
+    ("accounts.google.co.uk" -> accounts, google, co), or the whole host for
+    IP addresses and single-label hosts. One of them is the name of the
+    site key of any entry of that site.
+    """
+    host = (host or "").strip().lower().rstrip(".")
+    if host.startswith("www."):
+        host = host[4:]
+    if not host:
+        return []
+    if IPV4.match(host) or ":" in host or "." not in host:
+        return [host]
+    return host.split(".")[:-1]
+
+
+class HostFilter:
+    """
+    Bloom filter of the site names (site_label of each site key) that have
+    entries in a vault, served to clients so they only ask the server about
+    pages that probably have credentials.
+
+    Like SiteIndex it is built from the distinct site keys on first use and
+    only grows: names are added after each commit, names whose entries
+    were deleted stay (a false positive, never a false negative). It is
+    invalidated, and rebuilt on next use, once the names added since the
+    build exceed its capacity or the deleted entries reach a quarter of
+    the names, so the false positive rate stays near FALSE_POSITIVE_RATE.
+    """
+
+    def __init__(self, false_positive_rate: float = FALSE_POSITIVE_RATE):
+        self.false_positive_rate = false_positive_rate
+        self._lock = threading.Lock()
+        self._bits = bytearray()
+        self._size = 0
+        self._hashes = 0
+        self._names = 0
+        self._capacity = 0
+        self._removed = 0
+        # Serialized form and its ETag, until the next change
+        self._blob: Optional[Tuple[str, bytes]] = None
+        self.built = False
+
+    def __len__(self) -> int:
+        return self._names
+
+    def build(self, keys: Iterable[str]) -> None:
+        """Replace the filter contents with the names of the given site keys."""
+        names = {site_label(key) for key in keys if key}
+        capacity = max(MIN_CAPACITY, len(names) * GROWTH_FACTOR)
+        # Optimal size and hash count for `capacity` names at the target rate
+        size = math.ceil(-capacity * math.log(self.false_positive_rate) / math.log(2) ** 2)
+        size = (size + 7) // 8 * 8
+        hashes = max(1, round(size / capacity * math.log(2)))
+        bits = bytearray(size // 8)
+        for name in names:
+            for probe in probes(name, hashes, size):
+                bits[probe >> 3] |= 1 << (probe & 7)
+        with self._lock:
+            self._bits, self._size, self._hashes = bits, size, hashes
+            self._names, self._capacity, self._removed = len(names), capacity, 0
+            self._blob = None
+            self.built = True
+
+    def invalidate(self) -> None:
+        """Drop the contents; the owner rebuilds the filter on next use."""
+        with self._lock:
+            self._bits = bytearray()
+            self._blob = None
+            self.built = False
+
+    def add(self, key: str) -> None:
+        """Add the name of a site key (no-op when its bits are already set)."""
+        if not key:
+            return
+        with self._lock:
+            if not self.built:
+                return
+            changed = False
+            for probe in probes(site_label(key), self._hashes, self._size):
+                mask = 1 << (probe & 7)
+                if not self._bits[probe >> 3] & mask:
+                    self._bits[probe >> 3] |= mask
+                    changed = True
+            if changed:
+                self._names += 1
+                self._blob = None
+                if self._names > self._capacity:
+                    self.built = False
+
+    def note_removed(self, count: int) -> None:
+        """Count deleted entries; past a quarter of the names the filter is rebuilt."""
+        with self._lock:
+            self._removed += count
+            if self.built and self._removed * 4 > max(self._names, MIN_CAPACITY):
+                self.built = False
+
+    def might_contain(self, host: str) -> bool:
+        """The client-side test: could the vault have entries for this host?"""
+        with self._lock:
+            bits, size, hashes = self._bits, self._size, self._hashes
+        return any(
+            all(bits[probe >> 3] & (1 << (probe & 7)) for probe in probes(name, hashes, size))
+            for name in host_names(host)
+        )
+
+    def serialize(self) -> Tuple[str, bytes]:
+        """Get the binary form and its ETag (a digest of it)."""
+        with self._lock:
+            if self._blob is None:
+                blob = HEADER.pack(MAGIC, FORMAT_VERSION, self._hashes, 0,
+                                   self._size, self._names) + bytes(self._bits)
+                self._blob = (hashlib.sha256(blob).hexdigest()[:32], blob)
+            return self._blob
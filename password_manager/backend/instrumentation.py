@@ -0,0 +1,161 @@
+"""
+PASSWORD MANAGER - Instrumentation
+Features: Counters, Latency histograms, Prometheus text exposition
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+from typing import Dict, List, Tuple
+
+# Latency buckets in seconds, from sub-millisecond crypto to slow bulk requests
+DEFAULT_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(key: LabelKey, extra: str = "") -> str:
+    parts = [f'{k}="{_escape(v)}"' for k, v in key]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram for one label set."""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """
+    Thread-safe registry of counters and histograms.
+    Label values must be fixed names (routes, operations), never user data.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+
+    def describe(self, name: str, kind: str, help_text: str) -> None:
+        """Register the type and help text of a metric."""
+        self._help[name] = (kind, help_text)
+
+    def inc(self, name: str, amount: float = 1, **labels) -> None:
+        """Increment a counter."""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        """Record a latency observation."""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram()
+            histogram.observe(seconds)
+
+    def timed(self, name: str, **labels):
+        """Decorator recording the duration of every call."""
+        def decorator(f):
+            @wraps(f)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return f(*args, **kwargs)
+                finally:
+                    self.observe(name, time.perf_counter() - start, **labels)
+            return wrapper
+        return decorator
+
+    def snapshot(self) -> Dict:
+        """Get a copy of all series, for JSON views and tests."""
+        with self._lock:
+            return {
+                "counters": {
+                    name: {key: value for key, value in series.items()}
+                    for name, series in self._counters.items()
+                },
+                "histograms": {
+                    name: {key: (h.count, h.sum) for key, h in series.items()}
+                    for name, series in self._histograms.items()
+                }
+            }
+
+    def render_prometheus(self) -> str:
+        """Render all metrics in the Prometheus text exposition format."""
+        lines: List[str] = []
+        with self._lock:
+            for name in sorted(self._counters):
+                self._render_header(lines, name, "counter")
+                for key, value in sorted(self._counters[name].items()):
+                    lines.append(f"{name}{_format_labels(key)} {value:g}")
+
+            for name in sorted(self._histograms):
+                self._render_header(lines, name, "histogram")
+                for key, h in sorted(self._histograms[name].items()):
+                    cumulative = 0
+                    for bound, count in zip(h.buckets, h.counts):
+                        cumulative += count
+                        le = _format_labels(key, f'le="{bound:g}"')
+                        lines.append(f"{name}_bucket{le} {cumulative}")
+                    le = _format_labels(key, 'le="+Inf"')
+                    lines.append(f"{name}_bucket{le} {h.count}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {h.sum:.6f}")
+                    lines.append(f"{name}_count{_format_labels(key)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def _render_header(self, lines: List[str], name: str, default_kind: str) -> None:
+        kind, help_text = self._help.get(name, (default_kind, ""))
+        if help_text:
+            lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    def reset(self) -> None:
+        """Drop all recorded series."""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+# Process-wide registry shared by the API, database and auth layers
+metrics = MetricsRegistry()
+
+metrics.describe("pm_http_request_duration_seconds", "histogram",
+                 "API request latency by route template, method and status.")
+metrics.describe("pm_db_operation_duration_seconds", "histogram",
+                 "DatabaseManager operation latency by operation name.")
+metrics.describe("pm_crypto_operation_duration_seconds", "histogram",
+                 "Fernet and bcrypt operation latency.")
+metrics.describe("pm_auth_verify_duration_seconds", "histogram",
+                 "Token verification latency in require_auth.")
+metrics.describe("pm_auth_token_cache_total", "counter",
+                 "Verified-token cache lookups by result.")
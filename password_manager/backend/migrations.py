@@ -0,0 +1,276 @@
+"""
+PASSWORD MANAGER - Schema Migrations
+Features: Ordered migrations keyed on PRAGMA user_version, applied once each
+"""
+
+import sqlite3
+from typing import Callable, List, Tuple
+
+from site_matcher import site_key
+
+
+def _initial_schema(cursor: sqlite3.Cursor) -> None:
+    """Tables of the original schema (IF NOT EXISTS adopts pre-migration vaults)."""
+    # Main passwords table with enhanced fields
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS passwords (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            website TEXT NOT NULL,
+            url TEXT,
+            username TEXT NOT NULL,
+            password TEXT NOT NULL,
+            category TEXT DEFAULT 'General',
+            notes TEXT,
+            favorite INTEGER DEFAULT 0,
+            auto_saved INTEGER DEFAULT 0,
+            breach_check_result TEXT,
+            strength_score INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Change log for delta sync: one row per mutation, deletes act as tombstones
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS changes (
+            version INTEGER PRIMARY KEY AUTOINCREMENT,
+            password_id INTEGER NOT NULL,
+            operation TEXT NOT NULL,
+            changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_changes_password_id ON changes (password_id)"
+    )
+
+    # Key/value settings (sync horizon after compaction, ...)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+    ''')
+
+    # Categories table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS categories (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE NOT NULL,
+            icon TEXT DEFAULT '📁',
+            color TEXT DEFAULT '#7E57C2'
+        )
+    ''')
+
+    # Insert default categories
+    default_categories = [
+        ('General', '📁', '#7E57C2'),
+        ('Social Media', '📱', '#E91E63'),
+        ('Email', '📧', '#2196F3'),
+        ('Banking', '🏦', '#4CAF50'),
+        ('Shopping', '🛒', '#FF9800'),
+        ('Work', '💼', '#607D8B'),
+        ('Entertainment', '🎮', '#9C27B0'),
+        ('Other', '📌', '#795548')
+    ]
+    cursor.executemany(
+        "INSERT OR IGNORE INTO categories (name, icon, color) VALUES (?, ?, ?)",
+        default_categories
+    )
+
+
+def _lookup_indexes(cursor: sqlite3.Cursor) -> None:
+    """Indexes for duplicate detection, ordering and the common filters."""
+    # find_similar_password and ORDER BY website
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_passwords_website_username "
+        "ON passwords (website, username)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_passwords_category ON passwords (category)"
+    )
+    # Partial indexes stay small: only flagged rows are indexed
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_passwords_favorite "
+        "ON passwords (website) WHERE favorite = 1"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_passwords_auto_saved "
+        "ON passwords (created_at) WHERE auto_saved = 1"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_passwords_strength ON passwords (strength_score)"
+    )
+
+
+def _category_foreign_key(cursor: sqlite3.Cursor) -> None:
+    """Replace the free-text passwords.category with an indexed categories.id reference."""
+    cursor.execute(
+        "ALTER TABLE passwords ADD COLUMN category_id INTEGER REFERENCES categories (id)"
+    )
+    # Free-text categories that were never added to the categories table
+    cursor.execute(
+        """INSERT OR IGNORE INTO categories (name)
+           SELECT DISTINCT category FROM passwords
+           WHERE category IS NOT NULL AND category != ''"""
+    )
+    cursor.execute(
+        """UPDATE passwords SET category_id = COALESCE(
+               (SELECT id FROM categories WHERE name = passwords.category),
+               (SELECT id FROM categories WHERE name = 'General')
+           )"""
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_passwords_category_id ON passwords (category_id)"
+    )
+    cursor.execute("DROP INDEX IF EXISTS idx_passwords_category")
+    # DROP COLUMN needs SQLite 3.35+; older builds keep the unused column
+    if sqlite3.sqlite_version_info >= (3, 35, 0):
+        cursor.execute("ALTER TABLE passwords DROP COLUMN category")
+
+
+def _site_keys(cursor: sqlite3.Cursor) -> None:
+    """Add the normalized site key used to match entries of the same site."""
+    cursor.execute("ALTER TABLE passwords ADD COLUMN site_key TEXT")
+    register_functions(cursor.connection)
+    cursor.execute("UPDATE passwords SET site_key = site_key(website, url)")
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_passwords_site_key ON passwords (site_key, username)"
+    )
+
+
+def _usage_tracking(cursor: sqlite3.Cursor) -> None:
+    """Track when and how often entries are used, ranked by a frecency score."""
+    cursor.execute("ALTER TABLE passwords ADD COLUMN last_used_at TIMESTAMP")
+    cursor.execute("ALTER TABLE passwords ADD COLUMN use_count INTEGER NOT NULL DEFAULT 0")
+    # 0 for never used, see DatabaseManager.record_use
+    cursor.execute("ALTER TABLE passwords ADD COLUMN frecency REAL NOT NULL DEFAULT 0")
+    # find_similar_password: most used entry of a site first
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_passwords_site_frecency "
+        "ON passwords (site_key, frecency DESC)"
+    )
+
+
+def _encrypted_metadata(cursor: sqlite3.Cursor) -> None:
+    """
+    Columns for encrypted metadata and its blind indexes. The rows
+    themselves are encrypted by DatabaseManager, which holds the key (see
+    DatabaseManager.encrypt_plaintext_rows).
+    """
+    # website, url, username and notes sealed together (field_crypto.py)
+    cursor.execute("ALTER TABLE passwords ADD COLUMN meta TEXT")
+    # Keyed digests replacing the plaintext site_key and username for lookups
+    cursor.execute("ALTER TABLE passwords ADD COLUMN site_index INTEGER")
+    cursor.execute("ALTER TABLE passwords ADD COLUMN username_index INTEGER")
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS entry_tokens (
+            token INTEGER NOT NULL,
+            password_id INTEGER NOT NULL,
+            PRIMARY KEY (token, password_id)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_entry_tokens_password ON entry_tokens (password_id)"
+    )
+    # Every path that deletes entries (API, bulk, backup replay) drops their words
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS entry_tokens_delete AFTER DELETE ON passwords
+        BEGIN
+            DELETE FROM entry_tokens WHERE password_id = OLD.id;
+        END
+    ''')
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_passwords_site_index "
+        "ON passwords (site_index, username_index)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_passwords_site_index_frecency "
+        "ON passwords (site_index, frecency DESC)"
+    )
+    # Rows still in plaintext; empty once they are all encrypted
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_passwords_plaintext ON passwords (id) WHERE meta IS NULL"
+    )
+    # Indexes of the plaintext columns, which are emptied (idx_passwords_favorite
+    # stays: a partial index, it still finds the favorites)
+    for index in ("idx_passwords_website_username", "idx_passwords_site_key",
+                  "idx_passwords_site_frecency"):
+        cursor.execute(f"DROP INDEX IF EXISTS {index}")
+
+
+def _stats_versions(cursor: sqlite3.Cursor) -> None:
+    """
+    Number the updates the change log leaves out (usage, strength and breach
+    results), so incremental backups can include the entries they touched.
+    """
+    cursor.execute("ALTER TABLE passwords ADD COLUMN stats_version INTEGER NOT NULL DEFAULT 0")
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_passwords_stats_version ON passwords (stats_version)"
+    )
+    cursor.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('stats_version', '0')")
+    # A trigger, so every writer (API, maintenance jobs, vault_cli) is covered
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS passwords_stats_version
+        AFTER UPDATE OF use_count, last_used_at, frecency, strength_score, breach_check_result
+        ON passwords
+        BEGIN
+            UPDATE meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'stats_version';
+            UPDATE passwords SET stats_version =
+                (SELECT CAST(value AS INTEGER) FROM meta WHERE key = 'stats_version')
+            WHERE id = NEW.id;
+        END
+    ''')
+
+
+def register_functions(conn: sqlite3.Connection) -> None:
+    """Make the Python helpers used by the schema callable from SQL."""
+    conn.create_function("site_key", 2, site_key, deterministic=True)
+
+
+# (version, description, migration). Append only: never edit or reorder
+# a migration that has shipped, add a new one instead.
+MIGRATIONS: List[Tuple[int, str, Callable[[sqlite3.Cursor], None]]] = [
+    (1, "initial schema", _initial_schema),
+    (2, "lookup indexes", _lookup_indexes),
+    (3, "category foreign key", _category_foreign_key),
+    (4, "site keys", _site_keys),
+    (5, "usage tracking", _usage_tracking),
+    (6, "encrypted metadata", _encrypted_metadata),
+    (7, "stats versions", _stats_versions),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """Read the schema version stored in the database header."""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection) -> List[int]:
+    """
+    Apply pending migrations, each in its own transaction together with the
+    user_version bump. When the schema is current only one PRAGMA is read.
+    Returns the versions that were applied.
+    """
+    if get_schema_version(conn) >= SCHEMA_VERSION:
+        return []
+
+    applied = []
+    cursor = conn.cursor()
+    for version, description, migration in MIGRATIONS:
+        # Take the write lock first, then re-check: another worker may have
+        # applied this migration while we were waiting
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            if get_schema_version(conn) >= version:
+                conn.rollback()
+                continue
+            migration(cursor)
+            cursor.execute(f"PRAGMA user_version = {int(version)}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(version)
+    return applied
@@ -3,12 +3,34 @@ PASSWORD MANAGER - Password Generator
 Features: Customizable generation, Strength analysis, Memorable passwords
 """
 
+import hashlib
+import json
 import secrets
 import string
 import re
 from typing import Dict, List, Optional
 
 
+def load_breach_hashes(path: str) -> Dict[str, int]:
+    """
+    Load a breached-password list in the Have I Been Pwned format
+    (one "SHA1HEX:count" per line; a bare hash counts as 1).
+    """
+    hashes = {}
+    with open(path, encoding="ascii", errors="ignore") as f:
+        for line in f:
+            digest, _, count = line.strip().partition(":")
+            if len(digest) == 40:
+                hashes[digest.upper()] = int(count) if count.isdigit() else 1
+    return hashes
+
+
+def breach_check_result(password: str, breached: Dict[str, int]) -> str:
+    """Get the breach_check_result value of a password against a loaded list."""
+    count = breached.get(hashlib.sha1(password.encode()).hexdigest().upper(), 0)
+    return json.dumps({"breached": count > 0, "count": count})
+
+
 class PasswordGenerator:
     def __init__(self):
         self.lowercase = string.ascii_lowercase
@@ -0,0 +1,187 @@
+"""
+PASSWORD MANAGER - Request Profiler
+Features: Opt-in cProfile per request, Slow-query log with EXPLAIN QUERY PLAN,
+Bounded on-disk profile ring buffer
+"""
+
+import cProfile
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+logger = logging.getLogger("password_manager.slow_query")
+
+# Statements slower than this (time to first row) are logged with their plan
+SLOW_QUERY_THRESHOLD_MS = float(os.environ.get("PM_SLOW_QUERY_MS", "100"))
+
+# Per-thread list of statements executed while a request is being profiled
+_collector = threading.local()
+
+
+def _explain(connection: sqlite3.Connection, sql: str, params) -> List[str]:
+    """Get the query plan of a statement, without running it."""
+    try:
+        cursor = sqlite3.Cursor(connection)
+        cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+        return [row[3] for row in cursor.fetchall()]
+    except sqlite3.Error:
+        return []
+
+
+class ProfiledCursor(sqlite3.Cursor):
+    """Cursor that times statements and reports slow ones."""
+
+    def execute(self, sql, params=()):
+        start = time.perf_counter()
+        result = super().execute(sql, params)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        _record_statement(self.connection, sql, params, elapsed_ms)
+        return result
+
+    def executemany(self, sql, seq_of_params):
+        start = time.perf_counter()
+        result = super().executemany(sql, seq_of_params)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        _record_statement(self.connection, sql, None, elapsed_ms)
+        return result
+
+
+class ProfiledConnection(sqlite3.Connection):
+    """Connection whose cursors are ProfiledCursor (pass as sqlite3.connect factory)."""
+
+    def cursor(self, factory=ProfiledCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self.cursor().executemany(sql, seq_of_params)
+
+
+def _record_statement(connection, sql: str, params, elapsed_ms: float) -> None:
+    """Log slow statements and collect statements of profiled requests."""
+    statements = getattr(_collector, "statements", None)
+    if elapsed_ms < SLOW_QUERY_THRESHOLD_MS and statements is None:
+        return
+
+    sql = " ".join(sql.split())
+    plan = []
+    if elapsed_ms >= SLOW_QUERY_THRESHOLD_MS:
+        if params is not None and sql.split(" ", 1)[0].upper() in ("SELECT", "UPDATE", "DELETE"):
+            plan = _explain(connection, sql, params)
+        # Parameters are never logged, they may hold secrets
+        logger.warning("Slow query (%.1f ms): %s | plan: %s", elapsed_ms, sql, "; ".join(plan))
+
+    if statements is not None:
+        statements.append({"sql": sql, "ms": round(elapsed_ms, 3), "plan": plan})
+
+
+class RequestProfiler:
+    """
+    Captures a cProfile profile for selected requests and keeps the most
+    recent ones in a bounded directory (oldest files are removed first).
+
+    Modes: "off", "header" (only requests sending X-Profile-Request: 1)
+    and "always".
+    """
+
+    HEADER = "X-Profile-Request"
+
+    def __init__(self, mode: str = "off", profile_dir: str = "profiles", max_profiles: int = 20):
+        self.mode = mode
+        self.profile_dir = profile_dir
+        self.max_profiles = max_profiles
+        self._lock = threading.Lock()
+        self._next_id: Optional[int] = None
+
+    def should_profile(self, headers) -> bool:
+        """Decide from the config and request headers whether to profile."""
+        if self.mode == "always":
+            return True
+        return self.mode == "header" and headers.get(self.HEADER) == "1"
+
+    def start(self) -> cProfile.Profile:
+        """Start profiling the current request."""
+        _collector.statements = []
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    def stop(self, profile: cProfile.Profile, method: str, route: str,
+             status: int, duration_ms: float) -> Dict:
+        """Stop profiling and store the profile in the ring buffer."""
+        profile.disable()
+        statements = getattr(_collector, "statements", None) or []
+        _collector.statements = None
+
+        os.makedirs(self.profile_dir, exist_ok=True)
+        with self._lock:
+            profile_id = self._allocate_id()
+            meta = {
+                "id": profile_id,
+                "method": method,
+                "route": route,
+                "status": status,
+                "duration_ms": round(duration_ms, 3),
+                "created_at": datetime.utcnow().isoformat() + "Z",
+                "queries": statements
+            }
+            base = os.path.join(self.profile_dir, f"{profile_id:08d}")
+            profile.dump_stats(base + ".prof")
+            with open(base + ".json", "w") as f:
+                json.dump(meta, f)
+            self._evict()
+        return meta
+
+    def discard(self, profile: cProfile.Profile) -> None:
+        """Stop profiling without storing anything (request failed)."""
+        profile.disable()
+        _collector.statements = None
+
+    def _allocate_id(self) -> int:
+        if self._next_id is None:
+            ids = self._stored_ids()
+            self._next_id = (ids[-1] + 1) if ids else 1
+        profile_id = self._next_id
+        self._next_id += 1
+        return profile_id
+
+    def _stored_ids(self) -> List[int]:
+        if not os.path.isdir(self.profile_dir):
+            return []
+        return sorted(
+            int(name[:-5]) for name in os.listdir(self.profile_dir)
+            if re.fullmatch(r"\d{8}\.json", name)
+        )
+
+    def _evict(self) -> None:
+        ids = self._stored_ids()
+        for profile_id in ids[:max(0, len(ids) - self.max_profiles)]:
+            for ext in (".prof", ".json"):
+                try:
+                    os.remove(os.path.join(self.profile_dir, f"{profile_id:08d}{ext}"))
+                except FileNotFoundError:
+                    pass
+
+    def list_profiles(self) -> List[Dict]:
+        """Get the metadata of stored profiles, newest first."""
+        profiles = []
+        for profile_id in reversed(self._stored_ids()):
+            try:
+                with open(os.path.join(self.profile_dir, f"{profile_id:08d}.json")) as f:
+                    profiles.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return profiles
+
+    def profile_path(self, profile_id: int) -> Optional[str]:
+        """Get the path of a stored .prof file, if it still exists."""
+        path = os.path.join(self.profile_dir, f"{profile_id:08d}.prof")
+        return path if os.path.exists(path) else None
@@ -0,0 +1,97 @@
+"""
+PASSWORD MANAGER - Password Records
+Features: Compact tuple-based row type, SQLite row factory opening the
+encrypted metadata, Lazy password decryption, One row-to-dict mapping for
+every read path
+"""
+
+import sqlite3
+from operator import itemgetter
+from typing import Callable, Dict, Tuple, Type
+
+# Column order of password rows and records
+PASSWORD_FIELDS = (
+    "id", "website", "url", "username", "password", "category",
+    "notes", "favorite", "created_at", "updated_at"
+)
+
+# The one SELECT every password read builds on; append WHERE/ORDER BY.
+# website, url, username and notes come sealed in p.meta: the row factory
+# opens them into PASSWORD_FIELDS order
+PASSWORD_COLUMNS = "p.id, p.meta, p.password, c.name, p.favorite, p.created_at, p.updated_at"
+PASSWORD_FROM = "FROM passwords p LEFT JOIN categories c ON c.id = p.category_id"
+PASSWORD_SELECT = f"SELECT {PASSWORD_COLUMNS} {PASSWORD_FROM}"
+
+
+class PasswordRecord(tuple):
+    """
+    A password row in PASSWORD_FIELDS order.
+
+    Records are plain tuples underneath (no per-row dict, so they cost what
+    the raw row costs and go straight into encode_rows and archives), with
+    read-only attributes by field name. The password stays ciphertext:
+    `password` decrypts it on each access and `ciphertext` is the stored
+    token. Use bind() to get the record type of a vault's key.
+    """
+
+    __slots__ = ()
+
+    id = property(itemgetter(0))
+    website = property(itemgetter(1))
+    url = property(itemgetter(2))
+    username = property(itemgetter(3))
+    ciphertext = property(itemgetter(4))
+    category = property(itemgetter(5))
+    notes = property(itemgetter(6))
+    created_at = property(itemgetter(8))
+    updated_at = property(itemgetter(9))
+
+    @staticmethod
+    def _decrypt(token: str) -> str:
+        raise TypeError("PasswordRecord is not bound to a vault key, see bind()")
+
+    @classmethod
+    def bind(cls, decrypt: Callable[[str], str]) -> Type["PasswordRecord"]:
+        """Get a record type whose `password` is decrypted with `decrypt`."""
+        return type(cls.__name__, (cls,), {"__slots__": (), "_decrypt": staticmethod(decrypt)})
+
+    @property
+    def password(self) -> str:
+        return self._decrypt(self[4])
+
+    @property
+    def favorite(self) -> bool:
+        return bool(self[7])
+
+    def to_dict(self, decrypt: bool = True) -> Dict:
+        """The API form of the entry; decrypt=False keeps the password encrypted."""
+        (password_id, website, url, username, password, category,
+         notes, favorite, created_at, updated_at) = self
+        return {
+            "id": password_id,
+            "website": website,
+            "url": url,
+            "username": username,
+            "password": self._decrypt(password) if decrypt else password,
+            "category": category,
+            "notes": notes,
+            "favorite": bool(favorite),
+            "created_at": created_at,
+            "updated_at": updated_at
+        }
+
+
+def record_factory(
+    record_type: Type[PasswordRecord],
+    open_metadata: Callable[[str], Tuple]
+) -> Callable[[sqlite3.Cursor, Tuple], PasswordRecord]:
+    """
+    Row factory building records of `record_type` from PASSWORD_SELECT rows;
+    `open_metadata` decrypts p.meta into (website, url, username, notes).
+    """
+    def factory(cursor: sqlite3.Cursor, row: Tuple) -> PasswordRecord:
+        password_id, meta, password, category, favorite, created_at, updated_at = row
+        website, url, username, notes = open_metadata(meta)
+        return record_type((password_id, website, url, username, password, category,
+                            notes, favorite, created_at, updated_at))
+    return factory
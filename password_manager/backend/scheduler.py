@@ -0,0 +1,224 @@
+"""
+PASSWORD MANAGER - Maintenance Scheduler
+Features: Periodic jobs on one background thread, Jitter, No overlapping
+runs, Yields to live traffic, Job status and durations
+"""
+
+import os
+import random
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from instrumentation import metrics
+
+# Requests slower than this (smoothed) mean the server is under load
+BUSY_LATENCY_MS = float(os.environ.get("PM_MAINTENANCE_BUSY_MS", "250"))
+# A due job waits for traffic to calm down at most this long, then runs anyway
+MAX_DEFER_SECONDS = float(os.environ.get("PM_MAINTENANCE_MAX_DEFER", "300"))
+# Delay before the first run of every job, so startup traffic goes first
+STARTUP_DELAY = float(os.environ.get("PM_MAINTENANCE_STARTUP_DELAY", "60"))
+# Pause between checks while waiting for traffic to calm down
+DEFER_STEP = 1.0
+
+metrics.describe("pm_maintenance_job_duration_seconds", "histogram",
+                 "Background maintenance job run duration by job and outcome.")
+
+
+class TrafficMonitor:
+    """
+    Tracks requests in flight and a smoothed request latency, so background
+    work can tell when it would compete with users.
+    """
+
+    def __init__(self, busy_latency_ms: float = BUSY_LATENCY_MS, smoothing: float = 0.2):
+        self.busy_latency_ms = busy_latency_ms
+        self.smoothing = smoothing
+        self.in_flight = 0
+        self.latency_ms = 0.0
+        self.last_request = 0.0
+        self._lock = threading.Lock()
+
+    def request_started(self) -> None:
+        with self._lock:
+            self.in_flight += 1
+
+    def request_finished(self, elapsed_ms: float) -> None:
+        with self._lock:
+            self.in_flight = max(0, self.in_flight - 1)
+            self.latency_ms += self.smoothing * (elapsed_ms - self.latency_ms)
+            self.last_request = time.monotonic()
+
+    def busy(self) -> bool:
+        """Whether requests are being served now or have recently been slow."""
+        with self._lock:
+            if self.in_flight:
+                return True
+            # The latency estimate only counts while requests keep coming
+            recent = time.monotonic() - self.last_request < 10
+            return recent and self.latency_ms > self.busy_latency_ms
+
+
+class Job:
+    """A registered periodic job and its run history."""
+
+    def __init__(self, name: str, func: Callable[[], Optional[Dict]], interval: float,
+                 jitter: float, first_run: float):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.jitter = jitter
+        self.next_run = first_run
+        self.running = False
+        self.runs = 0
+        self.failures = 0
+        self.deferrals = 0
+        self.last_started: Optional[float] = None
+        self.last_duration_ms: Optional[float] = None
+        self.last_result: Optional[Dict] = None
+        self.last_error: Optional[str] = None
+
+    def schedule_next(self, now: float) -> None:
+        spread = self.interval * self.jitter
+        self.next_run = now + self.interval + random.uniform(-spread, spread)
+
+    def status(self) -> Dict:
+        now_wall, now = time.time(), time.monotonic()
+        return {
+            "name": self.name,
+            "interval_seconds": self.interval,
+            "running": self.running,
+            "runs": self.runs,
+            "failures": self.failures,
+            "deferrals": self.deferrals,
+            "last_started": (round(now_wall - (now - self.last_started))
+                             if self.last_started is not None else None),
+            "last_duration_ms": self.last_duration_ms,
+            "last_result": self.last_result,
+            "last_error": self.last_error,
+            "next_run_in_seconds": round(max(0.0, self.next_run - now), 1)
+        }
+
+
+class MaintenanceScheduler:
+    """
+    Runs registered housekeeping jobs on a single daemon thread.
+
+    Jobs run one at a time, so they never overlap each other or themselves.
+    Each run is rescheduled `interval` seconds later, +/- `jitter` of the
+    interval, so workers and tenants started together drift apart. A due
+    job waits while the TrafficMonitor reports load (up to
+    MAX_DEFER_SECONDS); long jobs can also call yield_to_traffic() between
+    batches. The thread is started on first use by ensure_started(), in
+    the process that serves requests, which keeps it alive across fork().
+    """
+
+    def __init__(self, traffic: Optional[TrafficMonitor] = None,
+                 max_defer: float = MAX_DEFER_SECONDS, startup_delay: float = STARTUP_DELAY):
+        self.traffic = traffic or TrafficMonitor()
+        self.max_defer = max_defer
+        self.startup_delay = startup_delay
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        # _wake interrupts the idle sleep (new job, run_now, stop); _stop
+        # also ends the waits for traffic to calm down
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+
+    def register(self, name: str, func: Callable[[], Optional[Dict]], interval: float,
+                 jitter: float = 0.1) -> None:
+        """Run func every `interval` seconds; its returned dict is kept as the job result."""
+        first_run = time.monotonic() + self.startup_delay + random.uniform(0, interval * jitter)
+        with self._lock:
+            self._jobs[name] = Job(name, func, interval, jitter, first_run)
+        self._wake.set()
+
+    def ensure_started(self) -> None:
+        """Start the worker thread if this process has none (cheap when it does)."""
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="pm-maintenance", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5) -> None:
+        """Stop the worker thread after the running job (if any) returns."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def run_now(self, name: str) -> Dict:
+        """Make a job due immediately; it still waits for the running job."""
+        with self._lock:
+            job = self._jobs.get(name)
+            if job is None:
+                return {"error": f"Unknown job: {name}"}
+            job.next_run = time.monotonic()
+        self._wake.set()
+        return {"message": f"Job {name} scheduled"}
+
+    def yield_to_traffic(self, max_wait: Optional[float] = None) -> None:
+        """Block while the server is busy (at most max_wait seconds)."""
+        deadline = time.monotonic() + (self.max_defer if max_wait is None else max_wait)
+        while self.traffic.busy() and time.monotonic() < deadline:
+            if self._stop.wait(DEFER_STEP):
+                return
+
+    def status(self) -> List[Dict]:
+        """Get the status of every registered job."""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [job.status() for job in jobs]
+
+    def _next_job(self) -> Optional[Job]:
+        with self._lock:
+            if not self._jobs:
+                return None
+            return min(self._jobs.values(), key=lambda job: job.next_run)
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            job = self._next_job()
+            wait = 60.0 if job is None else job.next_run - time.monotonic()
+            if wait > 0:
+                self._wake.wait(min(wait, 60.0))
+                self._wake.clear()
+                continue
+
+            # Due: wait for traffic to calm down first, within limits
+            deferred_since = time.monotonic()
+            while self.traffic.busy() and time.monotonic() - deferred_since < self.max_defer:
+                job.deferrals += 1
+                if self._stop.wait(DEFER_STEP):
+                    return
+            if self._stop.is_set():
+                return
+            self._run(job)
+
+    def _run(self, job: Job) -> None:
+        job.running = True
+        job.last_started = time.monotonic()
+        start = time.perf_counter()
+        outcome = "ok"
+        try:
+            job.last_result = job.func()
+            job.last_error = None
+        except Exception as e:
+            outcome = "error"
+            job.failures += 1
+            job.last_error = f"{type(e).__name__}: {e}"
+        finally:
+            elapsed = time.perf_counter() - start
+            job.running = False
+            job.runs += 1
+            job.last_duration_ms = round(elapsed * 1000, 1)
+            job.schedule_next(time.monotonic())
+            metrics.observe("pm_maintenance_job_duration_seconds", elapsed,
+                            job=job.name, outcome=outcome)
@@ -0,0 +1,163 @@
+"""
+PASSWORD MANAGER - Metadata Search Index
+Features: In-memory typeahead over website, host and username words,
+Sorted term array with id postings, Write-through updates, Never decrypts
+"""
+
+import re
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+WORD = re.compile(r"[^\W_]+")
+
+# website, host, username, category_id, favorite
+Entry = Tuple[str, str, str, Optional[int], bool]
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into lowercase, accent-folded words
+    ("John.Doe@gmail.com" -> john, doe, gmail, com; "Société" -> societe).
+    """
+    if not text.isascii():
+        text = "".join(
+            c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c)
+        )
+    return WORD.findall(text.lower())
+
+
+def url_host(url: Optional[str]) -> str:
+    """Get the host of a URL, tolerating URLs saved without a scheme."""
+    if not url:
+        return ""
+    if "//" not in url:
+        url = "//" + url
+    try:
+        return urlsplit(url).hostname or ""
+    except ValueError:
+        return ""
+
+
+class MetadataIndex:
+    """
+    Word-prefix index over the non-secret fields of every entry.
+
+    Each word of an entry's website, URL host and username is a term. Terms
+    are kept in a sorted array, so a query word is looked up with one
+    binary search and matches every term it prefixes ("git" finds github
+    and gitlab); each term has a posting set of entry ids. Entries with the
+    same words share terms, so memory grows with distinct words, not
+    entries. Passwords and notes are never indexed.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[int, Entry] = {}
+        self._postings: Dict[str, Set[int]] = {}
+        self._terms: List[str] = []
+        self.built = False
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _entry_terms(entry: Entry) -> Set[str]:
+        return set(tokenize(f"{entry[0]} {entry[1]} {entry[2]}"))
+
+    def build(self, rows: Iterable[Tuple]) -> None:
+        """
+        Replace the index contents with rows of
+        (id, website, url, username, category_id, favorite).
+        """
+        entries: Dict[int, Entry] = {}
+        postings: Dict[str, Set[int]] = {}
+        for password_id, website, url, username, category_id, favorite in rows:
+            entry = (website or "", url_host(url), username or "", category_id, bool(favorite))
+            entries[password_id] = entry
+            for term in self._entry_terms(entry):
+                ids = postings.get(term)
+                if ids is None:
+                    postings[term] = {password_id}
+                else:
+                    ids.add(password_id)
+        with self._lock:
+            self._entries = entries
+            self._postings = postings
+            self._terms = sorted(postings)
+            self.built = True
+
+    def invalidate(self) -> None:
+        """Drop the contents; the owner rebuilds the index on next use."""
+        with self._lock:
+            self._entries = {}
+            self._postings = {}
+            self._terms = []
+            self.built = False
+
+    def upsert(self, password_id: int, website: str, url: Optional[str], username: str,
+               category_id: Optional[int], favorite: bool) -> None:
+        """Add or replace one entry."""
+        entry = (website or "", url_host(url), username or "", category_id, bool(favorite))
+        with self._lock:
+            self._remove(password_id)
+            self._entries[password_id] = entry
+            for term in self._entry_terms(entry):
+                ids = self._postings.get(term)
+                if ids is None:
+                    self._postings[term] = {password_id}
+                    insort(self._terms, term)
+                else:
+                    ids.add(password_id)
+
+    def remove(self, password_id: int) -> None:
+        """Remove one entry (no-op when it is not indexed)."""
+        with self._lock:
+            self._remove(password_id)
+
+    def _remove(self, password_id: int) -> None:
+        entry = self._entries.pop(password_id, None)
+        if entry is None:
+            return
+        for term in self._entry_terms(entry):
+            ids = self._postings.get(term)
+            if ids is None:
+                continue
+            ids.discard(password_id)
+            if not ids:
+                del self._postings[term]
+                del self._terms[bisect_left(self._terms, term)]
+
+    def search(self, query: str, limit: int = 10) -> List[Tuple[int, Entry]]:
+        """
+        Get up to `limit` entries where every query word prefixes a word of
+        the entry. Exact and shorter terms are taken first; the result is
+        ordered favorites first, then by website.
+        """
+        words = sorted(set(tokenize(query)), key=len, reverse=True)
+        if not words or limit <= 0:
+            return []
+        # The longest word has the narrowest term range and drives the scan
+        driver, others = words[0], words[1:]
+
+        found: Dict[int, Entry] = {}
+        with self._lock:
+            terms = self._terms
+            i = bisect_left(terms, driver)
+            while i < len(terms) and terms[i].startswith(driver) and len(found) < limit:
+                for password_id in self._postings[terms[i]]:
+                    if password_id in found:
+                        continue
+                    entry = self._entries[password_id]
+                    if others:
+                        entry_terms = self._entry_terms(entry)
+                        if not all(any(t.startswith(w) for t in entry_terms) for w in others):
+                            continue
+                    found[password_id] = entry
+                    if len(found) >= limit:
+                        break
+                i += 1
+
+        return sorted(found.items(), key=lambda item: (not item[1][4], item[1][0].lower()))
@@ -0,0 +1,155 @@
+"""
+PASSWORD MANAGER - Response Serializer
+Features: Fast JSON encoding, Row encoding without dicts, Response compression
+"""
+
+import gzip
+from json.encoder import encode_basestring_ascii
+from typing import Callable, Dict, Iterable, Optional, Sequence, Tuple
+
+from flask import Response
+from flask.json.provider import DefaultJSONProvider
+
+# Optional speedups: orjson for encoding, brotli for compression
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Responses smaller than this are not worth compressing
+COMPRESSION_THRESHOLD = 1024
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+
+
+def _encode_value(value) -> str:
+    """Encode a single SQLite value (str, int, float, bool or None)."""
+    if value is None:
+        return "null"
+    if value is True:
+        return "true"
+    if value is False:
+        return "false"
+    if value.__class__ is str:
+        return encode_basestring_ascii(value)
+    return repr(value)
+
+
+def encode_rows(
+    fields: Sequence[str],
+    rows: Iterable[Tuple],
+    converters: Optional[Dict[str, Callable]] = None
+) -> Tuple[bytes, int]:
+    """
+    Encode SQLite row tuples as a JSON array of objects.
+    Each row is formatted into a per-field template, no intermediate dict is built.
+    Returns the encoded array and the number of rows.
+    """
+    converters = converters or {}
+    template = "{" + ",".join(encode_basestring_ascii(name) + ":%s" for name in fields) + "}"
+    encoders = []
+    for name in fields:
+        convert = converters.get(name)
+        if convert is None:
+            encoders.append(_encode_value)
+        else:
+            encoders.append(lambda value, convert=convert: _encode_value(convert(value)))
+
+    if not converters:
+        objects = [template % tuple(map(_encode_value, row)) for row in rows]
+    else:
+        objects = [
+            template % tuple([encode(value) for encode, value in zip(encoders, row)])
+            for row in rows
+        ]
+    return ("[" + ",".join(objects) + "]").encode(), len(objects)
+
+
+def rows_response(
+    key: str,
+    fields: Sequence[str],
+    rows: Iterable[Tuple],
+    converters: Optional[Dict[str, Callable]] = None
+) -> Response:
+    """Build a {key: [...], "count": n} JSON response straight from rows."""
+    body, count = encode_rows(fields, rows, converters)
+    payload = b'{"' + key.encode() + b'":' + body + b',"count":' + str(count).encode() + b"}"
+    return Response(payload, mimetype="application/json")
+
+
+def batch_response(results: Sequence[Tuple[int, bytes]]) -> Response:
+    """
+    Build a {"responses": [{"status", "body"}], "count": n} JSON response
+    from (status, JSON body) pairs, splicing the bodies in without re-parsing.
+    """
+    items = b",".join(
+        b'{"status":' + str(status).encode() + b',"body":' + body + b"}"
+        for status, body in results
+    )
+    payload = b'{"responses":[' + items + b'],"count":' + str(len(results)).encode() + b"}"
+    return Response(payload, mimetype="application/json")
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that always emits compact JSON, using orjson if present."""
+
+    compact = True
+
+    def dumps(self, obj, **kwargs) -> str:
+        if orjson is not None and not kwargs.get("indent"):
+            try:
+                return orjson.dumps(obj, default=self.default).decode()
+            except TypeError:
+                pass
+        return super().dumps(obj, **kwargs)
+
+
+def _accepted_encodings(header: str) -> Dict[str, float]:
+    """Parse an Accept-Encoding header into {encoding: q}."""
+    accepted = {}
+    for item in header.split(","):
+        name, _, params = item.strip().partition(";")
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    return accepted
+
+
+def compress_response(response: Response, accept_encoding: str) -> Response:
+    """Compress a response with brotli or gzip if the client accepts it."""
+    if (
+        response.direct_passthrough
+        or response.is_streamed
+        or response.status_code < 200
+        or response.status_code in (204, 304)
+        or "Content-Encoding" in response.headers
+        # Binary bodies (archives, the host filter bits) do not compress
+        or response.mimetype == "application/octet-stream"
+    ):
+        return response
+
+    response.vary.add("Accept-Encoding")
+    data = response.get_data()
+    if len(data) < COMPRESSION_THRESHOLD:
+        return response
+
+    accepted = _accepted_encodings(accept_encoding or "")
+    if brotli is not None and accepted.get("br", 0) > 0:
+        response.set_data(brotli.compress(data, quality=BROTLI_QUALITY))
+        response.headers["Content-Encoding"] = "br"
+    elif accepted.get("gzip", 0) > 0:
+        response.set_data(gzip.compress(data, compresslevel=GZIP_LEVEL))
+        response.headers["Content-Encoding"] = "gzip"
+    return response
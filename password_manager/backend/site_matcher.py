@@ -0,0 +1,289 @@
+"""
+PASSWORD MANAGER - Site Matcher
+Features: Host normalization, Registrable domain (eTLD+1) from a bundled
+public suffix list, Site keys, Typo-tolerant fuzzy site index
+"""
+
+import ipaddress
+import os
+import threading
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+from search_index import tokenize
+
+SUFFIX_LIST_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "public_suffix_list.dat")
+
+# Score of a candidate whose site key is identical, or whose name is the
+# same under another suffix ("github" / "github.com" / "github.io")
+EXACT_SCORE = 1.0
+LABEL_SCORE = 0.95
+# Trigrams one typo can change: 3 for an insertion, deletion or
+# substitution, 4 for a swap of two adjacent letters
+GRAMS_PER_TYPO = 4
+
+
+class SuffixRules(NamedTuple):
+    rules: FrozenSet[str]
+    wildcards: FrozenSet[str]
+    exceptions: FrozenSet[str]
+
+
+@lru_cache(maxsize=None)
+def load_suffixes(path: str = SUFFIX_LIST_FILE) -> SuffixRules:
+    """Parse a public suffix list file once into frozensets of rules."""
+    rules, wildcards, exceptions = set(), set(), set()
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                rule = line.split(None, 1)[0].lower() if line.strip() else ""
+                if not rule or rule.startswith("//"):
+                    continue
+                if rule.startswith("!"):
+                    exceptions.add(rule[1:])
+                elif rule.startswith("*."):
+                    wildcards.add(rule[2:])
+                else:
+                    rules.add(rule)
+    except OSError:
+        # Without the list every host uses the default "*" rule
+        pass
+    return SuffixRules(frozenset(rules), frozenset(wildcards), frozenset(exceptions))
+
+
+def normalize_host(value: Optional[str]) -> str:
+    """
+    Get the lowercase host of a URL or bare domain, without scheme, port,
+    credentials, trailing dot or leading "www." ("https://WWW.GitHub.com:443/x"
+    -> "github.com"). Returns "" when the value is not a host (e.g. "My Bank").
+    """
+    if not value:
+        return ""
+    value = value.strip()
+    if "//" not in value:
+        value = "//" + value
+    try:
+        host = urlsplit(value).hostname or ""
+    except ValueError:
+        return ""
+    host = host.rstrip(".")
+    if not host or " " in host:
+        return ""
+    while host.startswith("www.") and host.count(".") > 1:
+        host = host[4:]
+    return host
+
+
+def _is_ip(host: str) -> bool:
+    # Cheap test first: parsing raises for every domain name
+    if ":" not in host and not host.rpartition(".")[2].isdigit():
+        return False
+    try:
+        ipaddress.ip_address(host)
+        return True
+    except ValueError:
+        return False
+
+
+def registrable_domain(host: str) -> str:
+    """
+    Get the registrable domain (eTLD+1) of a normalized host
+    ("mail.google.co.uk" -> "google.co.uk"). IP addresses, single-label
+    hosts and hosts that are themselves a public suffix are returned as-is.
+    """
+    if "." not in host or _is_ip(host):
+        return host
+    rules = load_suffixes()
+    labels = host.split(".")
+    suffix_length = 1
+    # Longest matching rule wins, exceptions before rules
+    for i in range(len(labels)):
+        candidate = ".".join(labels[i:])
+        if candidate in rules.exceptions:
+            suffix_length = len(labels) - i - 1
+            break
+        if candidate in rules.rules or ".".join(labels[i + 1:]) in rules.wildcards:
+            suffix_length = len(labels) - i
+            break
+    if suffix_length >= len(labels):
+        return host
+    return ".".join(labels[-suffix_length - 1:])
+
+
+def site_key(website: Optional[str], url: Optional[str] = None) -> str:
+    """
+    Get the key that identifies the site of an entry: the registrable
+    domain of its URL (or of its website when that is a domain), else its
+    website name folded to lowercase letters and digits ("GitHub" -> "github").
+    """
+    host = normalize_host(url)
+    if not host and website and ("." in website or ":" in website):
+        host = normalize_host(website)
+    if host:
+        return registrable_domain(host)
+    return "".join(tokenize(website or ""))
+
+
+def site_label(key: str) -> str:
+    """Get the name part of a site key ("github.co.uk" -> "github")."""
+    if "." not in key or _is_ip(key):
+        return key
+    return key.split(".", 1)[0]
+
+
+def _trigrams(label: str) -> Set[str]:
+    padded = f"  {label} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _max_typos(label: str) -> int:
+    """Typos tolerated for a name of this length (none for very short names)."""
+    if len(label) <= 3:
+        return 0
+    return 1 if len(label) <= 6 else 2
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """
+    Optimal string alignment distance (a swap of two adjacent letters is one
+    typo), or limit + 1 as soon as it is certain to exceed limit. Only the
+    diagonal band of width 2 * limit + 1 is computed.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    if a == b:
+        return 0
+    over = limit + 1
+    previous2: List[int] = []
+    previous = [j if j <= limit else over for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        low, high = max(1, i - limit), min(len(b), i + limit)
+        current = [over] * (len(b) + 1)
+        if i <= limit:
+            current[0] = i
+        best = current[0]
+        char = a[i - 1]
+        for j in range(low, high + 1):
+            value = previous[j - 1] if char == b[j - 1] else previous[j - 1] + 1
+            if previous[j] + 1 < value:
+                value = previous[j] + 1
+            if current[j - 1] + 1 < value:
+                value = current[j - 1] + 1
+            if (i > 1 and j > 1 and char == b[j - 2] and a[i - 2] == b[j - 1]
+                    and previous2[j - 2] + 1 < value):
+                value = previous2[j - 2] + 1
+            current[j] = value if value < over else over
+            if value < best:
+                best = value
+        if best > limit:
+            return over
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+class SiteIndex:
+    """
+    Fuzzy index over the distinct site keys of a vault.
+
+    Keys are grouped by name (site_label), and names are indexed by their
+    letter trigrams. A lookup only compares the query against names sharing
+    enough trigrams to be within the typo budget, so the cost grows with the
+    number of similar names, not with the vault. The index only grows: keys
+    whose entries were changed or deleted stay until the next rebuild, and
+    callers drop candidates that no longer match any entry.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._labels: Dict[str, Set[str]] = {}
+        self._grams: Dict[str, Set[str]] = {}
+        self.built = False
+
+    def __len__(self) -> int:
+        return len(self._labels)
+
+    def build(self, keys: Iterable[str]) -> None:
+        """Replace the index contents with the given site keys."""
+        labels: Dict[str, Set[str]] = {}
+        grams: Dict[str, Set[str]] = {}
+        for key in keys:
+            if not key:
+                continue
+            label = site_label(key)
+            if label not in labels:
+                labels[label] = set()
+                for gram in _trigrams(label):
+                    grams.setdefault(gram, set()).add(label)
+            labels[label].add(key)
+        with self._lock:
+            self._labels = labels
+            self._grams = grams
+            self.built = True
+
+    def invalidate(self) -> None:
+        """Drop the contents; the owner rebuilds the index on next use."""
+        with self._lock:
+            self._labels = {}
+            self._grams = {}
+            self.built = False
+
+    def add(self, key: str) -> None:
+        """Index one site key (no-op when it is already indexed)."""
+        if not key:
+            return
+        label = site_label(key)
+        with self._lock:
+            keys = self._labels.get(label)
+            if keys is None:
+                self._labels[label] = {key}
+                for gram in _trigrams(label):
+                    self._grams.setdefault(gram, set()).add(label)
+            else:
+                keys.add(key)
+
+    def match(self, key: str, limit: int = 10) -> List[Tuple[str, float]]:
+        """
+        Get up to `limit` indexed site keys similar to `key` as
+        (key, score), best first: the same key, then the same name under
+        another suffix, then names within a few typos.
+        """
+        if not key or limit <= 0:
+            return []
+        label = site_label(key)
+        typos = _max_typos(label)
+
+        scored: List[Tuple[float, str]] = []
+        with self._lock:
+            for other in self._labels.get(label, ()):
+                scored.append((EXACT_SCORE if other == key else LABEL_SCORE, other))
+            if typos:
+                # Each typo changes at most GRAMS_PER_TYPO trigrams (q-gram
+                # lemma), so a name within the budget shares at least one of
+                # the GRAMS_PER_TYPO * typos + 1 rarest query trigrams: only
+                # those are scanned
+                changed = GRAMS_PER_TYPO * typos
+                postings = sorted((self._grams.get(g, set()) for g in _trigrams(label)), key=len)
+                needed = len(postings) - changed
+                candidates: Set[str] = set()
+                for names in postings[:changed + 1]:
+                    candidates.update(names)
+                candidates.discard(label)
+                letters = set(label)
+                for other in candidates:
+                    # Cheap lower bounds before the edit distance: shared
+                    # trigrams, and letters present in only one of the names
+                    if sum(other in names for names in postings) < needed:
+                        continue
+                    if (len(letters.difference(other)) > typos
+                            or len(set(other).difference(letters)) > typos):
+                        continue
+                    distance = edit_distance(label, other, typos)
+                    if distance > typos:
+                        continue
+                    score = round(LABEL_SCORE * (1 - distance / max(len(label), len(other))), 3)
+                    scored.extend((score, k) for k in self._labels[other])
+
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return [(k, score) for score, k in scored[:limit]]
@@ -0,0 +1,279 @@
+"""
+PASSWORD MANAGER - Multi-Tenant Vault Registry
+Features: Per-tenant vault files and keys, Bounded LRU of open vaults,
+Idle tenant eviction
+"""
+
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from database_manager import DatabaseManager
+from auth_manager import AuthManager
+from backup import BackupManager
+
+DEFAULT_TENANT = "default"
+TENANT_NAME = re.compile(r"^[a-z0-9][a-z0-9_-]{0,62}$")
+
+
+class TenantNotFound(Exception):
+    """Raised for tenant names that are invalid or have no vault."""
+
+
+class Tenant:
+    """One open vault: its database, auth and backup managers and usage bookkeeping."""
+
+    def __init__(self, name: str, db: DatabaseManager, auth: AuthManager,
+                 backups: BackupManager):
+        self.name = name
+        self.db = db
+        self.auth = auth
+        self.backups = backups
+        self.in_use = 0
+        self.last_used = time.monotonic()
+
+
+class TenantRegistry:
+    """
+    Opens tenant vaults on demand and keeps at most `max_open` of them in an
+    LRU. Vaults idle for `idle_timeout` seconds, or pushed out of the LRU,
+    are closed (never while a request is using them) and reopened on the
+    next request. Open files and memory scale with active tenants only.
+
+    The "default" tenant uses the legacy files in `default_dir` (the
+    working directory unless configured); every other tenant lives in
+    `<base_dir>/<name>/`.
+
+    Vaults are opened and closed outside the registry lock, so a slow
+    open (migrations, index builds) only holds up requests for that tenant.
+
+    Nothing is opened until the first acquire(). A registry inherited
+    through fork() drops the parent's vaults and reopens them in the child,
+    so SQLite connections are never shared between processes.
+    """
+
+    def __init__(
+        self,
+        base_dir: str = "vaults",
+        max_open: int = 32,
+        idle_timeout: float = 600,
+        auto_create: bool = False,
+        default_dir: str = ".",
+        on_open: Optional[Callable[[Tenant], None]] = None
+    ):
+        self.base_dir = base_dir
+        self.default_dir = default_dir
+        self.max_open = max_open
+        self.idle_timeout = idle_timeout
+        self.auto_create = auto_create
+        # Called with each tenant right after its vault is opened
+        self.on_open = on_open
+        self._open: "OrderedDict[str, Tenant]" = OrderedDict()
+        # Tenants being opened or closed, set once that is done
+        self._pending: Dict[str, threading.Event] = {}
+        # Sessions of closed tenants, so eviction does not log users out
+        self._parked_sessions: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def tenant_dir(self, name: str) -> str:
+        """Get the directory holding a tenant's vault and key files."""
+        if name == DEFAULT_TENANT:
+            return self.default_dir
+        return os.path.join(self.base_dir, name)
+
+    def exists(self, name: str) -> bool:
+        """Check whether a tenant name is valid and has a vault directory."""
+        if not TENANT_NAME.match(name or ""):
+            return False
+        return name == DEFAULT_TENANT or os.path.isdir(self.tenant_dir(name))
+
+    def create(self, name: str) -> str:
+        """Provision a new tenant directory (vault and keys are created on first open)."""
+        if not TENANT_NAME.match(name or ""):
+            raise TenantNotFound(f"Invalid tenant name: {name!r}")
+        path = self.tenant_dir(name)
+        os.makedirs(path, mode=0o700, exist_ok=True)
+        return path
+
+    def acquire(self, name: str) -> Tenant:
+        """Get an open tenant, opening it if needed. Pair with release()."""
+        if not self.exists(name):
+            if not (self.auto_create and TENANT_NAME.match(name or "")):
+                raise TenantNotFound(f"Unknown tenant: {name!r}")
+            self.create(name)
+
+        if self._pid != os.getpid():
+            self._forget_parent()
+        while True:
+            with self._lock:
+                tenant = self._open.get(name)
+                if tenant is not None:
+                    self._open.move_to_end(name)
+                    tenant.in_use += 1
+                    tenant.last_used = time.monotonic()
+                    victims = self._evict()
+                    break
+                pending = self._pending.get(name)
+                if pending is None:
+                    # This request opens the vault, others for the tenant wait
+                    pending = self._pending[name] = threading.Event()
+                    break
+            pending.wait()
+
+        if tenant is None:
+            try:
+                tenant = self._open_tenant(name)
+                if self.on_open is not None:
+                    self.on_open(tenant)
+            except BaseException:
+                with self._lock:
+                    self._pending.pop(name, None)
+                pending.set()
+                raise
+            with self._lock:
+                self._open[name] = tenant
+                tenant.in_use += 1
+                tenant.last_used = time.monotonic()
+                self._pending.pop(name, None)
+                victims = self._evict()
+            pending.set()
+        self._close_tenants(victims)
+        return tenant
+
+    def get_open(self, name: str) -> Optional[Tenant]:
+        """Get a tenant if its vault is open, without opening it or refreshing its idle time."""
+        with self._lock:
+            if self._pid != os.getpid():
+                return None
+            return self._open.get(name)
+
+    def _forget_parent(self) -> None:
+        """
+        Drop vaults opened by the parent process. Their connections are left
+        for the parent to close: closing them here could roll back its work.
+        """
+        self._lock = threading.Lock()
+        self._open = OrderedDict()
+        self._pending = {}
+        self._pid = os.getpid()
+
+    def release(self, tenant: Tenant) -> None:
+        """Mark a tenant acquired by acquire() as no longer used by this request."""
+        with self._lock:
+            tenant.in_use -= 1
+            tenant.last_used = time.monotonic()
+
+    def _open_tenant(self, name: str) -> Tenant:
+        path = self.tenant_dir(name)
+        db = DatabaseManager(
+            db_file=os.path.join(path, "passwords.db"),
+            key_file=os.path.join(path, "key.key")
+        )
+        auth = AuthManager(
+            master_file=os.path.join(path, "master.key"),
+            secret_file=os.path.join(path, "jwt_secret.key")
+        )
+        auth.active_sessions = self._parked_sessions.pop(name, {})
+        backups = BackupManager(db_file=db.db_file, backup_dir=os.path.join(path, "backups"))
+        return Tenant(name, db, auth, backups)
+
+    def _close_tenant(self, tenant: Tenant) -> None:
+        tenant.auth.cleanup_sessions(max_age_hours=tenant.auth.token_expiry.total_seconds() / 3600)
+        if tenant.auth.active_sessions:
+            self._parked_sessions[tenant.name] = tenant.auth.active_sessions
+        tenant.db.close()
+
+    def _close_tenants(self, tenants: List[Tenant]) -> None:
+        """Close tenants taken by _take() (without holding the lock)."""
+        for tenant in tenants:
+            try:
+                self._close_tenant(tenant)
+            finally:
+                with self._lock:
+                    closing = self._pending.pop(tenant.name, None)
+                if closing is not None:
+                    closing.set()
+
+    def _take(self, name: str) -> Tenant:
+        """
+        Remove an open tenant for closing; acquire() waits for the close to
+        finish before reopening it (caller holds the lock).
+        """
+        self._pending[name] = threading.Event()
+        return self._open.pop(name)
+
+    def _evict(self) -> List[Tenant]:
+        """
+        Take idle tenants and the LRU overflow out of the registry (caller
+        holds the lock). Close them with _close_tenants() once it is released.
+        """
+        now = time.monotonic()
+        victims = []
+        for name, tenant in list(self._open.items()):
+            over_capacity = len(self._open) > self.max_open
+            idle = now - tenant.last_used > self.idle_timeout
+            if tenant.in_use == 0 and (over_capacity or idle):
+                victims.append(self._take(name))
+        return victims
+
+    def for_each_open(self, func: Callable[[Tenant], Any]) -> Dict[str, Any]:
+        """
+        Call func(tenant) for every open tenant, without opening closed
+        vaults or refreshing their idle time (maintenance must not keep
+        vaults open). Returns {tenant name: result or {"error": ...}}.
+        """
+        with self._lock:
+            if self._pid != os.getpid():
+                return {}
+            tenants = list(self._open.values())
+            for tenant in tenants:
+                tenant.in_use += 1
+        results: Dict[str, Any] = {}
+        try:
+            for tenant in tenants:
+                try:
+                    results[tenant.name] = func(tenant)
+                except Exception as e:
+                    results[tenant.name] = {"error": str(e)}
+        finally:
+            with self._lock:
+                for tenant in tenants:
+                    tenant.in_use -= 1
+        return results
+
+    def close_idle(self) -> int:
+        """Close tenants idle for longer than idle_timeout. Returns how many were closed."""
+        with self._lock:
+            victims = self._evict()
+        self._close_tenants(victims)
+        return len(victims)
+
+    def close_all(self) -> None:
+        """Close every open tenant that is not in use."""
+        with self._lock:
+            victims = [self._take(name) for name, tenant in list(self._open.items())
+                       if tenant.in_use == 0]
+        self._close_tenants(victims)
+
+    def stats(self) -> Dict:
+        """Get the open tenant count and LRU order (oldest first)."""
+        with self._lock:
+            return {
+                "open": len(self._open),
+                "max_open": self.max_open,
+                "tenants": list(self._open)
+            }
+
+
+if __name__ == "__main__":
+    # python tenancy.py create <name> [vaults_dir]
+    if len(sys.argv) >= 3 and sys.argv[1] == "create":
+        registry = TenantRegistry(base_dir=sys.argv[3] if len(sys.argv) > 3 else "vaults")
+        print(f"✅ Tenant directory ready: {registry.create(sys.argv[2])}")
+    else:
+        print("Usage: python tenancy.py create <name> [vaults_dir]")
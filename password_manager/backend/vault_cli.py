@@ -0,0 +1,505 @@
+"""
+PASSWORD MANAGER - Offline Vault Tool
+Features: Strength, reuse and breach audits, Parallel import and export,
+Key rotation, Worker pool split by id range, Progress and throughput
+"""
+
+import argparse
+import hashlib
+import hmac
+import json
+import logging
+import multiprocessing
+import os
+import sqlite3
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from cryptography.fernet import Fernet, InvalidToken
+
+from database_manager import PASSWORD_FIELDS, WEAK_STRENGTH_SCORE, DatabaseManager
+from field_crypto import DECRYPTION_ERROR, FieldCipher
+from password_generator import PasswordGenerator, breach_check_result, load_breach_hashes
+from records import PASSWORD_SELECT, PasswordRecord, record_factory
+from serializer import encode_rows
+
+# Ids per task handed to a worker
+CHUNK_SIZE = 5000
+# Entries per transaction when writing results back
+WRITE_BATCH = 50000
+
+
+class VaultBusy(Exception):
+    """Another process (usually the server) holds the vault's write lock."""
+
+
+def ensure_not_locked(db_file: str) -> None:
+    """Refuse to start while another connection is writing to the vault."""
+    if not os.path.exists(db_file):
+        return
+    conn = sqlite3.connect(db_file, timeout=0)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.rollback()
+    except sqlite3.OperationalError as e:
+        raise VaultBusy(f"{db_file} is locked by another process ({e}); "
+                        "retry when the server is idle or stopped") from e
+    finally:
+        conn.close()
+
+
+# =====================================
+# Worker side
+# =====================================
+# Each worker opens its own read-only connection, Fernet and FieldCipher in
+# the pool initializer; tasks are (first_id, last_id) ranges.
+_worker: Dict = {}
+
+
+def _init_worker(db_file: str, key: bytes, options: Dict) -> None:
+    _worker["conn"] = sqlite3.connect(f"file:{db_file}?mode=ro", uri=True)
+    _worker["fernet"] = Fernet(key)
+    _worker["fields"] = FieldCipher(key)
+    _worker["key"] = key
+    _worker["options"] = options
+    _worker["generator"] = PasswordGenerator()
+    breach_file = options.get("breach_file")
+    if breach_file:
+        _worker["breached"] = load_breach_hashes(breach_file)
+
+
+def _decrypted(id_range: Tuple[int, int]) -> Iterator[Tuple[int, Optional[str]]]:
+    """Yield (id, plaintext) for a range; plaintext is None when it cannot be decrypted."""
+    fernet = _worker["fernet"]
+    rows = _worker["conn"].execute(
+        "SELECT id, password FROM passwords WHERE id BETWEEN ? AND ? ORDER BY id", id_range
+    ).fetchall()
+    for password_id, token in rows:
+        try:
+            yield password_id, fernet.decrypt(token.encode()).decode()
+        except (InvalidToken, AttributeError):
+            yield password_id, None
+
+
+def _strength_task(id_range: Tuple[int, int]) -> Tuple[int, List[Tuple[int, int]], int]:
+    check = _worker["generator"].check_strength
+    scores, errors = [], 0
+    for password_id, password in _decrypted(id_range):
+        if password is None:
+            errors += 1
+            continue
+        scores.append((check(password)["score"], password_id))
+    return len(scores) + errors, scores, errors
+
+
+def _reuse_task(id_range: Tuple[int, int]) -> Tuple[int, List[Tuple[str, int]], int]:
+    # Keyed digests: equal passwords collide, but nothing that leaves the
+    # worker can be checked against a dictionary without the vault key
+    key = _worker["key"]
+    digests, errors = [], 0
+    for password_id, password in _decrypted(id_range):
+        if password is None:
+            errors += 1
+            continue
+        digest = hmac.new(key, password.encode(), hashlib.sha256).hexdigest()
+        digests.append((digest, password_id))
+    return len(digests) + errors, digests, errors
+
+
+def _breach_task(id_range: Tuple[int, int]) -> Tuple[int, List[Tuple[str, int]], int]:
+    breached = _worker["breached"]
+    results, errors = [], 0
+    for password_id, password in _decrypted(id_range):
+        if password is None:
+            errors += 1
+            continue
+        results.append((breach_check_result(password, breached), password_id))
+    return len(results) + errors, results, errors
+
+
+def _export_task(id_range: Tuple[int, int]) -> Tuple[int, bytes, int]:
+    # Stored passwords are already Fernet tokens and are exported as-is,
+    # like /api/export; the metadata is decrypted by the row factory
+    cursor = _worker["conn"].cursor()
+    cursor.row_factory = record_factory(PasswordRecord, _worker["fields"].open)
+    rows = cursor.execute(
+        f"{PASSWORD_SELECT} WHERE p.id BETWEEN ? AND ? ORDER BY p.id", id_range
+    ).fetchall()
+    body, count = encode_rows(PASSWORD_FIELDS, rows, {"favorite": bool})
+    return count, body[1:-1], 0
+
+
+def _reencrypt_task(id_range: Tuple[int, int]) -> Tuple[int, List[Tuple], int]:
+    # Password token, sealed metadata and its blind indexes under the new
+    # key, then the word indexes and the id
+    new = Fernet(_worker["options"]["new_key"])
+    fields, new_fields = _worker["fields"], FieldCipher(_worker["options"]["new_key"])
+    sealed = dict(_worker["conn"].execute(
+        "SELECT id, meta FROM passwords WHERE id BETWEEN ? AND ?", id_range
+    ).fetchall())
+    entries, errors = [], 0
+    for password_id, password in _decrypted(id_range):
+        metadata = fields.open(sealed[password_id])
+        if password is None or metadata[0] == DECRYPTION_ERROR:
+            errors += 1
+            continue
+        website, url, username, notes = metadata
+        entries.append((new.encrypt(password.encode()).decode(),
+                        new_fields.seal(website, url, username, notes),
+                        new_fields.site_index(website, url),
+                        new_fields.username_index(username),
+                        sorted(new_fields.tokens(website, url, username, notes)),
+                        password_id))
+    return len(entries) + errors, entries, errors
+
+
+def _encrypt_task(entries: List[Dict]) -> Tuple[int, List[Dict], int]:
+    """Make every entry's password a token under the vault key (import)."""
+    fernet = _worker["fernet"]
+    out, errors = [], 0
+    for entry in entries:
+        password = entry.get("password")
+        if not isinstance(password, str):
+            errors += 1
+            continue
+        try:
+            fernet.decrypt(password.encode())
+        except InvalidToken:
+            entry = dict(entry, password=fernet.encrypt(password.encode()).decode())
+        out.append(entry)
+    return len(entries), out, errors
+
+
+# =====================================
+# Driver side
+# =====================================
+def id_ranges(db_file: str, chunk_size: int = CHUNK_SIZE) -> List[Tuple[int, int]]:
+    """Split the vault's id span into (first, last) ranges of chunk_size ids."""
+    conn = sqlite3.connect(f"file:{db_file}?mode=ro", uri=True)
+    try:
+        low, high = conn.execute("SELECT MIN(id), MAX(id) FROM passwords").fetchone()
+    finally:
+        conn.close()
+    if low is None:
+        return []
+    return [(start, min(start + chunk_size - 1, high))
+            for start in range(low, high + 1, chunk_size)]
+
+
+class Progress:
+    """Entries done, percentage and throughput on one stderr line."""
+
+    def __init__(self, label: str, total: int, quiet: bool = False):
+        self.label = label
+        self.total = total
+        self.quiet = quiet
+        self.done = 0
+        self.start = time.perf_counter()
+        self._last_print = 0.0
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start
+
+    def rate(self) -> float:
+        return self.done / self.elapsed if self.elapsed > 0 else 0.0
+
+    def advance(self, count: int) -> None:
+        self.done += count
+        now = time.perf_counter()
+        if not self.quiet and (now - self._last_print > 0.5 or self.done >= self.total):
+            self._last_print = now
+            percent = 100 * self.done / self.total if self.total else 100
+            sys.stderr.write(f"\r{self.label}: {self.done}/{self.total} ({percent:.0f}%) "
+                             f"{self.rate():,.0f} entries/s")
+            sys.stderr.flush()
+
+    def finish(self) -> Dict:
+        if not self.quiet:
+            sys.stderr.write("\n")
+        return {"processed": self.done, "seconds": round(self.elapsed, 2),
+                "entries_per_second": round(self.rate())}
+
+
+class VaultTool:
+    """
+    Runs maintenance jobs on a vault file directly, outside the server.
+
+    The vault is opened through DatabaseManager (schema migrations, key
+    file); the CPU-heavy part of every job (decryption, scoring, hashing,
+    encryption, JSON encoding) runs in a process pool, one id range per
+    task, each worker with its own read-only connection. Results are
+    written back by this process in large transactions. Jobs refuse to
+    start while another process holds the vault's write lock.
+    """
+
+    def __init__(self, db_file: str = "passwords.db", key_file: str = "key.key",
+                 workers: Optional[int] = None, chunk_size: int = CHUNK_SIZE,
+                 quiet: bool = False):
+        ensure_not_locked(db_file)
+        self.db = DatabaseManager(db_file=db_file, key_file=key_file)
+        self.db_file = db_file
+        self.key_file = key_file
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.quiet = quiet
+
+    def close(self) -> None:
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _count(self) -> int:
+        with self.db.lock:
+            return self.db.conn.execute("SELECT COUNT(*) FROM passwords").fetchone()[0]
+
+    def _write_marker(self) -> Tuple:
+        """Change log version, entry count and highest id: any write moves one of them."""
+        with self.db.lock:
+            count, max_id = self.db.conn.execute(
+                "SELECT COUNT(*), MAX(id) FROM passwords"
+            ).fetchone()
+            return self.db.get_sync_version(), count, max_id
+
+    def _run(self, label: str, task: Callable, tasks: Iterable, total: int,
+             options: Optional[Dict] = None, ordered: bool = False):
+        """Run tasks in the pool, yielding each result while reporting progress."""
+        progress = Progress(label, total, self.quiet)
+        self.last_stats = None
+        with multiprocessing.Pool(self.workers, _init_worker,
+                                  (self.db_file, self.db.key, options or {})) as pool:
+            results = (pool.imap if ordered else pool.imap_unordered)(task, tasks)
+            for count, payload, errors in results:
+                progress.advance(count)
+                yield count, payload, errors
+        self.last_stats = dict(progress.finish(), workers=self.workers)
+
+    def _write(self, sql: str, rows: List[Tuple], log_changes: bool = False) -> None:
+        """Apply `sql` to rows in WRITE_BATCH transactions."""
+        db = self.db
+        with db.lock:
+            for start in range(0, len(rows), WRITE_BATCH):
+                batch = rows[start:start + WRITE_BATCH]
+                db.cursor.execute("BEGIN IMMEDIATE")
+                try:
+                    db.cursor.executemany(sql, batch)
+                    if log_changes:
+                        db.cursor.executemany(
+                            "INSERT INTO changes (password_id, operation) VALUES (?, 'update')",
+                            [(row[-1],) for row in batch]
+                        )
+                    db.conn.commit()
+                except Exception:
+                    db.conn.rollback()
+                    raise
+
+    def audit_strength(self) -> Dict:
+        """Score every password and store it in strength_score."""
+        scores, errors = [], 0
+        for _, payload, failed in self._run("strength", _strength_task,
+                                         id_ranges(self.db_file, self.chunk_size), self._count()):
+            scores.extend(payload)
+            errors += failed
+        self._write("UPDATE passwords SET strength_score = ? WHERE id = ?", scores)
+
+        buckets = {"weak": 0, "medium": 0, "strong": 0}
+        for score, _ in scores:
+            bucket = "weak" if score < WEAK_STRENGTH_SCORE else "medium" if score < 60 else "strong"
+            buckets[bucket] += 1
+        return {"scored": len(scores), "errors": errors, "distribution": buckets,
+                **self.last_stats}
+
+    def audit_reuse(self) -> Dict:
+        """Find passwords shared by several entries (nothing is written)."""
+        groups: Dict[str, List[int]] = defaultdict(list)
+        errors = 0
+        for _, payload, failed in self._run("reuse", _reuse_task,
+                                         id_ranges(self.db_file, self.chunk_size), self._count()):
+            for digest, password_id in payload:
+                groups[digest].append(password_id)
+            errors += failed
+
+        reused = sorted((sorted(ids) for ids in groups.values() if len(ids) > 1),
+                        key=len, reverse=True)
+        reused_ids = [i for ids in reused for i in ids]
+        websites = {}
+        with self.db.lock:
+            for start in range(0, len(reused_ids), 500):
+                chunk = reused_ids[start:start + 500]
+                websites.update(
+                    (password_id, self.db.fields.open(meta)[0])
+                    for password_id, meta in self.db.conn.execute(
+                        f"SELECT id, meta FROM passwords "
+                        f"WHERE id IN ({', '.join('?' * len(chunk))})", chunk
+                    )
+                )
+        return {
+            "groups": len(reused),
+            "entries": len(reused_ids),
+            "errors": errors,
+            "reused": [[{"id": i, "website": websites.get(i)} for i in ids] for ids in reused],
+            **self.last_stats
+        }
+
+    def audit_breach(self, breach_file: str) -> Dict:
+        """Check every password against a local breach list and store the result."""
+        results, errors = [], 0
+        for _, payload, failed in self._run("breach", _breach_task,
+                                         id_ranges(self.db_file, self.chunk_size), self._count(),
+                                         options={"breach_file": breach_file}):
+            results.extend(payload)
+            errors += failed
+        self._write("UPDATE passwords SET breach_check_result = ? WHERE id = ?", results)
+        breached = sum(1 for result, _ in results if '"breached": true' in result)
+        return {"checked": len(results), "breached": breached, "errors": errors,
+                **self.last_stats}
+
+    def export(self, target: str) -> Dict:
+        """Write the vault as /api/export JSON (passwords stay encrypted)."""
+        count = 0
+        with open(target, "wb") as f:
+            f.write(b'{"passwords":[')
+            first = True
+            for rows, body, _ in self._run("export", _export_task,
+                                           id_ranges(self.db_file, self.chunk_size),
+                                           self._count(), ordered=True):
+                if not rows:
+                    continue
+                if not first:
+                    f.write(b",")
+                f.write(body)
+                first = False
+                count += rows
+            f.write(b'],"count":' + str(count).encode() + b"}")
+        return {"exported": count, "file": target, "bytes": os.path.getsize(target),
+                **self.last_stats}
+
+    def import_file(self, source: str) -> Dict:
+        """Import /api/export JSON (tokens or plaintext) in one transaction."""
+        with open(source, "rb") as f:
+            data = json.load(f)
+        entries = data.get("passwords", []) if isinstance(data, dict) else data
+        chunks = [entries[i:i + self.chunk_size] for i in range(0, len(entries), self.chunk_size)]
+
+        def prepared() -> Iterator[Dict]:
+            for _, payload, _ in self._run("import", _encrypt_task, chunks, len(entries)):
+                yield from payload
+
+        result = self.db.import_passwords(prepared(), verified=True)
+        return dict(result, **self.last_stats)
+
+    def reencrypt(self) -> Dict:
+        """
+        Re-encrypt every password and entry metadata under a new key,
+        recompute the blind indexes, and replace the key file. The old key
+        is kept in <key_file>.<timestamp>.old: backups and archives taken
+        before the rotation still need it. Stop the server first, it would
+        keep encrypting with the key it loaded. If the vault was written
+        while the workers read it, nothing is changed.
+        """
+        new_key = Fernet.generate_key()
+        marker = self._write_marker()
+        entries, errors = [], 0
+        for _, payload, failed in self._run("reencrypt", _reencrypt_task,
+                                         id_ranges(self.db_file, self.chunk_size), self._count(),
+                                         options={"new_key": new_key}):
+            entries.extend(payload)
+            errors += failed
+        if errors:
+            return {"error": f"{errors} entries could not be decrypted, nothing was changed"}
+
+        # Write the new key first: if the process dies after the commit,
+        # <key_file>.new still holds the key the vault now needs
+        pending = self.key_file + ".new"
+        with open(pending, "wb") as f:
+            f.write(new_key)
+            f.flush()
+            os.fsync(f.fileno())
+        db = self.db
+        with db.lock:
+            db.cursor.execute("BEGIN IMMEDIATE")
+            if self._write_marker() != marker:
+                db.conn.rollback()
+                os.remove(pending)
+                return {"error": "The vault was written during re-encryption, nothing was changed"}
+            try:
+                db.cursor.executemany(
+                    """UPDATE passwords SET password = ?, meta = ?, site_index = ?,
+                       username_index = ? WHERE id = ?""",
+                    [entry[:4] + entry[5:] for entry in entries]
+                )
+                # Every word index changes with the key
+                db.cursor.execute("DELETE FROM entry_tokens")
+                db.cursor.executemany(
+                    "INSERT INTO entry_tokens (token, password_id) VALUES (?, ?)",
+                    [(token, entry[5]) for entry in entries for token in entry[4]]
+                )
+                db.cursor.executemany(
+                    "INSERT INTO changes (password_id, operation) VALUES (?, 'update')",
+                    [(entry[5],) for entry in entries]
+                )
+                db.conn.commit()
+            except Exception:
+                db.conn.rollback()
+                os.remove(pending)
+                raise
+            old = f"{self.key_file}.{datetime.now().strftime('%Y%m%d%H%M%S')}.old"
+            os.replace(self.key_file, old)
+            os.replace(pending, self.key_file)
+            db.set_key(new_key)
+        return {"reencrypted": len(entries), "old_key": old, **self.last_stats}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Audit, import, export and re-key a vault offline")
+    parser.add_argument("command",
+                        choices=["audit-strength", "audit-reuse", "audit-breach",
+                                 "export", "import", "reencrypt"])
+    parser.add_argument("file", nargs="?",
+                        help="export: target JSON; import: source JSON; "
+                             "audit-breach: SHA1[:count] breach list")
+    parser.add_argument("--db", default="passwords.db", help="vault database file")
+    parser.add_argument("--key", default="key.key", help="vault key file")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (all cores)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="ids per task")
+    parser.add_argument("--quiet", action="store_true", help="no progress line")
+    args = parser.parse_args(argv)
+    # Batched maintenance statements are slow by design, don't log each one
+    logging.getLogger("password_manager.slow_query").setLevel(logging.ERROR)
+
+    if args.command in ("export", "import", "audit-breach") and not args.file:
+        parser.error(f"{args.command} needs a file")
+
+    try:
+        tool = VaultTool(args.db, args.key, args.workers, args.chunk_size, args.quiet)
+    except VaultBusy as e:
+        print(json.dumps({"error": str(e)}), file=sys.stderr)
+        return 2
+
+    with tool:
+        if args.command == "audit-strength":
+            result = tool.audit_strength()
+        elif args.command == "audit-reuse":
+            result = tool.audit_reuse()
+        elif args.command == "audit-breach":
+            result = tool.audit_breach(args.file)
+        elif args.command == "export":
+            result = tool.export(args.file)
+        elif args.command == "import":
+            result = tool.import_file(args.file)
+        else:
+            result = tool.reencrypt()
+
+    print(json.dumps(result, indent=2))
+    return 1 if "error" in result else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,14 @@
+"""
+PASSWORD MANAGER - Benchmarks
+Synthetic vault generation and timing of the backend hot paths.
+Run from the password_manager folder: python -m benchmarks.run --help
+"""
+
+import os
+import sys
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend")
+
+# The backend modules import each other by name, like when running app.py
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
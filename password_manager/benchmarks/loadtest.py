@@ -0,0 +1,334 @@
+"""
+PASSWORD MANAGER - Load Test Harness
+Replays the browser extension's traffic mix against local servers and
+reports per-endpoint latency percentiles, throughput and error rate.
+
+Traffic mix (per virtual user, picked by weight):
+    popup_open  - health, auth status, auth verify, site search, full list
+    page_visit  - hostname search (background/content script on each page)
+    form_submit - autosave check followed by autosave detect
+
+Usage:
+    # Start a throwaway server, seed 10k entries, 16 users for 30 seconds
+    python -m benchmarks.loadtest --start baseline --seed-entries 10000 -c 16 -d 30
+
+    # Compare two server configurations side by side
+    python -m benchmarks.loadtest --start off:PM_PROFILE_MODE=off \\
+        --start always:PM_PROFILE_MODE=always -c 8 -d 20
+
+    # Target an already running server (use a throwaway vault: autosaves write to it)
+    python -m benchmarks.loadtest --url local=http://127.0.0.1:5000 --password "..."
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote, urlsplit
+
+from . import BACKEND_DIR
+from .vault_generator import generate_entries
+
+DEFAULT_PASSWORD = "loadtest-master-password"
+
+SCENARIO_WEIGHTS = {"popup_open": 1, "page_visit": 10, "form_submit": 1}
+
+
+class Target:
+    """A server under test: either started by the harness or given by URL."""
+
+    def __init__(self, name: str, url: Optional[str] = None, env: Optional[Dict[str, str]] = None):
+        self.name = name
+        self.url = url
+        self.env = env or {}
+        self.process: Optional[subprocess.Popen] = None
+        self.work_dir: Optional[str] = None
+
+    def start(self) -> None:
+        """Start a fresh server in a temporary directory on a free port."""
+        self.work_dir = tempfile.mkdtemp(prefix=f"pm-load-{self.name}-")
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+        env = dict(os.environ, PYTHONPATH=BACKEND_DIR, **self.env)
+        code = (
+            "from app import create_app; "
+            f"create_app().run(host='127.0.0.1', port={port}, debug=False, threaded=True)"
+        )
+        self.process = subprocess.Popen(
+            [sys.executable, "-c", code], cwd=self.work_dir, env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        self.url = f"http://127.0.0.1:{port}"
+        deadline = time.time() + 30
+        while time.time() < deadline:
+            try:
+                status, _ = request(self.connection(), "GET", "/api/health")
+                if status == 200:
+                    return
+            except OSError:
+                time.sleep(0.1)
+        raise RuntimeError(f"server {self.name} did not start")
+
+    def stop(self) -> None:
+        if self.process:
+            self.process.terminate()
+            self.process.wait(timeout=10)
+        if self.work_dir:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def connection(self) -> http.client.HTTPConnection:
+        parts = urlsplit(self.url)
+        return http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+
+
+def request(conn: http.client.HTTPConnection, method: str, path: str,
+            body: Optional[Dict] = None, token: Optional[str] = None) -> Tuple[int, bytes]:
+    """Send one JSON request on a keep-alive connection."""
+    headers = {"Content-Type": "application/json"}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    payload = json.dumps(body).encode() if body is not None else None
+    conn.request(method, path, body=payload, headers=headers)
+    response = conn.getresponse()
+    return response.status, response.read()
+
+
+def prepare(target: Target, password: str, seed_entries: int) -> Tuple[str, List[Dict]]:
+    """Log in (setting up the master password if needed) and seed the vault."""
+    conn = target.connection()
+    status, body = request(conn, "GET", "/api/auth/status")
+    if not json.loads(body).get("master_exists"):
+        request(conn, "POST", "/api/auth/setup", {"password": password})
+    status, body = request(conn, "POST", "/api/auth/login", {"password": password})
+    if status != 200:
+        raise RuntimeError(f"{target.name}: login failed ({status})")
+    token = json.loads(body)["token"]
+
+    entries = list(generate_entries(max(seed_entries, 100), seed=11))
+    if seed_entries:
+        for start in range(0, seed_entries, 5000):
+            request(conn, "POST", "/api/import",
+                    {"passwords": entries[start:start + 5000]}, token)
+    conn.close()
+    return token, entries
+
+
+class Recorder:
+    """Collects latencies and errors per endpoint across worker threads."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+
+    def record(self, endpoint: str, seconds: float, ok: bool) -> None:
+        with self.lock:
+            self.latencies.setdefault(endpoint, []).append(seconds)
+            if not ok:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def summary(self, elapsed: float) -> Dict[str, Dict]:
+        result = {}
+        for endpoint, values in sorted(self.latencies.items()):
+            values = sorted(values)
+            count = len(values)
+            result[endpoint] = {
+                "requests": count,
+                "throughput_rps": round(count / elapsed, 2),
+                "error_rate": round(self.errors.get(endpoint, 0) / count, 4),
+                "p50_ms": round(percentile(values, 50) * 1000, 3),
+                "p95_ms": round(percentile(values, 95) * 1000, 3),
+                "p99_ms": round(percentile(values, 99) * 1000, 3)
+            }
+        return result
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+
+def virtual_user(target: Target, token: str, entries: List[Dict], recorder: Recorder,
+                 deadline: float, seed: int) -> None:
+    """Replay the extension traffic mix until the deadline."""
+    rng = random.Random(seed)
+    conn = target.connection()
+    scenarios = list(SCENARIO_WEIGHTS)
+    weights = list(SCENARIO_WEIGHTS.values())
+
+    def call(endpoint: str, method: str, path: str, body: Optional[Dict] = None,
+             auth: bool = True) -> None:
+        nonlocal conn
+        start = time.perf_counter()
+        try:
+            status, _ = request(conn, method, path, body, token if auth else None)
+            ok = status < 400
+        except (OSError, http.client.HTTPException):
+            ok = False
+            conn.close()
+            conn = target.connection()
+        recorder.record(endpoint, time.perf_counter() - start, ok)
+
+    while time.time() < deadline:
+        scenario = rng.choices(scenarios, weights)[0]
+        entry = rng.choice(entries)
+        host = entry["website"]
+
+        if scenario == "popup_open":
+            call("GET /api/health", "GET", "/api/health", auth=False)
+            call("GET /api/auth/status", "GET", "/api/auth/status", auth=False)
+            call("GET /api/auth/verify", "GET", "/api/auth/verify")
+            call("GET /api/passwords?search", "GET", f"/api/passwords?search={quote(host)}")
+            call("GET /api/passwords", "GET", "/api/passwords")
+        elif scenario == "page_visit":
+            call("GET /api/passwords?search", "GET", f"/api/passwords?search={quote(host)}")
+        else:
+            # Mostly new credentials, sometimes an already saved one
+            if rng.random() < 0.7:
+                username = f"new{rng.randrange(10**9)}@example.com"
+            else:
+                username = entry["username"]
+            form = {"website": host, "url": entry["url"],
+                    "username": username, "password": entry["password"]}
+            call("POST /api/passwords/autosave/check", "POST",
+                 "/api/passwords/autosave/check", {"website": host, "username": username})
+            call("POST /api/passwords/autosave/detect", "POST",
+                 "/api/passwords/autosave/detect", form)
+    conn.close()
+
+
+def run_load(target: Target, token: str, entries: List[Dict], concurrency: int,
+             duration: float, seed: int) -> Dict:
+    """Run `concurrency` virtual users for `duration` seconds."""
+    recorder = Recorder()
+    deadline = time.time() + duration
+    threads = [
+        threading.Thread(
+            target=virtual_user,
+            args=(target, token, entries, recorder, deadline, seed + i),
+            daemon=True
+        )
+        for i in range(concurrency)
+    ]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    endpoints = recorder.summary(elapsed)
+    total = sum(e["requests"] for e in endpoints.values())
+    errors = sum(recorder.errors.values())
+    return {
+        "elapsed_s": round(elapsed, 2),
+        "requests": total,
+        "throughput_rps": round(total / elapsed, 2),
+        "error_rate": round(errors / total, 4) if total else 0.0,
+        "endpoints": endpoints
+    }
+
+
+def print_report(results: Dict[str, Dict]) -> None:
+    """Print per-endpoint results, one column group per target."""
+    names = list(results)
+    endpoints = sorted({e for r in results.values() for e in r["endpoints"]})
+    header = f"{'endpoint':<38}" + "".join(
+        f" | {name[:10]:>10} p50 {'p95':>8} {'p99':>8} {'rps':>8} {'err%':>6}" for name in names
+    )
+    print(header)
+    print("-" * len(header))
+    for endpoint in endpoints:
+        line = f"{endpoint:<38}"
+        for name in names:
+            e = results[name]["endpoints"].get(endpoint)
+            if e is None:
+                line += f" | {'-':>14} {'':>8} {'':>8} {'':>8} {'':>6}"
+                continue
+            line += (f" | {e['p50_ms']:>14.2f} {e['p95_ms']:>8.2f} {e['p99_ms']:>8.2f}"
+                     f" {e['throughput_rps']:>8.1f} {e['error_rate'] * 100:>6.2f}")
+        print(line)
+    for name in names:
+        r = results[name]
+        print(f"{name}: {r['requests']} requests in {r['elapsed_s']}s, "
+              f"{r['throughput_rps']} req/s, error rate {r['error_rate'] * 100:.2f}%")
+
+
+def parse_start(value: str) -> Target:
+    """name[:KEY=VALUE,KEY=VALUE] -> Target started with those env vars."""
+    name, _, assignments = value.partition(":")
+    env = {}
+    for item in filter(None, assignments.split(",")):
+        key, _, val = item.partition("=")
+        env[key.strip()] = val.strip()
+    return Target(name, env=env)
+
+
+def parse_url(value: str) -> Target:
+    """name=http://host:port -> Target for a running server."""
+    name, _, url = value.partition("=")
+    if not url:
+        name, url = urlsplit(value).netloc, value
+    return Target(name, url=url)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Replay extension traffic against the API")
+    parser.add_argument("--start", action="append", default=[], type=parse_start,
+                        metavar="NAME[:ENV=VAL,...]", help="start a local server configuration")
+    parser.add_argument("--url", action="append", default=[], type=parse_url,
+                        metavar="NAME=URL", help="target an already running server")
+    parser.add_argument("--password", default=DEFAULT_PASSWORD, help="master password")
+    parser.add_argument("--seed-entries", type=int, default=1000,
+                        help="entries imported into each started vault before the run")
+    parser.add_argument("-c", "--concurrency", type=int, default=8, help="virtual users")
+    parser.add_argument("-d", "--duration", type=float, default=20, help="seconds per target")
+    parser.add_argument("--seed", type=int, default=1, help="traffic mix seed")
+    parser.add_argument("--output", help="write JSON results to this file")
+    args = parser.parse_args(argv)
+
+    targets = args.start + args.url
+    if not targets:
+        targets = [Target("local")]
+        args.start = targets
+
+    results = {}
+    try:
+        for target in targets:
+            if target in args.start:
+                print(f"🚀 starting {target.name} {target.env or ''}")
+                target.start()
+            seed_entries = args.seed_entries if target in args.start else 0
+            token, entries = prepare(target, args.password, seed_entries)
+            print(f"⏱  {target.name}: {args.concurrency} users for {args.duration}s")
+            results[target.name] = run_load(
+                target, token, entries, args.concurrency, args.duration, args.seed
+            )
+            results[target.name]["config"] = target.env
+    finally:
+        for target in args.start:
+            target.stop()
+
+    print_report(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"📄 Results written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,333 @@
+"""
+PASSWORD MANAGER - Benchmark Runner
+Times the backend hot paths on synthetic vaults and writes JSON results.
+
+Usage:
+    python -m benchmarks.run --sizes 1k,10k --output results.json
+    python -m benchmarks.run --sizes 10k --baseline results.json --threshold 1.25
+"""
+
+import argparse
+import json
+import os
+import platform
+import secrets
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict, List
+
+from . import BACKEND_DIR
+from .vault_generator import SIZES, create_vault, generate_entries
+
+from archive import ArchiveReader, export_archive
+from auth_manager import AuthManager
+from database_manager import DatabaseManager
+from password_generator import PasswordGenerator
+
+
+def measure(fn: Callable, repeat: int, ops: int = 1) -> Dict:
+    """Run fn `repeat` times and summarize the wall-clock timings."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return {
+        "runs": repeat,
+        "ops": ops,
+        "min_ms": round(min(timings), 4),
+        "median_ms": round(statistics.median(timings), 4),
+        "mean_ms": round(statistics.fmean(timings), 4),
+        "per_op_us": round(statistics.median(timings) * 1000 / ops, 3)
+    }
+
+
+def measure_memory(fn: Callable) -> Dict:
+    """
+    Run fn once under tracemalloc: peak traced memory, memory still held
+    by its result, and the number of allocated blocks the result keeps.
+    """
+    blocks = sys.getallocatedblocks()
+    tracemalloc.start()
+    try:
+        result = fn()
+        retained, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    retained_blocks = sys.getallocatedblocks() - blocks
+    del result
+    return {
+        "peak_kib": round(peak / 1024),
+        "retained_kib": round(retained / 1024),
+        "retained_blocks": retained_blocks
+    }
+
+
+def bench_vault(db: DatabaseManager, work_dir: str, size: int, repeat: int) -> Dict:
+    """Time DatabaseManager, generator and auth operations against one vault."""
+    results = {}
+    sample = next(generate_entries(1, seed=42))
+    site, user = sample["website"], sample["username"]
+
+    results["get_passwords"] = measure(lambda: db.get_passwords(), repeat)
+    results["get_passwords"].update(measure_memory(lambda: db.get_passwords()))
+    # Records decrypt lazily: this is the cost of a listing that reads every password
+    decrypted = lambda: [record.to_dict() for record in db.get_passwords()]
+    results["get_passwords_decrypted"] = measure(decrypted, repeat)
+    results["get_passwords_decrypted"].update(measure_memory(decrypted))
+    results["get_passwords_search"] = measure(lambda: db.get_passwords(search="github"), repeat)
+    results["find_similar_password"] = measure(
+        lambda: [db.find_similar_password(site, user) for _ in range(100)], repeat, ops=100
+    )
+    results["find_similar_password_miss"] = measure(
+        lambda: [db.find_similar_password("no-such-site.example") for _ in range(100)], repeat, ops=100
+    )
+    results["get_statistics"] = measure(db.get_statistics, repeat)
+    results["export_passwords"] = measure(db.export_passwords, repeat)
+
+    import_count = min(size, 10_000)
+    entries = list(generate_entries(import_count, seed=7))
+
+    def import_into_scratch():
+        scratch = tempfile.mkdtemp(dir=work_dir)
+        target = DatabaseManager(
+            db_file=os.path.join(scratch, "passwords.db"),
+            key_file=db.key_file
+        )
+        try:
+            target.import_passwords(entries)
+        finally:
+            target.close()
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    results["import_passwords"] = measure(import_into_scratch, repeat, ops=import_count)
+    results.update(bench_archive(db, work_dir, size, repeat))
+    return results
+
+
+def bench_archive(db: DatabaseManager, work_dir: str, size: int, repeat: int) -> Dict:
+    """Compare the JSON export/import path with the binary archive on the whole vault."""
+    results = {}
+    json_path = os.path.join(work_dir, "export.json")
+    archive_path = os.path.join(work_dir, "export.pmva")
+
+    def export_json():
+        with open(json_path, "w") as f:
+            json.dump({"passwords": db.export_passwords()}, f)
+
+    results["export_json"] = measure(export_json, repeat, ops=size)
+    results["export_json"]["bytes"] = os.path.getsize(json_path)
+    results["export_archive"] = measure(lambda: export_archive(db, archive_path), repeat, ops=size)
+    results["export_archive"]["bytes"] = os.path.getsize(archive_path)
+
+    def decode_json():
+        with open(json_path) as f:
+            return json.load(f)["passwords"]
+
+    def decode_archive(workers=1):
+        with ArchiveReader(archive_path) as reader:
+            return list(reader.entries(workers=workers))
+
+    results["decode_json"] = measure(decode_json, repeat, ops=size)
+    results["decode_archive"] = measure(decode_archive, repeat, ops=size)
+    results["decode_archive_4_threads"] = measure(lambda: decode_archive(4), repeat, ops=size)
+
+    with ArchiveReader(archive_path) as reader:
+        some_id = reader.index[len(reader.index) // 2]["first_id"]
+        some_category = reader.index[0]["category"]
+        results["archive_single_entry"] = measure(
+            lambda: [reader.get_entry(some_id) for _ in range(100)], repeat, ops=100
+        )
+        results["archive_single_category"] = measure(
+            lambda: list(reader.entries(categories=[some_category])), repeat
+        )
+
+    def restore(load):
+        scratch = tempfile.mkdtemp(dir=work_dir)
+        target = DatabaseManager(
+            db_file=os.path.join(scratch, "passwords.db"),
+            key_file=db.key_file
+        )
+        try:
+            load(target)
+        finally:
+            target.close()
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    def restore_archive(target):
+        with ArchiveReader(archive_path) as reader:
+            reader.restore_into(target)
+
+    results["restore_json"] = measure(
+        lambda: restore(lambda target: target.import_passwords(decode_json())), repeat, ops=size
+    )
+    results["restore_archive"] = measure(lambda: restore(restore_archive), repeat, ops=size)
+    return results
+
+
+def concurrent_autosaves(work_dir: str, queued: bool, threads: int = 8, per_thread: int = 25) -> None:
+    """Save `threads` x `per_thread` entries from parallel threads into a fresh vault."""
+    db_file = os.path.join(work_dir, "autosave.db")
+    for suffix in ("", "-journal"):
+        if os.path.exists(db_file + suffix):
+            os.remove(db_file + suffix)
+    db = DatabaseManager(db_file=db_file, key_file=os.path.join(work_dir, "autosave.key"))
+    if queued:
+        db.enable_write_queue(synchronous="FULL")
+
+    def save(worker):
+        for i in range(per_thread):
+            db.add_password(f"site{worker}-{i}.example", "user", "secret", auto_saved=True)
+
+    workers = [threading.Thread(target=save, args=(n,)) for n in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    db.close()
+
+
+def bench_standalone(work_dir: str, repeat: int) -> Dict:
+    """Time operations that do not depend on the vault size."""
+    results = {}
+    generator = PasswordGenerator()
+    passwords = [e["password"] for e in generate_entries(1000, seed=3)]
+
+    results["check_strength"] = measure(
+        lambda: [generator.check_strength(p) for p in passwords], repeat, ops=len(passwords)
+    )
+    results["generate"] = measure(
+        lambda: [generator.generate(length=16) for _ in range(1000)], repeat, ops=1000
+    )
+
+    auth = AuthManager(
+        master_file=os.path.join(work_dir, "master.key"),
+        secret_key=secrets.token_hex(32)
+    )
+    token = auth.generate_token()
+
+    def verify_cold():
+        for _ in range(1000):
+            auth.token_cache.clear()
+            auth.verify_token(token)
+
+    results["verify_token"] = measure(
+        lambda: [auth.verify_token(token) for _ in range(1000)], repeat, ops=1000
+    )
+    results["verify_token_uncached"] = measure(verify_cold, repeat, ops=1000)
+
+    # 8 threads x 25 autosaves: a commit each vs group commits (both synchronous=FULL)
+    results["autosave_concurrent"] = measure(
+        lambda: concurrent_autosaves(work_dir, queued=False), repeat, ops=200
+    )
+    results["autosave_concurrent_queued"] = measure(
+        lambda: concurrent_autosaves(work_dir, queued=True), repeat, ops=200
+    )
+    return results
+
+
+def compare(current: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """List benchmarks whose median grew by more than `threshold` times."""
+    regressions = []
+    for group, benches in current["results"].items():
+        for name, result in benches.items():
+            base = baseline.get("results", {}).get(group, {}).get(name)
+            if not base or not base.get("median_ms"):
+                continue
+            ratio = result["median_ms"] / base["median_ms"]
+            if ratio > threshold:
+                regressions.append(
+                    f"{group}/{name}: {base['median_ms']:.2f} ms -> "
+                    f"{result['median_ms']:.2f} ms ({ratio:.2f}x)"
+                )
+    return regressions
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the password manager backend")
+    parser.add_argument("--sizes", default="1k,10k",
+                        help=f"comma separated vault sizes ({', '.join(SIZES)})")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per benchmark")
+    parser.add_argument("--seed", type=int, default=42, help="vault generator seed")
+    parser.add_argument("--vault-dir", help="keep generated vaults here and reuse them")
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON results file")
+    parser.add_argument("--baseline", help="previous results file to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="fail if a median is this many times slower than the baseline")
+    args = parser.parse_args(argv)
+
+    sizes = [s.strip().lower() for s in args.sizes.split(",") if s.strip()]
+    unknown = [s for s in sizes if s not in SIZES]
+    if unknown:
+        parser.error(f"unknown sizes: {', '.join(unknown)}")
+
+    work_dir = tempfile.mkdtemp(prefix="pm-bench-")
+    vault_root = args.vault_dir or work_dir
+    report = {
+        "meta": {
+            "created_at": datetime.utcnow().isoformat() + "Z",
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "repeat": args.repeat
+        },
+        "results": {}
+    }
+
+    try:
+        print("⏱  standalone")
+        report["results"]["standalone"] = bench_standalone(work_dir, args.repeat)
+        for label in sizes:
+            size = SIZES[label]
+            print(f"⏱  vault {label} ({size} entries)")
+            start = time.perf_counter()
+            db = create_vault(os.path.join(vault_root, f"vault-{label}"), size, seed=args.seed)
+            print(f"   ready in {time.perf_counter() - start:.1f}s")
+            try:
+                report["results"][label] = bench_vault(db, work_dir, size, args.repeat)
+            finally:
+                db.close()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"📄 Results written to {args.output}")
+
+    for group, benches in report["results"].items():
+        for name, result in benches.items():
+            print(f"   {group:>10} {name:<28} {result['median_ms']:>12.2f} ms")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"❌ {len(regressions)} regression(s) over {args.threshold}x:")
+            for line in regressions:
+                print(f"   {line}")
+            return 1
+        print(f"✅ No regressions over {args.threshold}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
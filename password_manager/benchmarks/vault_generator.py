@@ -0,0 +1,101 @@
+"""
+PASSWORD MANAGER - Synthetic Vault Generator
+Deterministic vaults of realistic entries, written through DatabaseManager
+"""
+
+import os
+import random
+from typing import Dict, Iterator, List
+
+from database_manager import DatabaseManager
+
+SIZES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+
+BRANDS = [
+    "github", "gitlab", "google", "facebook", "twitter", "linkedin", "amazon",
+    "netflix", "spotify", "reddit", "paypal", "dropbox", "slack", "zoom",
+    "microsoft", "apple", "adobe", "atlassian", "stackoverflow", "medium",
+    "ebay", "aliexpress", "booking", "airbnb", "uber", "steam", "twitch",
+    "discord", "instagram", "pinterest", "wikipedia", "yahoo", "outlook",
+    "protonmail", "bankofamerica", "chase", "wellsfargo", "revolut", "wise",
+    "coursera", "udemy", "notion", "trello", "figma", "canva", "heroku",
+    "digitalocean", "cloudflare", "namecheap", "godaddy"
+]
+TLDS = ["com", "com", "com", "org", "net", "io", "co.uk", "de", "fr", "dz", "com.au"]
+SUBDOMAINS = ["", "", "", "www.", "app.", "login.", "accounts.", "my."]
+FIRST_NAMES = [
+    "amine", "sarah", "yacine", "lina", "omar", "nadia", "karim", "ines",
+    "john", "emma", "lucas", "mia", "noah", "olivia", "liam", "ava",
+    "mohamed", "fatima", "ali", "yasmine", "david", "sofia", "adam", "lea"
+]
+LAST_NAMES = [
+    "benali", "haddad", "smith", "martin", "garcia", "dupont", "muller",
+    "rossi", "nguyen", "kaci", "brahimi", "johnson", "lee", "bernard"
+]
+MAIL_DOMAINS = ["gmail.com", "outlook.com", "yahoo.fr", "proton.me", "usthb.dz"]
+CATEGORIES = ["General", "Social Media", "Email", "Banking", "Shopping",
+              "Work", "Entertainment", "Other"]
+NOTE_TEMPLATES = [
+    "", "", "Recovery codes in the safe",
+    "Security question: first pet",
+    "Shared with {first}",
+    "2FA enabled on phone",
+    "Old account, migrate to {brand} business",
+    "Auto-saved from {host}"
+]
+PASSWORD_CHARS = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789!@#$%^&*"
+
+
+def generate_entries(count: int, seed: int = 42) -> Iterator[Dict]:
+    """Yield `count` deterministic entries in the import_passwords format."""
+    rng = random.Random(seed)
+    for i in range(count):
+        brand = rng.choice(BRANDS)
+        # Long tail of distinct sites on top of the popular brands
+        if rng.random() < 0.6:
+            brand = f"{brand}{rng.randrange(count // 10 + 1)}"
+        host = f"{rng.choice(SUBDOMAINS)}{brand}.{rng.choice(TLDS)}"
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        style = rng.random()
+        if style < 0.5:
+            username = f"{first}.{last}@{rng.choice(MAIL_DOMAINS)}"
+        elif style < 0.8:
+            username = f"{first}{last[0]}{rng.randrange(100)}"
+        else:
+            username = f"{first}_{i}"
+        length = rng.choice((8, 10, 12, 16, 20))
+        yield {
+            "website": host,
+            "url": f"https://{host}/login",
+            "username": username,
+            "password": "".join(rng.choice(PASSWORD_CHARS) for _ in range(length)),
+            "category": rng.choice(CATEGORIES),
+            "notes": rng.choice(NOTE_TEMPLATES).format(first=first, brand=brand, host=host)
+        }
+
+
+def create_vault(directory: str, size: int, seed: int = 42, batch_size: int = 10_000) -> DatabaseManager:
+    """
+    Create (or reuse) a synthetic vault of `size` entries in `directory`.
+    Entries are written through DatabaseManager.import_passwords in batches.
+    """
+    os.makedirs(directory, exist_ok=True)
+    db = DatabaseManager(
+        db_file=os.path.join(directory, "passwords.db"),
+        key_file=os.path.join(directory, "key.key")
+    )
+    existing = db.get_statistics()["total"]
+    if existing == size:
+        return db
+    if existing:
+        raise ValueError(f"{directory} already holds {existing} entries, expected {size}")
+
+    batch: List[Dict] = []
+    for entry in generate_entries(size, seed):
+        batch.append(entry)
+        if len(batch) >= batch_size:
+            db.import_passwords(batch)
+            batch = []
+    if batch:
+        db.import_passwords(batch)
+    return db
@@ -46,6 +46,17 @@ chrome.runtime.onMessage.addListener((message, sender, sendResponse) => {
             
         case 'FILL_PASSWORD':
             fillPassword(message.data, sender.tab?.id);
+            recordPasswordUse(message.data.id);
+            sendResponse({ success: true });
+            break;
+            
+        case 'HOST_FILTER_STALE':
+            markHostFilterStale();
+            sendResponse({ success: true });
+            break;
+            
+        case 'PASSWORD_USED':
+            recordPasswordUse(message.id);
             sendResponse({ success: true });
             break;
             
@@ -131,6 +142,98 @@ async function checkAndSavePendingCredentials() {
     }
 }
 
+// =====================================
+// Host Filter
+// =====================================
+// Bloom filter of the sites that have entries (see backend/host_filter.py).
+// Pages whose host is not in it have no credentials, so the server is only
+// asked about probable hits. Refreshed with If-None-Match once it is older
+// than HOST_FILTER_MAX_AGE, and right after this extension saves an entry.
+const HOST_FILTER_MAX_AGE = 60 * 1000;
+const FNV_BASES = [0x811C9DC5, 0x050C5D1F];
+let hostFilter = null;
+
+async function loadHostFilter(authToken) {
+    if (hostFilter && hostFilter.authToken === authToken &&
+        Date.now() - hostFilter.fetchedAt < HOST_FILTER_MAX_AGE) {
+        return hostFilter;
+    }
+    try {
+        const headers = { 'Authorization': `Bearer ${authToken}` };
+        if (hostFilter && hostFilter.authToken === authToken) {
+            headers['If-None-Match'] = hostFilter.etag;
+        }
+        const response = await fetch(`${API_BASE}/host-filter`, { headers });
+        if (response.status === 304) {
+            hostFilter.fetchedAt = Date.now();
+            return hostFilter;
+        }
+        if (!response.ok) return null;
+        
+        const buffer = await response.arrayBuffer();
+        const view = new DataView(buffer);
+        const magic = String.fromCharCode(...new Uint8Array(buffer, 0, 4));
+        // Unknown formats are ignored: every site is looked up as before
+        if (magic !== 'PMHF' || view.getUint8(4) !== 1) return null;
+        
+        hostFilter = {
+            authToken,
+            etag: response.headers.get('ETag'),
+            hashes: view.getUint8(5),
+            size: view.getUint32(8, true),
+            bits: new Uint8Array(buffer, 16),
+            fetchedAt: Date.now()
+        };
+        return hostFilter;
+    } catch (error) {
+        console.error('Error loading host filter:', error);
+        return null;
+    }
+}
+
+function markHostFilterStale() {
+    if (hostFilter) hostFilter.fetchedAt = 0;
+}
+
+function fnv1a(bytes, basis) {
+    let h = basis;
+    for (const byte of bytes) {
+        h = Math.imul(h ^ byte, 0x01000193) >>> 0;
+    }
+    return h;
+}
+
+// Every label but the last, or the whole host for IPs and single labels
+function hostFilterNames(hostname) {
+    let host = (hostname || '').trim().toLowerCase().replace(/\.$/, '');
+    if (host.startsWith('www.')) host = host.slice(4);
+    if (!host) return [];
+    if (/^\d{1,3}(\.\d{1,3}){3}$/.test(host) || host.includes(':') || !host.includes('.')) {
+        return [host];
+    }
+    return host.split('.').slice(0, -1);
+}
+
+function hostFilterContains(filter, hostname) {
+    const encoder = new TextEncoder();
+    return hostFilterNames(hostname).some(name => {
+        const data = encoder.encode(name);
+        const h1 = fnv1a(data, FNV_BASES[0]);
+        const h2 = (fnv1a(data, FNV_BASES[1]) | 1) >>> 0;
+        for (let i = 0; i < filter.hashes; i++) {
+            const probe = (h1 + i * h2) % filter.size;
+            if (!(filter.bits[Math.floor(probe / 8)] & (1 << (probe % 8)))) return false;
+        }
+        return true;
+    });
+}
+
+// False only when the vault certainly has no entry for the host
+async function mayHaveCredentials(hostname, authToken) {
+    const filter = await loadHostFilter(authToken);
+    return !filter || hostFilterContains(filter, hostname);
+}
+
 // =====================================
 // API Communication
 // =====================================
@@ -142,6 +245,10 @@ async function getPasswordsForSite(hostname) {
             return { error: 'Not authenticated', needsLogin: true };
         }
         
+        if (!(await mayHaveCredentials(hostname, authToken))) {
+            return { passwords: [] };
+        }
+        
         const response = await fetch(`${API_BASE}/passwords?search=${encodeURIComponent(hostname)}`, {
             headers: {
                 'Authorization': `Bearer ${authToken}`,
@@ -173,6 +280,23 @@ async function getPasswordsForSite(hostname) {
     }
 }
 
+// Tell the server which entry was filled, so the most used account of a
+// site is suggested first. Best effort: a failure never blocks filling.
+async function recordPasswordUse(id) {
+    if (!id) return;
+    try {
+        const { authToken } = await chrome.storage.local.get('authToken');
+        if (!authToken) return;
+        
+        await fetch(`${API_BASE}/passwords/${id}/use`, {
+            method: 'POST',
+            headers: { 'Authorization': `Bearer ${authToken}` }
+        });
+    } catch (error) {
+        console.error('Error recording password use:', error);
+    }
+}
+
 function extractHostname(urlOrName) {
     try {
         if (urlOrName.startsWith('http')) {
@@ -352,31 +476,36 @@ async function autoSaveCredentials(credentials) {
             return { success: false, error: 'Not authenticated' };
         }
         
-        // Check if password already exists
-        const checkResponse = await fetch(`${API_BASE}/passwords/autosave/check`, {
-            method: 'POST',
-            headers: {
-                'Authorization': `Bearer ${authToken}`,
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({
-                website: credentials.website,
-                username: credentials.username
-            })
-        });
-        
-        if (!checkResponse.ok) {
-            throw new Error('Failed to check for existing password');
-        }
-        
-        const checkData = await checkResponse.json();
-        
-        if (checkData.exists) {
-            return { 
-                success: false, 
-                error: 'Password already saved',
-                duplicate: true 
-            };
+        // Check if password already exists (the detect call below checks
+        // again, so the check is skipped for sites not in the host filter)
+        const host = extractHostname(credentials.url || '');
+        if (!credentials.url || await mayHaveCredentials(host, authToken)) {
+            const checkResponse = await fetch(`${API_BASE}/passwords/autosave/check`, {
+                method: 'POST',
+                headers: {
+                    'Authorization': `Bearer ${authToken}`,
+                    'Content-Type': 'application/json'
+                },
+                body: JSON.stringify({
+                    website: credentials.website,
+                    url: credentials.url,
+                    username: credentials.username
+                })
+            });
+            
+            if (!checkResponse.ok) {
+                throw new Error('Failed to check for existing password');
+            }
+            
+            const checkData = await checkResponse.json();
+            
+            if (checkData.exists) {
+                return { 
+                    success: false, 
+                    error: 'Password already saved',
+                    duplicate: true 
+                };
+            }
         }
         
         // Auto-detect category based on website
@@ -405,6 +534,7 @@ async function autoSaveCredentials(credentials) {
         
         const data = await saveResponse.json();
         console.log('✅ Credentials auto-saved:', credentials.website);
+        markHostFilterStale();
         
         return { success: true, message: 'Credentials saved' };
     } catch (error) {
@@ -440,6 +570,7 @@ async function saveCredentialsImmediately(credentials) {
                 },
                 body: JSON.stringify({
                     website: credentials.website,
+                    url: credentials.url,
                     username: credentials.username
                 })
             });
@@ -482,6 +613,7 @@ async function saveCredentialsImmediately(credentials) {
         
         const data = await saveResponse.json();
         console.log('✅ PASSWORD MANAGER: Password saved successfully for', credentials.website);
+        markHostFilterStale();
         
         // Show notification
         chrome.notifications.create(`saved-${Date.now()}`, {
@@ -415,6 +415,7 @@ function renderPasswords(passwords) {
         });
         item.addEventListener('click', () => {
             fillCredentials(passwords[index]);
+            chrome.runtime.sendMessage({ type: 'PASSWORD_USED', id: passwords[index].id });
             hidepmPopup();
         });
     });
@@ -177,6 +177,7 @@ async function init() {
 
 async function checkConnection() {
     try {
+        if (authToken && await openWithBatch()) return;
         const healthCheck = await fetch(`${API_BASE}/health`);
         if (healthCheck.ok) {
             updateConnectionStatus('connected', 'Connected to server');
@@ -216,6 +217,51 @@ async function checkAuthStatus() {
     }
 }
 
+// Popup open in one round-trip: /api/batch verifies the stored token once and
+// returns the list and the current site's matches together. Returns false
+// (use the step-by-step checks) when the batch fails, e.g. an expired token.
+async function openWithBatch() {
+    const site = await new Promise((resolve) => {
+        chrome.runtime.sendMessage({ type: 'GET_CURRENT_TAB_INFO' }, resolve);
+    });
+    const requests = [{ path: '/api/passwords' }];
+    if (site && site.hostname) {
+        requests.push({ path: `/api/passwords?search=${encodeURIComponent(site.hostname)}` });
+    }
+    
+    let result;
+    try {
+        const response = await fetch(`${API_BASE}/batch`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'Authorization': `Bearer ${authToken}`
+            },
+            body: JSON.stringify({ requests })
+        });
+        if (!response.ok) return false;
+        result = await response.json();
+    } catch {
+        return false;
+    }
+    
+    const [list, matches] = result.responses;
+    if (list.status !== 200) return false;
+    updateConnectionStatus('connected', 'Connected to server');
+    showScreen('main');
+    showPasswordList(list.body);
+    
+    if (matches && matches.status === 200) {
+        currentSiteInfo = site;
+        elements.currentSiteBanner.classList.remove('hidden');
+        elements.currentSiteName.textContent = site.hostname;
+        setMatchingPasswords(site.hostname, matches.body.passwords);
+    } else {
+        elements.currentSiteBanner.classList.add('hidden');
+    }
+    return true;
+}
+
 // =====================================
 // Screen Management
 // =====================================
@@ -239,6 +285,9 @@ function showScreen(screen) {
             elements.logoutBtn.classList.remove('hidden');
             break;
     }
+    
+    if (screen === 'main') startChangeEvents();
+    else stopChangeEvents();
 }
 
 // =====================================
@@ -270,16 +319,7 @@ async function detectCurrentSite() {
 async function findMatchingPasswords(hostname) {
     try {
         const result = await apiRequest(`/passwords?search=${encodeURIComponent(hostname)}`);
-        
-        // Filter for better matches
-        matchingPasswordsForSite = result.passwords.filter(pwd => {
-            const pwdHost = extractHostname(pwd.url || pwd.website);
-            return hostnameMatches(hostname, pwdHost) ||
-                   pwd.website.toLowerCase().includes(hostname.toLowerCase()) ||
-                   hostname.toLowerCase().includes(pwd.website.toLowerCase());
-        });
-        
-        updateCurrentSiteBanner();
+        setMatchingPasswords(hostname, result.passwords);
     } catch (error) {
         console.error('Failed to find matching passwords:', error);
         matchingPasswordsForSite = [];
@@ -287,6 +327,18 @@ async function findMatchingPasswords(hostname) {
     }
 }
 
+function setMatchingPasswords(hostname, passwords) {
+    // Filter for better matches
+    matchingPasswordsForSite = passwords.filter(pwd => {
+        const pwdHost = extractHostname(pwd.url || pwd.website);
+        return hostnameMatches(hostname, pwdHost) ||
+               pwd.website.toLowerCase().includes(hostname.toLowerCase()) ||
+               hostname.toLowerCase().includes(pwd.website.toLowerCase());
+    });
+    
+    updateCurrentSiteBanner();
+}
+
 function extractHostname(urlOrName) {
     try {
         if (urlOrName && urlOrName.startsWith('http')) {
@@ -366,6 +418,7 @@ async function handleAutofill() {
         chrome.runtime.sendMessage({
             type: 'FILL_PASSWORD',
             data: {
+                id: selectedPassword.id,
                 username: selectedPassword.username,
                 password: selectedPassword.password
             }
@@ -633,6 +686,67 @@ function showError(message) {
     elements.loginError.classList.remove('hidden');
 }
 
+// =====================================
+// Live Updates
+// =====================================
+// The server pushes change notices (/api/events, server-sent events), so the
+// list is refreshed when another tab or device changes the vault, without
+// polling. fetch() is used instead of EventSource to send the auth header.
+let changeEvents = null;
+let lastEventId = null;
+
+const reloadAfterChange = debounce(() => {
+    loadPasswords(elements.searchInput.value);
+}, 300);
+
+function startChangeEvents() {
+    if (changeEvents || !authToken) return;
+    changeEvents = new AbortController();
+    readChangeEvents(changeEvents.signal);
+}
+
+function stopChangeEvents() {
+    if (changeEvents) changeEvents.abort();
+    changeEvents = null;
+}
+
+async function readChangeEvents(signal) {
+    let retryMs = 3000;
+    while (!signal.aborted) {
+        try {
+            const headers = { 'Authorization': `Bearer ${authToken}` };
+            if (lastEventId) headers['Last-Event-ID'] = lastEventId;
+            const response = await fetch(`${API_BASE}/events`, { headers, signal });
+            if (response.status === 401) break;
+            if (!response.ok) throw new Error(`HTTP ${response.status}`);
+            
+            const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+            let buffer = '';
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += value;
+                // Events are separated by a blank line
+                let end;
+                while ((end = buffer.indexOf('\n\n')) !== -1) {
+                    const event = buffer.slice(0, end);
+                    buffer = buffer.slice(end + 2);
+                    for (const line of event.split('\n')) {
+                        if (line.startsWith('id: ')) lastEventId = line.slice(4);
+                        else if (line.startsWith('retry: ')) retryMs = parseInt(line.slice(7), 10) || retryMs;
+                        else if (line.startsWith('data: ')) reloadAfterChange();
+                    }
+                }
+            }
+        } catch (error) {
+            if (signal.aborted) return;
+            console.log('🔐 PASSWORD MANAGER: Change events disconnected:', error.message);
+        }
+        // Reconnect after the server's suggested delay; missed notices are replayed
+        await new Promise(resolve => setTimeout(resolve, retryMs));
+    }
+}
+
 // =====================================
 // Password Management
 // =====================================
@@ -655,11 +769,7 @@ async function loadPasswords(search = '') {
         console.log('🔐 PASSWORD MANAGER: Loading passwords from', endpoint);
         const result = await apiRequest(endpoint);
         console.log('🔐 PASSWORD MANAGER: Got result:', result);
-        
-        currentPasswords = result.passwords || [];
-        renderPasswords();
-        updateStats(result.count || 0);
-        console.log('🔐 PASSWORD MANAGER: Render complete, count:', currentPasswords.length);
+        showPasswordList(result);
     } catch (error) {
         console.error('🔐 PASSWORD MANAGER: Load error:', error);
         elements.passwordList.innerHTML = '<div style="text-align: center; padding: 40px; color: #ef4444;">❌ Failed to load passwords</div>';
@@ -667,6 +777,13 @@ async function loadPasswords(search = '') {
     }
 }
 
+function showPasswordList(result) {
+    currentPasswords = result.passwords || [];
+    renderPasswords();
+    updateStats(result.count || 0);
+    console.log('🔐 PASSWORD MANAGER: Render complete, count:', currentPasswords.length);
+}
+
 function renderPasswords() {
     console.log('🔐 PASSWORD MANAGER: Rendering', currentPasswords.length, 'passwords');
     
@@ -745,6 +862,7 @@ async function fillPasswordOnPage(pwd) {
         chrome.runtime.sendMessage({
             type: 'FILL_PASSWORD',
             data: {
+                id: pwd.id,
                 username: pwd.username,
                 password: pwd.password
             }
@@ -780,6 +898,8 @@ async function handleSavePassword() {
             await apiRequest('/passwords', 'POST', data);
             showToast('Password added!', 'success');
         }
+        // The site may be new to the background's host filter
+        chrome.runtime.sendMessage({ type: 'HOST_FILTER_STALE' });
         closeModal();
         loadPasswords();
     } catch (error) {
@@ -927,6 +1047,7 @@ async function handleImport(e) {
         
         const result = await apiRequest('/import', 'POST', { passwords: data.passwords });
         showToast(`Imported ${result.imported} passwords!`, 'success');
+        chrome.runtime.sendMessage({ type: 'HOST_FILTER_STALE' });
         loadPasswords();
     } catch (error) {
         showToast('Import failed: ' + error.message, 'error');
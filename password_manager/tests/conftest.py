@@ -0,0 +1,51 @@
+"""
+PASSWORD MANAGER - Test Fixtures
+Features: Backend modules on the import path, Throwaway vaults
+"""
+
+import os
+import sys
+
+import pytest
+
+# Backend modules import each other by bare name
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from database_manager import DatabaseManager  # noqa: E402
+
+
+@pytest.fixture
+def vault_paths(tmp_path):
+    """Database and key file of an empty vault."""
+    return str(tmp_path / "passwords.db"), str(tmp_path / "key.key")
+
+
+@pytest.fixture
+def db(vault_paths):
+    """An open, empty vault."""
+    manager = DatabaseManager(*vault_paths)
+    yield manager
+    manager.close()
+
+
+@pytest.fixture
+def app(tmp_path):
+    """An API app whose default vault lives under tmp_path."""
+    from app import create_app
+    application = create_app({
+        "DATA_DIR": str(tmp_path),
+        "VAULTS_DIR": str(tmp_path / "vaults"),
+        "MAINTENANCE": False,
+    })
+    yield application
+    application.extensions["events"].close_all()
+    application.extensions["tenants"].close_all()
+
+
+@pytest.fixture
+def client(app):
+    """A test client logged in to a fresh vault, with its auth header."""
+    test_client = app.test_client()
+    response = test_client.post("/api/auth/setup", json={"password": "Correct-Horse-9"})
+    test_client.environ_base["HTTP_AUTHORIZATION"] = "Bearer " + response.get_json()["token"]
+    return test_client
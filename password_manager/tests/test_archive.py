@@ -0,0 +1,116 @@
+import json
+import sqlite3
+
+import pytest
+
+from archive import TRAILER, ArchiveError, ArchiveReader, export_archive
+from database_manager import DatabaseManager
+
+
+@pytest.fixture
+def archive_path(db, tmp_path):
+    db.add_password("github.com", "octo", "pw-1", category="Work")
+    db.add_password("bank.com", "me", "pw-2", category="Banking")
+    path = str(tmp_path / "vault.pmva")
+    export_archive(db, path)
+    return path
+
+
+def _rewrite_manifest(path, manifest_bytes):
+    with open(path, "rb") as f:
+        data = f.read()
+    offset, _, magic = TRAILER.unpack(data[-TRAILER.size:])
+    with open(path, "wb") as f:
+        f.write(data[:offset] + manifest_bytes + TRAILER.pack(offset, len(manifest_bytes), magic))
+
+
+@pytest.mark.parametrize("manifest", [
+    b"{not json",
+    b"\xff\xfe",
+    json.dumps({"format": 1}).encode(),
+    json.dumps({"index_offset": "x", "index_length": 1}).encode(),
+    json.dumps([1, 2]).encode(),
+])
+def test_damaged_manifest_is_an_archive_error(archive_path, manifest):
+    _rewrite_manifest(archive_path, manifest)
+    with pytest.raises(ArchiveError):
+        ArchiveReader(archive_path)
+
+
+def test_uncategorised_entries_are_exported(vault_paths, tmp_path):
+    db = DatabaseManager(*vault_paths)
+    db.add_password("github.com", "octo", "pw-1", category="Work")
+    orphan = db.add_password("old.com", "me", "pw-2", category="Gone")["id"]
+    loose = db.add_password("loose.com", "me", "pw-3")["id"]
+    db.close()
+    with sqlite3.connect(vault_paths[0]) as conn:
+        conn.execute("DELETE FROM categories WHERE name = 'Gone'")
+        conn.execute("UPDATE passwords SET category_id = NULL WHERE id = ?", (loose,))
+
+    db = DatabaseManager(*vault_paths)
+    path = str(tmp_path / "vault.pmva")
+    try:
+        assert export_archive(db, path)["entries"] == 3
+    finally:
+        db.close()
+    with ArchiveReader(path) as reader:
+        assert {e["id"] for e in reader.entries()} >= {orphan, loose}
+
+
+def test_upload_over_the_limit_is_rejected(app, client, archive_path):
+    app.config["MAX_ARCHIVE_BYTES"] = 64
+    with open(archive_path, "rb") as f:
+        response = client.post("/api/import/archive", data=f.read())
+    assert response.status_code == 413
+
+
+def test_corrupt_upload_is_a_400(client, archive_path):
+    _rewrite_manifest(archive_path, b"{not json")
+    with open(archive_path, "rb") as f:
+        response = client.post("/api/import/archive", data=f.read())
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+
+
+def test_export_round_trip(client):
+    client.post("/api/passwords", json={"website": "github.com", "username": "octo",
+                                        "password": "pw-1", "category": "Work"})
+    exported = client.get("/api/export/archive")
+    assert exported.status_code == 200
+    response = client.post("/api/import/archive", data=exported.data)
+    assert response.status_code == 200
+    assert response.get_json()["decoded"] == 1
+
+
+def _row_count(db):
+    return db.conn.execute("SELECT COUNT(*) FROM passwords").fetchone()[0]
+
+
+def test_corrupt_middle_block_restores_nothing(db, tmp_path):
+    for i in range(100):
+        db.add_password(f"site{i}.com", "me", f"pw-{i}")
+    path = str(tmp_path / "vault.pmva")
+    export_archive(db, path, block_size=2048)
+    with ArchiveReader(path) as reader:
+        assert len(reader.index) >= 3
+        middle = reader.index[len(reader.index) // 2]
+    with open(path, "r+b") as f:
+        f.seek(middle["offset"] + middle["length"] // 2)
+        f.write(b"\x00\xff\x00\xff")
+
+    with ArchiveReader(path) as reader, pytest.raises(ArchiveError):
+        reader.restore_into(db)
+    db.add_password("after.com", "me", "pw")
+    assert _row_count(db) == 101
+
+
+def test_failed_import_is_rolled_back(db):
+    def entries():
+        for i in range(50):
+            yield {"website": f"site{i}.com", "username": "me", "password": "pw"}
+        raise ArchiveError("Block at offset 0 is corrupt")
+
+    with pytest.raises(ArchiveError):
+        db.import_passwords(entries())
+    db.add_password("after.com", "me", "pw")
+    assert _row_count(db) == 1
@@ -0,0 +1,29 @@
+import pytest
+
+from auth_manager import AuthManager
+
+
+@pytest.fixture
+def auth(tmp_path):
+    return AuthManager(master_file=str(tmp_path / "master.key"),
+                       secret_file=str(tmp_path / "jwt_secret.key"), bcrypt_rounds=4)
+
+
+def test_check_master_password(auth):
+    auth.set_master_password("Correct-Horse-9")
+    assert auth.check_master_password("Correct-Horse-9")
+    assert not auth.check_master_password("wrong password")
+
+
+def test_malformed_bcrypt_hash_is_rejected(auth):
+    with open(auth.master_file, "wb") as f:
+        f.write(b"$2b$12$truncated")
+    assert auth.check_master_password("Correct-Horse-9") is False
+
+
+def test_token_cache_evicts_least_recently_used(auth):
+    auth.token_cache_size = 2
+    first, second, third = (auth.generate_token() for _ in range(3))
+    for token in (first, second, first, third):
+        assert auth.verify_token(token)["valid"]
+    assert list(auth.token_cache) == [first, third]
@@ -0,0 +1,36 @@
+import sqlite3
+
+from backup import BackupManager
+
+
+def _row(path, password_id):
+    with sqlite3.connect(path) as conn:
+        return conn.execute(
+            "SELECT use_count, strength_score, breach_check_result FROM passwords WHERE id = ?",
+            (password_id,)
+        ).fetchone()
+
+
+def test_incremental_backup_keeps_unlogged_updates(db, tmp_path):
+    entry = db.add_password("a.com", "me", "pw-1")["id"]
+    db.add_password("b.com", "me", "pw-2")
+    backups = BackupManager(db.db_file, str(tmp_path / "backups"), step_sleep=0)
+    backups.full_backup()
+
+    db.record_use(entry)
+    db.flush_usage()
+    db.refresh_derived_data(lambda password: 77, {})
+    result = backups.incremental_backup()
+    assert result["type"] == "incremental"
+
+    restored = str(tmp_path / "restored.db")
+    assert "error" not in backups.restore(restored)
+    assert _row(restored, entry) == _row(db.db_file, entry)
+    assert _row(restored, entry)[0] == 1
+
+
+def test_nothing_to_back_up(db, tmp_path):
+    db.add_password("a.com", "me", "pw-1")
+    backups = BackupManager(db.db_file, str(tmp_path / "backups"), step_sleep=0)
+    backups.full_backup()
+    assert backups.incremental_backup()["skipped"]
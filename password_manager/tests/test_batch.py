@@ -0,0 +1,69 @@
+import os
+import threading
+import time
+
+from database_manager import DatabaseManager
+
+
+def _batch(client, *items):
+    response = client.post("/api/batch", json={"requests": list(items)})
+    assert response.status_code == 200
+    return [(r["status"], r["body"]) for r in response.get_json()["responses"]]
+
+
+def test_batch_needs_a_token(app, client):
+    response = app.test_client().post("/api/batch",
+                                      json={"requests": [{"path": "/api/categories"}]})
+    assert response.status_code == 401
+
+
+def test_batch_runs_get_requests_in_order(client):
+    client.post("/api/passwords", json={"website": "github.com", "username": "octo",
+                                        "password": "pw-1"})
+    (categories_status, _), (sync_status, sync) = _batch(
+        client, {"path": "/api/categories"}, {"path": "/api/sync?since=0"}
+    )
+    assert categories_status == sync_status == 200
+    assert [e["website"] for e in sync["inserted"]] == ["github.com"]
+
+
+def test_only_plain_get_routes_are_batched(client):
+    results = _batch(
+        client,
+        {"path": "/api/passwords", "method": "POST"},
+        {"path": "/api/events"},
+        {"path": "/api/batch"},
+        {"path": "/api/export"},
+        {"path": "/api/export/archive"},
+    )
+    assert [status for status, _ in results] == [405, 400, 405, 400, 400]
+    assert all("error" in body for _, body in results)
+
+
+def test_batch_reads_one_snapshot(app, client, tmp_path):
+    other = DatabaseManager(os.path.join(tmp_path, "passwords.db"),
+                            os.path.join(tmp_path, "key.key"))
+    view = app.view_functions["api.sync_changes"]
+    writers = []
+
+    def sync_then_write():
+        response = view()
+        if not writers:
+            # Another process writes between the two sub-requests: its
+            # commit waits for the batch to end
+            writers.append(threading.Thread(
+                target=other.add_password, args=("late.com", "me", "pw")
+            ))
+            writers[0].start()
+            time.sleep(0.2)
+        return response
+
+    app.view_functions["api.sync_changes"] = sync_then_write
+    (_, first), (_, second) = _batch(client, {"path": "/api/sync?since=0"},
+                                     {"path": "/api/sync?since=0"})
+    writers[0].join(10)
+    other.close()
+    assert first == second
+    assert first["inserted"] == []
+    inserted = client.get("/api/sync?since=0").get_json()["inserted"]
+    assert [e["website"] for e in inserted] == ["late.com"]
@@ -0,0 +1,217 @@
+import sqlite3
+
+from cryptography.fernet import Fernet
+
+from database_manager import DatabaseManager
+from migrations import MIGRATIONS, SCHEMA_VERSION, register_functions
+from password_generator import PasswordGenerator
+
+
+def test_weak_passwords_use_the_0_to_100_scale(db):
+    weak = db.add_password("a.com", "me", "password")["id"]
+    strong = db.add_password("b.com", "me", "vK#9t!qLz2@Wm7$pR4")["id"]
+    generator = PasswordGenerator()
+    db.refresh_derived_data(lambda password: generator.check_strength(password)["score"])
+    assert [record[0] for record in db.get_weak_passwords()] == [weak]
+    assert {record[0] for record in db.get_weak_passwords(101)} == {weak, strong}
+
+
+def test_bulk_apply_reports_each_operation(db):
+    first = db.add_password("a.com", "me", "pw-1")["id"]
+    second = db.add_password("b.com", "me", "pw-2")["id"]
+    result = db.bulk_apply([
+        {"op": "move", "ids": [first, 999], "category": "Work"},
+        {"op": "favorite", "id": second},
+        {"op": "update", "id": second, "username": "you"},
+        {"op": "update", "id": first},
+        {"op": "rename", "id": first},
+        {"op": "delete", "id": "x"},
+    ])
+    assert [(r["index"], r.get("id"), r["status"]) for r in result["results"]] == [
+        (0, first, "ok"), (0, 999, "not_found"),
+        (1, second, "ok"),
+        (2, second, "ok"),
+        (3, first, "error"),
+        (4, None, "error"),
+        (5, "x", "error"),
+    ]
+    assert (result["applied"], result["failed"]) == (3, 4)
+    assert db.get_password_by_id(first)["category"] == "Work"
+    entry = db.get_password_by_id(second)
+    assert entry["favorite"] and entry["username"] == "you"
+
+
+def test_bulk_apply_rolls_back_everything_on_failure(db):
+    first = db.add_password("a.com", "me", "pw-1")["id"]
+    second = db.add_password("b.com", "me", "pw-2")["id"]
+    version = db.get_sync_version()
+    db.conn.execute("CREATE TRIGGER no_deletes BEFORE DELETE ON passwords "
+                    "BEGIN SELECT RAISE(ABORT, 'deletes are disabled'); END")
+
+    result = db.bulk_apply([
+        {"op": "move", "id": first, "category": "Archive"},
+        {"op": "update", "id": first, "username": "changed"},
+        {"op": "delete", "id": second},
+    ])
+    assert "nothing was applied" in result["error"]
+    entry = db.get_password_by_id(first)
+    assert (entry["category"], entry["username"]) == ("General", "me")
+    assert db.get_password_by_id(second) is not None
+    assert "Archive" not in [c["name"] for c in db.get_categories()]
+    assert db.get_sync_version() == version
+
+
+def test_metadata_is_stored_sealed(db):
+    db.add_password("GitHub", "octo", "pw-1", url="https://github.com/login", notes="work")
+    row = db.conn.execute("SELECT website, url, username, notes, meta FROM passwords").fetchone()
+    assert row[:4] == ("", None, "", None)
+    assert "octo" not in row[4]
+    assert db.fields.open(row[4]) == ("GitHub", "https://github.com/login", "octo", "work")
+
+
+def test_search_through_blind_indexes(db):
+    github = db.add_password("GitHub", "octo", "pw-1", url="https://github.com")["id"]
+    gitlab = db.add_password("GitLab", "octo", "pw-2", notes="mirror of work repos")["id"]
+    db.add_password("Bank", "me", "pw-3")
+
+    def found(query):
+        return {record.id for record in db.get_passwords(search=query)}
+
+    assert found("git") == {github, gitlab}
+    assert found("github") == {github}
+    assert found("octo") == {github, gitlab}
+    assert found("mirror work") == {gitlab}
+    assert found("mirror bank") == set()
+    # Typos find the site through its site index
+    assert found("githbu.com") == {github}
+
+
+def test_duplicate_check_uses_site_and_username_indexes(db):
+    entry = db.add_password("github.com", "octo", "pw-1")["id"]
+    assert db.find_similar_password("https://www.github.com/login")["id"] == entry
+    assert db.find_similar_password("github.com", "octo")["id"] == entry
+    assert db.find_similar_password("github.com", "someone-else") is None
+    assert db.find_similar_password("gitlab.com") is None
+
+
+def test_migration_encrypts_a_plaintext_vault(vault_paths):
+    db_file, key_file = vault_paths
+    key = Fernet.generate_key()
+    with open(key_file, "wb") as f:
+        f.write(key)
+    # A vault at schema 5, from before encrypted metadata
+    conn = sqlite3.connect(db_file, isolation_level=None)
+    register_functions(conn)
+    for version, _, migration in MIGRATIONS[:5]:
+        migration(conn.cursor())
+        conn.execute(f"PRAGMA user_version = {version}")
+    conn.executemany(
+        """INSERT INTO passwords (website, url, username, password, notes, site_key)
+           VALUES (?, ?, ?, ?, ?, site_key(?, ?))""",
+        [("GitHub", "https://github.com", "octo", Fernet(key).encrypt(b"pw-1").decode(),
+          "secret notes", "GitHub", "https://github.com"),
+         ("Bank", None, "me", Fernet(key).encrypt(b"pw-2").decode(), None, "Bank", None)]
+    )
+    conn.close()
+
+    db = DatabaseManager(db_file, key_file)
+    try:
+        assert db.conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+        assert db.conn.execute(
+            "SELECT COUNT(*) FROM passwords WHERE meta IS NULL OR website != '' "
+            "OR username != '' OR notes IS NOT NULL OR site_key IS NOT NULL").fetchone()[0] == 0
+        github = db.get_password_by_id(1)
+        assert (github["website"], github["username"], github["notes"], github["password"]) == (
+            "GitHub", "octo", "secret notes", "pw-1")
+        assert [record.id for record in db.get_passwords(search="git")] == [1]
+        assert db.find_similar_password("bank")["id"] == 2
+    finally:
+        db.close()
+    with open(db_file, "rb") as f:
+        assert b"secret notes" not in f.read()
+
+
+def test_search_lists_most_used_first_then_by_website(db):
+    ids = {name: db.add_password(name, "me", "pw")["id"]
+           for name in ("mail.b.com", "mail.c.com", "mail.a.com", "mail.d.com")}
+    for _ in range(3):
+        db.record_use(ids["mail.d.com"])
+    db.record_use(ids["mail.c.com"])
+    db.flush_usage()
+    assert [record.website for record in db.get_passwords(search="mail")] == [
+        "mail.d.com", "mail.c.com", "mail.a.com", "mail.b.com"]
+    assert [record.website for record in db.get_passwords()] == [
+        "mail.a.com", "mail.b.com", "mail.c.com", "mail.d.com"]
+
+
+def _change_ids(changes):
+    return {key: sorted(e if key == "deleted" else e["id"] for e in changes[key])
+            for key in ("inserted", "updated", "deleted")}
+
+
+def test_get_changes_since_a_version(db):
+    kept = db.add_password("a.com", "me", "pw-1")["id"]
+    edited = db.add_password("b.com", "me", "pw-2")["id"]
+    removed = db.add_password("c.com", "me", "pw-3")["id"]
+    version = db.get_sync_version()
+
+    db.update_password(edited, password="pw-2b")
+    db.delete_password(removed)
+    added = db.add_password("d.com", "me", "pw-4")["id"]
+    db.delete_password(db.add_password("e.com", "me", "pw-5")["id"])
+
+    assert _change_ids(db.get_changes(version)) == {
+        "inserted": [added], "updated": [edited], "deleted": [removed]
+    }
+    assert _change_ids(db.get_changes(0)) == {
+        "inserted": [kept, edited, added], "updated": [], "deleted": []
+    }
+
+
+def test_compaction_keeps_inserts(db):
+    first = db.add_password("a.com", "me", "pw-1")["id"]
+    db.update_password(first, password="pw-1b")
+    version = db.get_sync_version()
+    db.update_password(first, password="pw-1c")
+    second = db.add_password("b.com", "me", "pw-2")["id"]
+    db.delete_password(second)
+
+    before = (_change_ids(db.get_changes(0)), _change_ids(db.get_changes(version)))
+    result = db.compact_changes()
+    assert result["superseded"] == 1
+    assert (_change_ids(db.get_changes(0)), _change_ids(db.get_changes(version))) == before
+    assert _change_ids(db.get_changes(0))["inserted"] == [first]
+
+
+def test_expired_tombstones_force_a_full_resync(db):
+    removed = db.add_password("a.com", "me", "pw-1")["id"]
+    db.delete_password(removed)
+    old_client = db.get_sync_version()
+    db.conn.execute("UPDATE changes SET changed_at = datetime('now', '-40 days')")
+    db.conn.commit()
+    added = db.add_password("b.com", "me", "pw-2")["id"]
+    version = db.get_sync_version()
+
+    assert db.compact_changes(tombstone_max_age_days=30)["tombstones_expired"] == 1
+    assert db.get_changes(0)["full_resync"]
+    changes = db.get_changes(old_client)
+    assert not changes["full_resync"]
+    assert _change_ids(changes)["inserted"] == [added]
+    # The insert cancelled by the expired tombstone went with it
+    assert db.conn.execute("SELECT COUNT(*) FROM changes WHERE password_id = ?",
+                           (removed,)).fetchone()[0] == 0
+    assert db.get_changes(version)["version"] == version
+
+
+def test_category_cache_sees_other_processes(db, vault_paths):
+    db.get_categories()
+    other = DatabaseManager(*vault_paths)
+    other.add_category("Travel")
+    other.close()
+    assert "Travel" in {c["name"] for c in db.get_categories()}
+    # The new category is reused, not added a second time
+    db.add_password("airline.com", "me", "pw", category="Travel")
+    with sqlite3.connect(vault_paths[0]) as conn:
+        assert conn.execute(
+            "SELECT COUNT(*) FROM categories WHERE name = 'Travel'"
+        ).fetchone()[0] == 1
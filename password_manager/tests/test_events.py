@@ -0,0 +1,40 @@
+import time
+from itertools import islice
+
+import pytest
+
+
+@pytest.fixture
+def app(app):
+    app.extensions["events"].heartbeat = 0.01
+    return app
+
+
+def _read(stream, count):
+    return [next(stream) for _ in range(count)]
+
+
+def test_stream_sends_heartbeats_while_logged_in(client):
+    response = client.get("/api/events", buffered=False)
+    stream = iter(response.response)
+    assert b"heartbeat" in b"".join(_read(stream, 3))
+    response.close()
+
+
+def test_stream_ends_after_logout(client):
+    response = client.get("/api/events", buffered=False)
+    stream = iter(response.response)
+    _read(stream, 2)
+    assert client.post("/api/auth/logout").status_code == 200
+    assert list(islice(stream, 20)) == []
+    response.close()
+
+
+def test_stream_ends_when_the_token_expires(client, monkeypatch):
+    response = client.get("/api/events", buffered=False)
+    stream = iter(response.response)
+    _read(stream, 2)
+    later = time.time() + 10 * 24 * 3600
+    monkeypatch.setattr(time, "time", lambda: later)
+    assert list(islice(stream, 20)) == []
+    response.close()
@@ -0,0 +1,36 @@
+from cryptography.fernet import Fernet
+
+from field_crypto import DECRYPTION_ERROR, FieldCipher
+
+
+def test_seal_and_open():
+    fields = FieldCipher(Fernet.generate_key())
+    sealed = fields.seal("GitHub", "https://github.com/login", "octo", None)
+    assert "octo" not in sealed
+    assert fields.open(sealed) == ("GitHub", "https://github.com/login", "octo", None)
+    # A fresh nonce each time
+    assert fields.seal("GitHub", None, "octo", None) != fields.seal("GitHub", None, "octo", None)
+
+
+def test_other_key_cannot_open():
+    sealed = FieldCipher(Fernet.generate_key()).seal("a.com", None, "me", "notes")
+    assert FieldCipher(Fernet.generate_key()).open(sealed) == (
+        DECRYPTION_ERROR, None, DECRYPTION_ERROR, None)
+
+
+def test_blind_indexes_are_keyed_and_per_kind():
+    key = Fernet.generate_key()
+    fields, again = FieldCipher(key), FieldCipher(key)
+    assert fields.site_index("GitHub", "https://www.github.com/") == again.site_index(
+        "github.com", None)
+    assert fields.site_index("github.com", None) != FieldCipher(Fernet.generate_key()).site_index(
+        "github.com", None)
+    assert fields.blind("word", "github") != fields.blind("site", "github")
+
+
+def test_query_words_match_entry_tokens():
+    fields = FieldCipher(Fernet.generate_key())
+    tokens = fields.tokens("GitHub", "https://github.com", "octo", "work account")
+    for query in ("git", "octo", "account"):
+        assert all(group & tokens for group in fields.query_tokens(query))
+    assert not all(group & tokens for group in fields.query_tokens("gitlab"))
@@ -0,0 +1,17 @@
+def test_metrics_need_a_token(app):
+    response = app.test_client().get("/api/metrics")
+    assert response.status_code == 401
+
+
+def test_metrics_with_a_token(client):
+    response = client.get("/api/metrics")
+    assert response.status_code == 200
+    assert b"# TYPE" in response.data
+
+
+def test_metrics_from_an_allowed_address(app):
+    app.config["METRICS_ALLOW"] = frozenset({"127.0.0.1"})
+    response = app.test_client().get("/api/metrics", environ_base={"REMOTE_ADDR": "127.0.0.1"})
+    assert response.status_code == 200
+    response = app.test_client().get("/api/metrics", environ_base={"REMOTE_ADDR": "10.0.0.9"})
+    assert response.status_code == 401
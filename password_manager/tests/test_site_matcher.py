@@ -0,0 +1,41 @@
+import pytest
+
+from site_matcher import SiteIndex, edit_distance
+
+
+@pytest.fixture
+def index():
+    sites = SiteIndex()
+    sites.build(["google.com", "amazon.com", "github.com", "paypal.com"])
+    return sites
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("goolge.com", "google.com"),
+    ("amzaon.com", "amazon.com"),
+    ("gihtub.com", "github.com"),
+    ("gtihub.com", "github.com"),
+])
+def test_adjacent_swap_is_one_typo(index, query, expected):
+    assert edit_distance(query.split(".")[0], expected.split(".")[0], 1) == 1
+    assert [key for key, _ in index.match(query)] == [expected]
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("githib.com", "github.com"),
+    ("gogle.com", "google.com"),
+    ("paypall.com", "paypal.com"),
+])
+def test_insertion_deletion_substitution(index, query, expected):
+    assert [key for key, _ in index.match(query)] == [expected]
+
+
+def test_same_name_ranks_before_typos(index):
+    index.add("github.io")
+    index.add("gitlab.com")
+    keys = [key for key, _ in index.match("github.com")]
+    assert keys[:2] == ["github.com", "github.io"]
+
+
+def test_unrelated_name_does_not_match(index):
+    assert index.match("example.com") == []
@@ -0,0 +1,89 @@
+import threading
+
+import pytest
+
+from tenancy import TenantNotFound, TenantRegistry
+
+
+@pytest.fixture
+def registry(tmp_path):
+    registry = TenantRegistry(base_dir=str(tmp_path / "vaults"), max_open=2,
+                              auto_create=True, default_dir=str(tmp_path))
+    yield registry
+    registry.close_all()
+
+
+def test_tenants_are_isolated(registry):
+    alice = registry.acquire("alice")
+    bob = registry.acquire("bob")
+    alice.db.add_password("github.com", "alice", "pw-a")
+    assert alice.db.db_file != bob.db.db_file
+    assert [record.username for record in bob.db.get_passwords()] == []
+    assert [record.username for record in alice.db.get_passwords()] == ["alice"]
+    registry.release(alice)
+    registry.release(bob)
+
+
+def test_unknown_tenant(tmp_path):
+    registry = TenantRegistry(base_dir=str(tmp_path / "vaults"))
+    with pytest.raises(TenantNotFound):
+        registry.acquire("nobody")
+
+
+def test_lru_evicts_unused_tenants_only(registry):
+    for name in ("a", "b"):
+        registry.release(registry.acquire(name))
+    busy = registry.acquire("c")
+    assert registry.stats()["tenants"] == ["b", "c"]
+    registry.release(registry.acquire("d"))
+    assert registry.stats()["tenants"] == ["c", "d"]
+    assert busy.db.get_passwords() == []
+    registry.release(busy)
+
+
+def test_idle_tenants_are_closed_and_reopened(registry):
+    tenant = registry.acquire("a")
+    tenant.db.add_password("github.com", "me", "pw")
+    registry.release(tenant)
+    registry.idle_timeout = 0
+    assert registry.close_idle() == 1
+    assert registry.stats()["open"] == 0
+
+    registry.idle_timeout = 600
+    tenant = registry.acquire("a")
+    assert len(tenant.db.get_passwords()) == 1
+    registry.release(tenant)
+
+
+def test_slow_open_only_blocks_its_tenant(registry, monkeypatch):
+    opening, proceed = threading.Event(), threading.Event()
+    open_tenant = registry._open_tenant
+    opened = []
+
+    def slow_open(name):
+        opened.append(name)
+        if name == "slow":
+            opening.set()
+            assert proceed.wait(10)
+        return open_tenant(name)
+
+    monkeypatch.setattr(registry, "_open_tenant", slow_open)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(registry.acquire("slow")))
+               for _ in range(2)]
+    threads[0].start()
+    assert opening.wait(10)
+    threads[1].start()
+
+    # Another tenant opens while "slow" is still opening
+    fast = threading.Thread(target=lambda: registry.release(registry.acquire("fast")))
+    fast.start()
+    fast.join(10)
+    assert not fast.is_alive()
+    proceed.set()
+    for thread in threads:
+        thread.join(10)
+    assert results[0] is results[1]
+    assert opened.count("slow") == 1
+    for tenant in results:
+        registry.release(tenant)
@@ -0,0 +1,50 @@
+import os
+
+from database_manager import DatabaseManager
+from vault_cli import VaultTool
+
+
+def test_reencrypt_rotates_the_key(db, vault_paths):
+    entry = db.add_password("github.com", "octo", "pw-1")["id"]
+    db.close()
+    with VaultTool(*vault_paths, workers=1, quiet=True) as tool:
+        result = tool.reencrypt()
+    assert result["reencrypted"] == 1
+    assert os.path.exists(result["old_key"])
+
+    db = DatabaseManager(*vault_paths)
+    try:
+        assert db.get_password_by_id(entry)["password"] == "pw-1"
+    finally:
+        db.close()
+
+
+def test_reencrypt_aborts_on_concurrent_write(db, vault_paths, monkeypatch):
+    db.add_password("github.com", "octo", "pw-1")
+    db.close()
+    with open(vault_paths[1], "rb") as f:
+        key = f.read()
+
+    tool = VaultTool(*vault_paths, workers=1, quiet=True)
+    run = tool._run
+
+    def run_then_write(*args, **kwargs):
+        yield from run(*args, **kwargs)
+        # Another process adds an entry after the workers read the vault
+        other = DatabaseManager(*vault_paths)
+        other.add_password("late.com", "me", "pw-2")
+        other.close()
+
+    monkeypatch.setattr(tool, "_run", run_then_write)
+    with tool:
+        result = tool.reencrypt()
+    assert "error" in result
+    assert not os.path.exists(vault_paths[1] + ".new")
+    with open(vault_paths[1], "rb") as f:
+        assert f.read() == key
+
+    db = DatabaseManager(*vault_paths)
+    try:
+        assert {record.password for record in db.get_passwords()} == {"pw-1", "pw-2"}
+    finally:
+        db.close()
@@ -0,0 +1,53 @@
+import threading
+
+from write_queue import PendingWrite
+
+
+def _websites(db):
+    return sorted(record.website for record in db.get_passwords())
+
+
+def test_failing_write_does_not_roll_back_its_group(db):
+    def broken():
+        db.add_password("broken.com", "me", "pw")
+        raise RuntimeError("write failed half way")
+
+    writes = [
+        PendingWrite(db.add_password, ("a.com", "me", "pw-1"), {}),
+        PendingWrite(broken, (), {}),
+        PendingWrite(db.add_password, ("b.com", "me", "pw-2"), {}),
+    ]
+    db.apply_writes(writes)
+
+    assert isinstance(writes[1].error, RuntimeError)
+    assert writes[0].error is None and writes[2].error is None
+    assert not db.conn.in_transaction
+    assert _websites(db) == ["a.com", "b.com"]
+
+
+def test_failed_bulk_apply_in_a_group_only_undoes_itself(db):
+    kept = db.add_password("kept.com", "me", "pw")["id"]
+    db.conn.execute("CREATE TRIGGER no_deletes BEFORE DELETE ON passwords "
+                    "BEGIN SELECT RAISE(ABORT, 'deletes are disabled'); END")
+    writes = [
+        PendingWrite(db.add_password, ("new.com", "me", "pw"), {}),
+        PendingWrite(db.bulk_apply, ([{"op": "move", "id": kept, "category": "Work"},
+                                      {"op": "delete", "id": kept}],), {}),
+        PendingWrite(db.add_password, ("last.com", "me", "pw"), {}),
+    ]
+    db.apply_writes(writes)
+
+    assert "error" in writes[1].result
+    assert db.get_password_by_id(kept)["category"] == "General"
+    assert _websites(db) == ["kept.com", "last.com", "new.com"]
+
+
+def test_queued_writes_from_many_threads(db):
+    db.enable_write_queue(window_ms=5)
+    threads = [threading.Thread(target=db.add_password, args=(f"site{i}.com", "me", "pw"))
+               for i in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(db.get_passwords()) == 20